@@ -0,0 +1,155 @@
+"""Compare ASR backend configurations on a local labelled audio set.
+
+The manifest is a CSV with columns `path,reference[,lang]`; paths are relative
+to the manifest. Every combination of --backend/--model/--beam/--threads is
+loaded once, warmed up, then run over the whole set; audio decoding is not timed.
+
+    python benchmarks/asr_benchmark.py --manifest data/asr/manifest.csv \
+        --backend whisper whisper-int8 --model base small --beam 1 5 --threads 4 \
+        --max-wer 0.25 --output asr_results.json
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+import unicodedata
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from parameters.modules.asr_backends import create_backend
+from parameters.modules.asr_module import SAMPLE_RATE, decode_audio_bytes
+
+
+def normalize_words(text):
+    """Lower-case, replace punctuation/symbols (incl. the danda) with spaces and split.
+
+    Filtering by Unicode category rather than \\w keeps Devanagari vowel signs.
+    """
+    return "".join(
+        " " if unicodedata.category(c)[0] in "PS" and c != "'" else c for c in text.lower()
+    ).split()
+
+
+def word_errors(reference, hypothesis):
+    """Word-level Levenshtein distance (substitutions + deletions + insertions)."""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1], len(ref)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def load_manifest(path):
+    base = os.path.dirname(os.path.abspath(path))
+    items = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            with open(os.path.join(base, row["path"]), "rb") as audio:
+                samples = decode_audio_bytes(audio.read())
+            items.append({
+                "path": row["path"],
+                "reference": row.get("reference", ""),
+                "lang": (row.get("lang") or "").strip(),
+                "audio": samples,
+            })
+    return items
+
+
+def run_config(items, backend_name, model_size, beam_size, threads, warmup=1):
+    backend = create_backend(backend_name, model_size=model_size, beam_size=beam_size if beam_size > 1 else None,
+                             threads=threads)
+    started = time.perf_counter()
+    backend.load()
+    load_seconds = time.perf_counter() - started
+    for item in items[:warmup]:
+        backend.transcribe(item["audio"])
+
+    latencies, audio_seconds = [], 0.0
+    errors, words = {}, {}
+    rows = []
+    for item in items:
+        started = time.perf_counter()
+        hypothesis, lang = backend.transcribe(item["audio"])
+        elapsed = time.perf_counter() - started
+        duration = len(item["audio"]) / SAMPLE_RATE
+        latencies.append(elapsed)
+        audio_seconds += duration
+        e, n = word_errors(item["reference"], hypothesis)
+        for key in {"all", item["lang"] or "all"}:
+            errors[key] = errors.get(key, 0) + e
+            words[key] = words.get(key, 0) + n
+        rows.append({"path": item["path"], "seconds": round(elapsed, 3), "rtf": round(elapsed / duration, 3),
+                     "lang": lang, "hypothesis": hypothesis, "errors": e, "words": n})
+
+    return {
+        **backend.describe(),
+        "load_seconds": round(load_seconds, 2),
+        "files": len(items),
+        "audio_seconds": round(audio_seconds, 2),
+        "rtf": round(sum(latencies) / audio_seconds, 3) if audio_seconds else None,
+        "p50": round(percentile(latencies, 50), 3),
+        "p95": round(percentile(latencies, 95), 3),
+        "wer": {k: round(errors[k] / words[k], 4) if words[k] else None for k in errors},
+        "items": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--manifest", required=True)
+    parser.add_argument("--backend", nargs="+", default=["whisper", "whisper-int8"])
+    parser.add_argument("--model", nargs="+", default=["base"])
+    parser.add_argument("--beam", nargs="+", type=int, default=[1])
+    parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--max-wer", type=float, default=None, help="recommend the fastest config at or below this WER")
+    parser.add_argument("--output", help="write full per-file results as JSON")
+    args = parser.parse_args()
+
+    items = load_manifest(args.manifest)
+    print(f"📂 {len(items)} files, {sum(len(i['audio']) for i in items) / SAMPLE_RATE:.1f}s of audio")
+
+    results = []
+    for backend, model, beam, threads in itertools.product(args.backend, args.model, args.beam, args.threads):
+        print(f"⏱️ {backend} / {model} / beam {beam} / {threads} threads ...")
+        results.append(run_config(items, backend, model, beam, threads, args.warmup))
+
+    langs = sorted({k for r in results for k in r["wer"] if k != "all"})
+    header = f"{'backend':<14}{'model':<8}{'beam':>5}{'thr':>5}{'RTF':>8}{'p50':>8}{'p95':>8}{'WER':>8}"
+    print("\n" + header + "".join(f"{'WER ' + l:>10}" for l in langs))
+    for r in sorted(results, key=lambda r: r["rtf"] or 0):
+        line = (f"{r['backend']:<14}{r['model']:<8}{r['beam_size']:>5}{r['threads']:>5}"
+                f"{r['rtf']:>8.3f}{r['p50']:>8.3f}{r['p95']:>8.3f}{r['wer']['all'] or 0:>8.3f}")
+        print(line + "".join(f"{r['wer'].get(l) or 0:>10.3f}" for l in langs))
+
+    if args.max_wer is not None:
+        acceptable = [r for r in results if r["wer"]["all"] is not None and r["wer"]["all"] <= args.max_wer]
+        if acceptable:
+            best = min(acceptable, key=lambda r: r["rtf"])
+            print(f"\n✅ Fastest within WER {args.max_wer}: {best['backend']} / {best['model']} / "
+                  f"beam {best['beam_size']} / {best['threads']} threads (RTF {best['rtf']})")
+        else:
+            print(f"\n❌ No configuration reached WER {args.max_wer}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
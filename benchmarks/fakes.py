@@ -0,0 +1,154 @@
+"""Local stand-ins for the Bedrock and Polly clients used by the benchmarks.
+
+Both are deterministic: latency is fixed plus seeded jitter, throttling follows
+a seeded random sequence and answers are derived from the prompt. `install()`
+registers them with aws_clients, so the app code under test is unchanged.
+"""
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from botocore.exceptions import ClientError
+from parameters.modules.asr_backends import ASRBackend
+from parameters.modules.aws_clients import register_client
+
+
+def sandbox(prefix="voicebot-bench-"):
+    """Create a scratch directory and point sessions, the answer store, the knowledge index and the janitor at it.
+
+    Call before the app modules are imported. The caller should also chdir into
+    it, because tts_outputs/ and uploads/ are relative to the working directory.
+    """
+    work_dir = tempfile.mkdtemp(prefix=prefix)
+    os.environ.setdefault("SESSION_FOLDER", os.path.join(work_dir, "sessions"))
+    os.environ.setdefault("ANSWER_STORE_PATH", os.path.join(work_dir, "answer_store.sqlite3"))
+    os.environ.setdefault("RAG_INDEX_DIR", os.path.join(work_dir, "rag_index"))
+    os.environ.setdefault("KNOWLEDGE_CORPUS_PATH", os.path.join(work_dir, "rag_index", "knowledge.corpus"))
+    os.environ.setdefault("WARMUP_MODE", "off")
+    os.environ.setdefault("JANITOR_INTERVAL", "1e9")
+    return work_dir
+
+
+class _Exceptions:
+    """Mirrors `client.exceptions` of a boto3 client (modelled exceptions subclass ClientError)."""
+
+    class ThrottlingException(ClientError):
+        pass
+
+    class ValidationException(ClientError):
+        pass
+
+
+class _FakeClient:
+    exceptions = _Exceptions
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, throttle_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    def _call(self, operation):
+        """Count the call, sleep for its latency and raise a throttle if this one is due."""
+        with self._lock:
+            self.calls += 1
+            throttle = self._random.random() < self.throttle_rate
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+            if throttle:
+                self.throttled += 1
+        if throttle:
+            time.sleep(min(delay, 5) / 1000)
+            raise _Exceptions.ThrottlingException(
+                {"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, operation
+            )
+        time.sleep(delay / 1000)
+
+    def stats(self):
+        return {"calls": self.calls, "throttled": self.throttled}
+
+
+class FakeBedrock(_FakeClient):
+    """invoke_model / invoke_model_with_response_stream for the Anthropic messages format."""
+
+    def __init__(self, latency_ms=800.0, jitter_ms=200.0, throttle_rate=0.0, seed=0, chunk_delay_ms=5.0):
+        super().__init__(latency_ms, jitter_ms, throttle_rate, seed)
+        self.chunk_delay_ms = chunk_delay_ms
+
+    @staticmethod
+    def answer_for(body):
+        messages = json.loads(body).get("messages", [])
+        prompt = messages[-1]["content"][0]["text"] if messages else ""
+        return f"This is a benchmark answer to: {prompt}. It has a few sentences. Nothing here is real."
+
+    def invoke_model(self, modelId, body, contentType=None, accept=None):
+        self._call("InvokeModel")
+        result = {"content": [{"type": "text", "text": self.answer_for(body)}],
+                  "usage": {"input_tokens": len(body) // 4, "output_tokens": 30}}
+        return {"body": io.BytesIO(json.dumps(result).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, contentType=None, accept=None):
+        self._call("InvokeModelWithResponseStream")
+        words = self.answer_for(body).split(" ")
+
+        def events():
+            for i, word in enumerate(words):
+                time.sleep(self.chunk_delay_ms / 1000)
+                delta = {"type": "content_block_delta", "delta": {"type": "text_delta", "text": (" " if i else "") + word}}
+                yield {"chunk": {"bytes": json.dumps(delta).encode("utf-8")}}
+
+        return {"body": events()}
+
+
+class FakePolly(_FakeClient):
+    """synthesize_speech returning a small, text-dependent fake MP3 body."""
+
+    def __init__(self, latency_ms=150.0, jitter_ms=50.0, throttle_rate=0.0, seed=0):
+        super().__init__(latency_ms, jitter_ms, throttle_rate, seed)
+
+    def synthesize_speech(self, Text, OutputFormat="mp3", VoiceId="Aditi", **kwargs):
+        self._call("SynthesizeSpeech")
+        return {"AudioStream": io.BytesIO(b"ID3" + Text.encode("utf-8")[:1024]), "ContentType": "audio/mpeg"}
+
+
+class FakeASR(ASRBackend):
+    """Fixed-latency speech-to-text: one made-up question per distinct audio length."""
+
+    name = "fake"
+
+    def __init__(self, latency_ms=300.0):
+        self.latency_ms = latency_ms
+
+    def detect_language(self, audio):
+        return "en"
+
+    def transcribe(self, audio, language=None):
+        time.sleep(self.latency_ms / 1000)
+        return f"question about recording {len(audio)}", language or "en"
+
+    def describe(self):
+        return {"backend": self.name, "latency_ms": self.latency_ms}
+
+
+def install_asr(backend):
+    """Make `backend` the process-wide ASR backend instead of loading Whisper."""
+    from parameters.modules import asr_backends
+    asr_backends._backend = backend
+    return backend
+
+
+def install(bedrock=None, polly=None, region="us-west-2"):
+    """Register the fakes (defaults if not given) as the shared Bedrock and Polly clients."""
+    bedrock = bedrock or FakeBedrock()
+    polly = polly or FakePolly()
+    register_client("bedrock-runtime", bedrock, region)
+    register_client("polly", polly, region)
+    return bedrock, polly
@@ -0,0 +1,441 @@
+"""Load generation and trace replay for the voice API.
+
+    # a server with local fake Bedrock/Polly (and optionally a fake ASR)
+    python benchmarks/loadgen.py serve --mode flask --workers 2 --port 8100 --fake-asr-ms 300
+
+    # closed loop at a fixed concurrency, or open loop at an arrival rate
+    python benchmarks/loadgen.py run --url http://127.0.0.1:8100 --concurrency 16 --duration 30
+    python benchmarks/loadgen.py run --url http://127.0.0.1:8100 --rate 20 --duration 30 --save-trace t.jsonl
+
+    # replay a trace recorded by the server (TRACE_LOG_FILE) or by --save-trace
+    python benchmarks/loadgen.py replay --url http://127.0.0.1:8100 --trace t.jsonl --speed 2
+
+    # saturation point per server mode and worker count (starts and stops the servers itself)
+    python benchmarks/loadgen.py sweep --modes flask asgi --workers 1 2 4 --levels 1 2 4 8 16 32
+
+The workload is the questions in demo/test.csv and the recordings in
+benchmarks/fixtures/audio/, mixed by --mix. Every command prints and
+optionally writes (--output) a JSON report.
+"""
+import argparse
+import bisect
+import csv
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+QUESTIONS_FILE = os.path.join(REPO_DIR, "demo", "test.csv")
+# Kept out of voicebot-backend/uploads, which the janitor empties
+AUDIO_DIR = os.path.join(REPO_DIR, "benchmarks", "fixtures", "audio")
+REQUEST_TIMEOUT = 120
+AUDIO_TYPES = {".mp3": "audio/mpeg", ".wav": "audio/wav", ".webm": "audio/webm", ".ogg": "audio/ogg"}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+# --- workload ---
+
+class Workload:
+    """Builds requests from the question set and the recorded audio."""
+
+    def __init__(self, questions_file=QUESTIONS_FILE, audio_dir=AUDIO_DIR, mix=None, seed=0, novel_rate=0.0):
+        with open(questions_file, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.reader(f))[1:]
+        self.questions = [row[0].strip() for row in rows if row and row[0].strip()]
+        self.audio = sorted(
+            (os.path.getsize(os.path.join(audio_dir, name)), os.path.join(audio_dir, name))
+            for name in os.listdir(audio_dir) if os.path.splitext(name)[1].lower() in AUDIO_TYPES
+        ) if os.path.isdir(audio_dir) else []
+        self.mix = mix or {"/query": 1.0}
+        self.novel_rate = novel_rate
+        if self.mix.get("/transcribe") and not self.audio:
+            raise SystemExit(f"No recordings in {audio_dir} for /transcribe")
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next(self):
+        """A request dict for the next arrival, drawn by --mix."""
+        with self._lock:
+            path = self.random.choices(list(self.mix), list(self.mix.values()))[0]
+            if path == "/transcribe":
+                return {"path": path, "audio": self.random.choice(self.audio)[1]}
+            text = self.random.choice(self.questions)
+            if self.random.random() < self.novel_rate:
+                # An unseen token defeats the answer store and TF-IDF reuse, so the request reaches Bedrock
+                text = f"{text} ref{self.random.getrandbits(40):x}"
+            return {"path": path, "text": text, "session_id": f"load-{self.random.randrange(1000)}"}
+
+    def audio_near(self, size):
+        """The recording whose size is closest to `size` (traces only keep the size)."""
+        i = bisect.bisect_left(self.audio, (size, ""))
+        candidates = self.audio[max(0, i - 1):i + 1]
+        return min(candidates, key=lambda item: abs(item[0] - size))[1]
+
+    def from_trace(self, entry):
+        """A request dict reproducing one trace entry."""
+        path = entry["path"]
+        if path == "/transcribe":
+            return {"path": path, "audio": self.audio_near(entry.get("audio_bytes", 0))}
+        text = entry.get("text")
+        if not text:
+            with self._lock:
+                text = self.random.choice(self.questions)
+        return {"path": path, "text": text, "session_id": entry.get("session_id", "default")}
+
+
+_audio_cache = {}
+_local = threading.local()
+
+def send(base_url, req):
+    """Issue one request; returns (status or None, error or None). Streams are read to the end."""
+    http = getattr(_local, "session", None)
+    if http is None:
+        http = _local.session = requests.Session()
+    url = base_url.rstrip("/") + req["path"]
+    try:
+        if req["path"] == "/transcribe":
+            data = _audio_cache.get(req["audio"])
+            if data is None:
+                with open(req["audio"], "rb") as f:
+                    data = _audio_cache[req["audio"]] = f.read()
+            name = os.path.basename(req["audio"])
+            content_type = AUDIO_TYPES.get(os.path.splitext(name)[1].lower(), "application/octet-stream")
+            response = http.post(url, files={"audio": (name, data, content_type)}, timeout=REQUEST_TIMEOUT)
+        else:
+            body = {"text": req["text"], "session_id": req.get("session_id", "default")}
+            response = http.post(url, json=body, timeout=REQUEST_TIMEOUT, stream=req["path"].endswith("/stream"))
+        for _ in response.iter_content(65536):
+            pass
+        return response.status_code, None
+    except requests.RequestException as e:
+        return None, type(e).__name__
+
+
+class Recorder:
+    """Collects (path, scheduled offset, latency, status, error) per request."""
+
+    def __init__(self):
+        self.results = []
+        self.trace = []
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def add(self, req, offset, latency, status, error):
+        with self._lock:
+            self.results.append((req["path"], offset, latency, status, error))
+            entry = {"t": round(offset, 4), "path": req["path"]}
+            if req["path"] == "/transcribe":
+                entry["audio_bytes"] = os.path.getsize(req["audio"])
+            else:
+                entry.update(text=req["text"], session_id=req.get("session_id", "default"))
+            self.trace.append(entry)
+
+
+def run_closed(base_url, workload, concurrency, duration, recorder=None):
+    """`concurrency` clients, each sending its next request as soon as the last one returns."""
+    recorder = recorder or Recorder()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            req = workload.next()
+            started = time.perf_counter()
+            status, error = send(base_url, req)
+            recorder.add(req, started - recorder.started, time.perf_counter() - started, status, error)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder
+
+
+def run_open(base_url, schedule, max_in_flight=512, recorder=None):
+    """Send each (offset seconds, request) at its offset, whether or not earlier ones have returned.
+
+    Latency is measured from the scheduled time, so requests that queue because
+    the client or server is saturated are not under-reported.
+    """
+    recorder = recorder or Recorder()
+
+    def fire(offset, req):
+        status, error = send(base_url, req)
+        scheduled = recorder.started + offset
+        recorder.add(req, offset, time.perf_counter() - scheduled, status, error)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="loadgen") as pool:
+        for offset, req in schedule:
+            delay = recorder.started + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, offset, req)
+    return recorder
+
+
+def poisson_schedule(workload, rate, duration, seed=0):
+    rng = random.Random(seed)
+    offset, schedule = 0.0, []
+    while True:
+        offset += rng.expovariate(rate)
+        if offset >= duration:
+            return schedule
+        schedule.append((offset, workload.next()))
+
+
+def load_trace(path, workload, speed=1.0):
+    """(offset, request) pairs from a JSONL trace, with time compressed by `speed`."""
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    entries = [e for e in entries if e.get("path") in ("/query", "/query/stream", "/transcribe")]
+    if not entries:
+        raise SystemExit(f"No replayable requests in {path}")
+    entries.sort(key=lambda e: e["t"])
+    start = entries[0]["t"]
+    return [((e["t"] - start) / speed, workload.from_trace(e)) for e in entries]
+
+
+# --- reporting ---
+
+def _stats(rows, wall):
+    latencies = [r[2] for r in rows]
+    ok = [r for r in rows if r[3] is not None and r[3] < 400]
+    return {
+        "requests": len(rows),
+        "throughput_rps": round(len(ok) / wall, 2) if wall else 0.0,
+        "error_rate": round(1 - len(ok) / len(rows), 4) if rows else 0.0,
+        "5xx_rate": round(sum(r[3] is not None and r[3] >= 500 for r in rows) / len(rows), 4) if rows else 0.0,
+        "transport_errors": sum(r[3] is None for r in rows),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def summarize(recorder):
+    wall = time.perf_counter() - recorder.started
+    report = {"wall_seconds": round(wall, 2), **_stats(recorder.results, wall), "by_endpoint": {}}
+    for path in sorted({r[0] for r in recorder.results}):
+        report["by_endpoint"][path] = _stats([r for r in recorder.results if r[0] == path], wall)
+    return report
+
+
+def saturation(levels):
+    """The lowest load level reaching 95% of peak throughput: beyond it, load only adds latency."""
+    if not levels:
+        return None
+    peak = max(level["throughput_rps"] for level in levels)
+    for level in levels:
+        if level["throughput_rps"] >= 0.95 * peak:
+            return {"concurrency": level["concurrency"], "throughput_rps": level["throughput_rps"],
+                    "p95_ms": level["p95_ms"], "peak_throughput_rps": peak}
+
+
+# --- server under test ---
+
+def _serve_worker(mode, fd, port, args):
+    from fakes import FakeASR, FakeBedrock, FakePolly, install, install_asr, sandbox
+
+    os.chdir(sandbox("voicebot-load-"))
+    install(FakeBedrock(args.bedrock_latency_ms, args.bedrock_latency_ms / 4, args.throttle_rate, seed=os.getpid()),
+            FakePolly(args.polly_latency_ms, args.polly_latency_ms / 4, seed=os.getpid()))
+    if args.fake_asr_ms is not None:
+        install_asr(FakeASR(args.fake_asr_ms))
+
+    if mode == "asgi":
+        import asyncio
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config
+        from main_async import app
+
+        config = Config()
+        config.bind = [f"fd://{fd}"]
+        config.accesslog = None
+        asyncio.run(serve(app, config))
+    else:
+        from werkzeug.serving import make_server
+        from main import app, start_services
+
+        start_services()
+        make_server("127.0.0.1", port, app, threaded=True, fd=fd).serve_forever()
+
+
+def serve(args):
+    """Workers forked onto one shared listening socket, each with its own fakes and state directory."""
+    import multiprocessing
+
+    # Shared by every worker, and bound before any app module is imported
+    os.environ.setdefault("WARMUP_MODE", "blocking")
+    sys.path.insert(0, REPO_DIR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(1024)
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_serve_worker, args=(args.mode, listener.fileno(), args.port, args), daemon=True)
+               for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"🚦 {args.mode} x{args.workers} on http://{args.host}:{args.port}", flush=True)
+    try:
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            worker.terminate()
+
+
+def wait_until_up(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url.rstrip("/") + "/healthz", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def sweep(args, workload):
+    """Start each mode x worker count, then step closed-loop concurrency up through --levels."""
+    report = {}
+    for mode in args.modes:
+        for workers in args.workers:
+            command = [sys.executable, os.path.abspath(__file__), "serve", "--mode", mode, "--workers", str(workers),
+                       "--port", str(args.port), "--bedrock-latency-ms", str(args.bedrock_latency_ms),
+                       "--polly-latency-ms", str(args.polly_latency_ms), "--throttle-rate", str(args.throttle_rate)]
+            if args.fake_asr_ms is not None:
+                command += ["--fake-asr-ms", str(args.fake_asr_ms)]
+            log_path = os.path.join(tempfile.gettempdir(), f"loadgen-{mode}x{workers}.log")
+            with open(log_path, "w") as log:
+                server = subprocess.Popen(command, cwd=REPO_DIR, stdout=log, stderr=subprocess.STDOUT)
+            url = f"http://127.0.0.1:{args.port}"
+            try:
+                if not wait_until_up(url, args.startup_timeout):
+                    print(f"❌ {mode} x{workers} did not come up (see {log_path})")
+                    continue
+                # One unmeasured pass so lazy loading and first-request costs stay out of the numbers
+                run_closed(url, workload, max(args.levels[0], workers), min(5, args.duration))
+                levels = []
+                for level in args.levels:
+                    result = summarize(run_closed(url, workload, level, args.duration))
+                    levels.append({"concurrency": level, **result})
+                    print(f"   {mode} x{workers} c={level}: {result['throughput_rps']} rps, "
+                          f"p95 {result['p95_ms']} ms, errors {result['error_rate']:.1%}")
+                report[f"{mode}x{workers}"] = {"mode": mode, "workers": workers, "levels": levels,
+                                               "saturation": saturation(levels)}
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+    return report
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        path, _, weight = part.partition("=")
+        mix["/" + path.strip().lstrip("/")] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def upstream_options(p):
+        p.add_argument("--bedrock-latency-ms", type=float, default=800.0)
+        p.add_argument("--polly-latency-ms", type=float, default=150.0)
+        p.add_argument("--throttle-rate", type=float, default=0.0)
+        p.add_argument("--fake-asr-ms", type=float, help="replace Whisper with a fixed-latency fake")
+
+    def load_options(p):
+        p.add_argument("--mix", type=parse_mix, default={"/query": 1.0},
+                       help="endpoint weights, e.g. query=0.8,transcribe=0.2 (query/stream also works)")
+        p.add_argument("--questions", default=QUESTIONS_FILE)
+        p.add_argument("--audio", default=AUDIO_DIR)
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument("--novel-rate", type=float, default=0.5,
+                       help="share of questions made unique so they miss the local tiers")
+        p.add_argument("--output", help="write the JSON report here")
+
+    p = commands.add_parser("serve", help="run the app with local fake upstreams")
+    p.add_argument("--mode", choices=("flask", "asgi"), default="flask")
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8100)
+    upstream_options(p)
+
+    p = commands.add_parser("run", help="closed loop (--concurrency) or open loop (--rate)")
+    p.add_argument("--url", required=True)
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument("--concurrency", type=int)
+    group.add_argument("--rate", type=float, help="Poisson arrivals per second")
+    p.add_argument("--duration", type=float, default=30.0)
+    p.add_argument("--save-trace", help="write the requests sent as a replayable JSONL trace")
+    load_options(p)
+
+    p = commands.add_parser("replay", help="replay a JSONL trace at its recorded arrival times")
+    p.add_argument("--url", required=True)
+    p.add_argument("--trace", required=True)
+    p.add_argument("--speed", type=float, default=1.0, help="time compression, e.g. 2 = twice as fast")
+    load_options(p)
+
+    p = commands.add_parser("sweep", help="saturation point per server mode and worker count")
+    p.add_argument("--modes", nargs="+", choices=("flask", "asgi"), default=["flask"])
+    p.add_argument("--workers", type=int, nargs="+", default=[1])
+    p.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    p.add_argument("--duration", type=float, default=20.0, help="seconds per level")
+    p.add_argument("--port", type=int, default=8100)
+    p.add_argument("--startup-timeout", type=float, default=180.0)
+    upstream_options(p)
+    load_options(p)
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        return serve(args)
+
+    workload = Workload(args.questions, args.audio, args.mix, args.seed, args.novel_rate)
+    if args.command == "run":
+        if args.rate:
+            recorder = run_open(args.url, poisson_schedule(workload, args.rate, args.duration, args.seed))
+        else:
+            recorder = run_closed(args.url, workload, args.concurrency, args.duration)
+        report = summarize(recorder)
+        if args.save_trace:
+            with open(args.save_trace, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in sorted(recorder.trace, key=lambda e: e["t"]))
+    elif args.command == "replay":
+        report = summarize(run_open(args.url, load_trace(args.trace, workload, args.speed)))
+    else:
+        report = sweep(args, workload)
+
+    print("📊 " + json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
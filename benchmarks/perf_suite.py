@@ -0,0 +1,276 @@
+"""Offline performance benchmarks for the request hot paths.
+
+Runs without AWS or network: Bedrock and Polly are replaced by the seeded
+fakes in benchmarks/fakes.py, and sessions, the answer store and TTS output go
+to a temporary directory. Results are written as JSON; pass an earlier result
+file as --compare to print the relative change of every timing.
+
+    python benchmarks/perf_suite.py --output bench_main.json
+    python benchmarks/perf_suite.py --only search context --compare bench_main.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(REPO_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from fakes import FakeBedrock, FakePolly, install, sandbox
+
+# Must happen before the app modules are imported
+WORK_DIR = sandbox()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def timings_ms(samples):
+    """p50/p95/mean of durations given in seconds, in milliseconds."""
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+class SyntheticText:
+    """Seeded word generator with a Zipf-like word frequency, so TF-IDF sees realistic sparsity."""
+
+    def __init__(self, seed=0, vocabulary=5000):
+        self.random = random.Random(seed)
+        self.words = ["".join(self.random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(self.random.randint(3, 9)))
+                      for _ in range(vocabulary)]
+        self.weights = [1 / (i + 1) for i in range(vocabulary)]
+
+    def sentence(self, low=8, high=25):
+        return " ".join(self.random.choices(self.words, self.weights, k=self.random.randint(low, high)))
+
+
+# --- benchmarks ---
+
+def bench_search(sizes, queries=200):
+    """search_local_knowledge against a TF-IDF index of n synthetic records."""
+    from parameters.modules import rag_fallback
+    from parameters.modules.rag_fallback import LocalKnowledgeIndex, search_local_knowledge
+
+    results = []
+    for n in sizes:
+        text = SyntheticText(seed=n)
+        index = LocalKnowledgeIndex(corpus_path=os.path.join(WORK_DIR, f"search-{n}.corpus"),
+                                    index_dir=os.path.join(WORK_DIR, f"search-{n}"), refresh_interval=float("inf"))
+        records = [(text.sentence(), "summary", None) for _ in range(n)]
+        started = time.perf_counter()
+        for start in range(0, n, 10):
+            index.add_records(f"source-{start}", records[start:start + 10])
+        build = time.perf_counter() - started
+        first_query, _ = timed(index.scores, "warm up")  # derives the weighted matrix
+        lsh_build, _ = timed(index.near_duplicate, "")   # builds the near-duplicate tier
+
+        # Half are exact record texts (local hits), half fresh sentences (misses)
+        probe = [records[text.random.randrange(n)][0] if i % 2 else text.sentence() for i in range(queries)]
+        previous, rag_fallback._index = rag_fallback._index, index
+        samples, hits = [], 0
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for query in probe:
+                    elapsed, answer = timed(search_local_knowledge, query, mode="tfidf")
+                    samples.append(elapsed)
+                    hits += answer is not None
+        finally:
+            rag_fallback._index = previous
+        results.append({"records": n, "vocabulary": len(index.vocabulary), "build_s": round(build, 3),
+                        "matrix_build_ms": round(first_query * 1000, 3), "lsh_build_ms": round(lsh_build * 1000, 3),
+                        "hit_rate": hits / queries,
+                        **timings_ms(samples)})
+        print(f"🔎 search n={n}: p50 {results[-1]['p50_ms']} ms, p95 {results[-1]['p95_ms']} ms")
+    return results
+
+
+def bench_context(lengths, samples=50):
+    """Per-turn save cost while a session grows, then cold load and context build at that length."""
+    from parameters.modules.context_builder import build_context
+    from parameters.modules.context_manager import ConversationContext
+    from parameters.modules.session_store import SessionStore
+
+    results = []
+    for n in lengths:
+        folder = os.path.join(WORK_DIR, f"context-{n}")
+        text = SyntheticText(seed=n)
+        context = ConversationContext(SessionStore(folder=folder))
+        saves = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(n):
+                context.add_turn("bench", "user" if i % 2 == 0 else "assistant", text.sentence(10, 60))
+                elapsed, _ = timed(context.save_session, "bench")
+                saves.append(elapsed)
+
+            loads, builds = [], []
+            for _ in range(samples):
+                # A new store has nothing cached, like the first request after a restart
+                cold = ConversationContext(SessionStore(folder=folder))
+                elapsed, _ = timed(cold.load_session, "bench")
+                loads.append(elapsed)
+                elapsed, _ = timed(build_context, cold, "bench")
+                builds.append(elapsed)
+
+        results.append({
+            "turns": n,
+            "log_bytes": os.path.getsize(os.path.join(folder, "bench.jsonl")),
+            "save": timings_ms(saves[-min(len(saves), 1000):]),
+            "cold_load": timings_ms(loads),
+            "build_context": timings_ms(builds),
+        })
+        print(f"💬 context turns={n}: save p50 {results[-1]['save']['p50_ms']} ms, "
+              f"cold load p50 {results[-1]['cold_load']['p50_ms']} ms")
+    return results
+
+
+def bench_transcript(segment_counts, repeats=5):
+    """extract_conversation_text on transcript JSON files of growing size."""
+    from textanalysis.textsummary import extract_conversation_text
+
+    results = []
+    for n in segment_counts:
+        text = SyntheticText(seed=n)
+        path = os.path.join(WORK_DIR, f"transcript-{n}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"segments": [{"speaker_id": f"spk_{i % 2}", "text": text.sentence(5, 30),
+                                     "start_time": i * 2.5, "end_time": i * 2.5 + 2.0} for i in range(n)]}, f)
+        size = os.path.getsize(path)
+        samples = [timed(extract_conversation_text, path)[0] for _ in range(repeats)]
+        results.append({"segments": n, "file_bytes": size,
+                        "mb_per_s": round(size / 1e6 / percentile(samples, 50), 1), **timings_ms(samples)})
+        print(f"📄 transcript segments={n}: p50 {results[-1]['p50_ms']} ms ({results[-1]['mb_per_s']} MB/s)")
+    return results
+
+
+def bench_query(requests, bedrock_ms, polly_ms, throttle_rate):
+    """POST /query through the Flask test client: new questions (Bedrock) and repeats (answer store)."""
+    bedrock, polly = install(FakeBedrock(bedrock_ms, bedrock_ms / 4, throttle_rate, seed=1),
+                             FakePolly(polly_ms, polly_ms / 4, seed=2))
+    cwd = os.getcwd()
+    os.chdir(WORK_DIR)  # tts_outputs/ is relative to the working directory
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main
+            client = main.app.test_client()
+            client.post("/query", json={"text": "warm up the index"})
+
+            text = SyntheticText(seed=7)
+            questions = [text.sentence(6, 14) for _ in range(requests)]
+            results = {}
+            for name, batch in (("new_questions", questions), ("repeated_questions", questions)):
+                samples, stages, errors = [], {}, 0
+                for question in batch:
+                    elapsed, response = timed(client.post, "/query", json={"text": question})
+                    samples.append(elapsed)
+                    errors += response.status_code != 200
+                    for entry in response.headers.get("Server-Timing", "").split(","):
+                        stage, _, rest = entry.strip().partition(";dur=")
+                        if stage and rest:
+                            stages.setdefault(stage, []).append(float(rest.split(";")[0]) / 1000)
+                results[name] = {"requests": len(batch), "errors": errors, **timings_ms(samples),
+                                 "stages_mean_ms": {s: round(sum(v) / len(batch) * 1000, 3) for s, v in stages.items()}}
+    finally:
+        os.chdir(cwd)
+    results["upstream"] = {"bedrock": bedrock.stats(), "polly": polly.stats(),
+                           "bedrock_latency_ms": bedrock_ms, "polly_latency_ms": polly_ms, "throttle_rate": throttle_rate}
+    print(f"🌐 /query: new p50 {results['new_questions']['p50_ms']} ms, "
+          f"repeated p50 {results['repeated_questions']['p50_ms']} ms")
+    return results
+
+
+# --- reporting ---
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def _leaves(node, path=""):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from _leaves(value, f"{path}.{key}" if path else key)
+    elif isinstance(node, list):
+        for i, value in enumerate(node):
+            # Rows are keyed by their size parameter (their first field), so runs with other sizes still line up
+            label = "{}={}".format(*next(iter(value.items()))) if isinstance(value, dict) and value else i
+            yield from _leaves(value, f"{path}[{label}]")
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield path, node
+
+
+def compare(baseline, current):
+    """Print every timing present in both runs with its relative change."""
+    old = {path: value for path, value in _leaves(baseline["results"]) if path.endswith(("_ms", ".build_s"))}
+    print(f"📊 {baseline['meta'].get('commit')} -> {current['meta'].get('commit')}")
+    for path, value in _leaves(current["results"]):
+        if path in old and old[path]:
+            change = (value - old[path]) / old[path] * 100
+            flag = " ⚠️" if change > 10 else ""
+            print(f"   {path:<60} {old[path]:>10.3f} -> {value:>10.3f} ({change:+.1f}%){flag}")
+
+
+BENCHMARKS = ("search", "context", "transcript", "query")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--search-sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--session-lengths", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--transcript-segments", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--query-requests", type=int, default=50)
+    parser.add_argument("--bedrock-latency-ms", type=float, default=100.0)
+    parser.add_argument("--polly-latency-ms", type=float, default=20.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--output", default="perf_results.json")
+    parser.add_argument("--compare", help="earlier --output file to compare against")
+    args = parser.parse_args()
+
+    results = {}
+    if "search" in args.only:
+        results["search"] = bench_search(args.search_sizes)
+    if "context" in args.only:
+        results["context"] = bench_context(args.session_lengths)
+    if "transcript" in args.only:
+        results["transcript"] = bench_transcript(args.transcript_segments)
+    if "query" in args.only:
+        results["query"] = bench_query(args.query_requests, args.bedrock_latency_ms,
+                                       args.polly_latency_ms, args.throttle_rate)
+
+    report = {"meta": metadata(), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results written to {args.output} (scratch files in {WORK_DIR})")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,50 +2,244 @@ import csv
 import sys
 import os
 import time
+import json
+import random
+import argparse
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from parameters.modules.response_gen import generate_response_bedrock
-
-INPUT_FILE = "test.csv"
-OUTPUT_FILE = "suhanipugalia12_output.csv"
-
-if not os.path.exists(INPUT_FILE):
-    raise FileNotFoundError(f"Input file '{INPUT_FILE}' not found")
-
-with open(INPUT_FILE, newline='', encoding='utf-8') as infile, \
-     open(OUTPUT_FILE, mode='w', newline='', encoding='utf-8') as outfile:
-
-    # 🔴 KEY CHANGE: Use csv.reader (not DictReader) to get raw rows
-    reader = csv.reader(infile)
-    headers = next(reader)  # Read the header row
-    
-    # Use first column as questions (regardless of header name)
-    question_col_index = 0  
-    question_header = headers[question_col_index] if headers else "Question"
-    
-    writer = csv.DictWriter(outfile, fieldnames=["Question", "Response"])
-    writer.writeheader()
-
-    for row in reader:
-        question = row[question_col_index].strip() if row else ""
-        
-        if not question:
-            writer.writerow({"Question": "", "Response": ""})
-            continue
+from botocore.exceptions import ClientError
+from parameters.modules.response_gen import (
+    FALLBACK_MSG, build_payload, call_with_retries, chat_context, client_error_message, create_bedrock_client,
+    extract_answer, invoke_claude, is_throttle, record_answer, use_local_answer
+)
+
+# Batch evaluation: runs every question of INPUT_FILE through the same steps as
+# generate_response_bedrock, several at a time, and records how long each step took.
+# Rows land in OUTPUT_FILE as they finish and are put back in input order at the end;
+# suhanipugalia12_output.csv is the earlier sequential run and is left as it is.
+DEMO_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUT_FILE = os.path.join(DEMO_DIR, "test.csv")
+OUTPUT_FILE = os.path.join(DEMO_DIR, "eval_output.csv")
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "8"))
+
+FIELDNAMES = ["Row", "Question", "Response", "Source", "LocalMs", "LlmMs", "TotalMs", "Attempts", "Throttles"]
+
+
+class AdaptiveLimiter:
+    """AIMD cap on in-flight Bedrock calls: halved on every throttle, +1 per `limit` successes."""
+
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self.throttles = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= max(1, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttles += 1
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+def jittered_sleep(seconds):
+    # Jittered so throttled workers don't all come back at once
+    time.sleep(seconds * random.uniform(0.5, 1.0))
+
+
+def ms_since(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def ask(question, session_id, client, limiter):
+    """One question as generate_response_bedrock answers it, with per-step timings."""
+    row = {"Source": "llm", "LocalMs": 0.0, "LlmMs": 0.0, "Attempts": 0, "Throttles": 0}
+    row.update(answer(question, session_id, client, limiter, row))
+    return row
+
+
+def answer(question, session_id, client, limiter, row):
+    """Response and Source for `question`; fills in row's LocalMs, LlmMs, Attempts and Throttles."""
+    start = time.perf_counter()
+    local_answer = use_local_answer(question, session_id)
+    row["LocalMs"] = ms_since(start)
+    if local_answer:
+        return {"Response": local_answer, "Source": "local"}
+
+    payload = build_payload(question, session_id)
+    if isinstance(payload, str):
+        return {"Response": payload, "Source": "error"}
+
+    def attempt():
+        limiter.acquire()
+        throttled = False
+        row["Attempts"] += 1
+        try:
+            return invoke_claude(client, payload)
+        except Exception as e:
+            throttled = is_throttle(e)
+            row["Throttles"] += throttled
+            raise
+        finally:
+            limiter.release(throttled)
+
+    start = time.perf_counter()
+    try:
+        result = call_with_retries(attempt, jittered_sleep)
+    except ClientError as e:
+        return {"Response": client_error_message(e, payload), "Source": "error"}
+    except Exception as e:
+        return {"Response": f"❌ Unexpected error: {e}", "Source": "error"}
+    finally:
+        row["LlmMs"] = ms_since(start)  # includes the backoff between throttled attempts
+    if result is None:
+        return {"Response": FALLBACK_MSG, "Source": "error"}
 
+    text, error_msg = extract_answer(result)
+    if error_msg:
+        return {"Response": error_msg, "Source": "error"}
+    record_answer(session_id, question, text)
+    return {"Response": text, "Source": "llm"}
+
+
+def read_questions(path):
+    with open(path, newline='', encoding='utf-8-sig') as infile:
+        reader = csv.reader(infile)
+        next(reader, None)  # header row; the first column is the question whatever its name
+        return [row[0].strip() if row else "" for row in reader]
+
+
+def completed_rows(path):
+    """Rows already in `path` from an earlier (possibly interrupted) run, by row number; None if it has another layout."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames != FIELDNAMES:
+            return None
+        return {int(r["Row"]): r for r in reader}
+
+
+def write_rows(path, rows):
+    """Rewrite `path` with `rows` in input order."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(sorted(rows, key=lambda r: int(r["Row"])))
+    os.replace(tmp, path)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(rows, wall_seconds):
+    answered = [r for r in rows if r["Question"]]
+    report = {
+        "questions": len(answered),
+        "wall_seconds": round(wall_seconds, 2),
+        "throughput_qps": round(len(answered) / wall_seconds, 2) if wall_seconds else 0.0,
+        "local_hit_rate": round(sum(r["Source"] == "local" for r in answered) / len(answered), 3) if answered else 0.0,
+        "errors": sum(r["Source"] == "error" for r in answered),
+        "throttles": sum(int(r["Throttles"]) for r in answered),
+    }
+    for column, name in (("TotalMs", "total_ms"), ("LocalMs", "local_ms"), ("LlmMs", "llm_ms")):
+        values = [float(r[column]) for r in answered if column != "LlmMs" or r["Source"] != "local"]
+        report[name] = {f"p{q}": round(percentile(values, q), 1) for q in (50, 95, 99)}
+    return report
+
+
+def run(input_file=INPUT_FILE, output_file=OUTPUT_FILE, concurrency=EVAL_CONCURRENCY, fresh=False):
+    if not os.path.exists(input_file):
+        raise FileNotFoundError(f"Input file '{input_file}' not found")
+
+    questions = read_questions(input_file)
+    done = {} if fresh else completed_rows(output_file)
+    if done is None:
+        print(f"⚠️ '{output_file}' has an older layout; starting over")
+        fresh, done = True, {}
+    todo = [(i, q) for i, q in enumerate(questions) if i not in done]
+    print(f"📋 {len(questions)} questions, {len(done)} already answered, {len(todo)} to run (concurrency {concurrency})")
+
+    client = create_bedrock_client()
+    limiter = AdaptiveLimiter(concurrency)
+    write_lock = threading.Lock()
+    run_id = int(time.time())
+    rows = []
+
+    def evaluate(i, question):
+        if not question:
+            return {"Row": i, "Question": "", "Response": "", "Source": "", "LocalMs": 0, "LlmMs": 0,
+                    "TotalMs": 0, "Attempts": 0, "Throttles": 0}
+        # Each question gets its own session so concurrent rows don't share history
+        session_id = f"eval-{run_id}-{i}"
+        start = time.perf_counter()
         try:
-            print(f"Processing: {question}")
-            response = generate_response_bedrock(question)
-            print(f"Response: {response}")
+            row = ask(question, session_id, client, limiter)
         except Exception as e:
             print(f"Error processing: {question}\n{traceback.format_exc()}")
-            response = f"[Error: {str(e)}]"
-        
-        writer.writerow({
-            "Question": question,
-            "Response": response
-        })
-        time.sleep(0.5)
-
-print(f"Output saved to {OUTPUT_FILE}")
\ No newline at end of file
+            row = {"Response": f"[Error: {str(e)}]", "Source": "error", "LocalMs": 0, "LlmMs": 0,
+                   "Attempts": 0, "Throttles": 0}
+        finally:
+            chat_context.reset(session_id)
+        row.update(Row=i, Question=question, TotalMs=ms_since(start))
+        for column in ("LocalMs", "LlmMs", "TotalMs"):
+            row[column] = round(row[column], 1)
+        return row
+
+    start = time.perf_counter()
+    write_header = fresh or not done
+    with open(output_file, mode='w' if write_header else 'a', newline='', encoding='utf-8') as outfile:
+        writer = csv.DictWriter(outfile, fieldnames=FIELDNAMES)
+        if write_header:
+            writer.writeheader()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="eval") as pool:
+            futures = [pool.submit(evaluate, i, q) for i, q in todo]
+            for future in as_completed(futures):
+                row = future.result()
+                with write_lock:
+                    # Flushed per row so an interrupted run resumes where it stopped
+                    writer.writerow(row)
+                    outfile.flush()
+                rows.append(row)
+                print(f"[{len(rows)}/{len(todo)}] {row['Source'] or '-'} {row['TotalMs']:.0f} ms: {row['Question']}")
+    wall = time.perf_counter() - start
+    write_rows(output_file, list(done.values()) + rows)
+
+    report = summarize(rows, wall)
+    report["concurrency_limit_at_end"] = int(limiter.limit)
+    print(f"Output saved to {output_file}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a CSV of questions and report latency percentiles")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY)
+    parser.add_argument("--fresh", action="store_true", help="ignore rows already in --output and start over")
+    parser.add_argument("--report", help="also write the summary report as JSON to this path")
+    args = parser.parse_args()
+
+    report = run(args.input, args.output, args.concurrency, args.fresh)
+    print("📊 " + json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
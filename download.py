@@ -100,48 +100,140 @@
 
 # if __name__ == "__main__":
 #     process_transcripts()
-import boto3
 import re
 import json
 import os
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from parameters.modules.aws_clients import get_client, set_endpoint
+from parameters.modules.knowledge_corpus import SOURCE_FOLDERS, compile_corpus
 
 # --- Configuration ---
-bucket_name = 'transcriptfull'
-prefix = 'summaries/'  # Folder path in the bucket
-local_output_dir = 'converted_jsons'
-os.makedirs(local_output_dir, exist_ok=True)
+bucket_name = os.getenv("S3_BUCKET", 'transcriptfull')
+prefix = os.getenv("S3_PREFIX", 'summaries/')  # Folder path in the bucket
+local_output_dir = os.getenv("CONVERTED_JSONS_DIR", SOURCE_FOLDERS[0])  # where the knowledge corpus reads them
+SYNC_WORKERS = int(os.getenv("SYNC_WORKERS", "16"))
+MANIFEST_NAME = ".s3_sync_manifest.json"  # key -> ETag/LastModified/local file; a dotfile, so the corpus skips it
 
-# --- Connect to S3 ---
-s3 = boto3.client('s3')
-
-# --- List text files in the prefix ---
-response = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-files = [obj['Key'] for obj in response.get('Contents', []) if obj['Key'].endswith('.txt')]
-
-# --- Regex patterns to extract fields ---
+# --- Regex patterns to extract fields (compiled once) ---
 patterns = {
-    'summary': r'\*\*1\. Summary of the conversation:\*\*\s*(.*?)(?=\*\*2\.|$)',
-    'customer_concerns': r'\*\*2\. Customer concerns:\*\*\s*(.*?)(?=\*\*3\.|$)',
-    'questions_asked': r'\*\*3\. Questions asked:\*\*\s*(.*?)(?=\*\*4\.|$)',
-    'overall_sentiment': r'\*\*4\. Overall sentiment:\*\*\s*(.*)'
+    'summary': re.compile(r'\*\*1\. Summary of the conversation:\*\*\s*(.*?)(?=\*\*2\.|$)', re.DOTALL),
+    'customer_concerns': re.compile(r'\*\*2\. Customer concerns:\*\*\s*(.*?)(?=\*\*3\.|$)', re.DOTALL),
+    'questions_asked': re.compile(r'\*\*3\. Questions asked:\*\*\s*(.*?)(?=\*\*4\.|$)', re.DOTALL),
+    'overall_sentiment': re.compile(r'\*\*4\. Overall sentiment:\*\*\s*(.*)', re.DOTALL)
 }
 
-# --- Process each file ---
-for key in files:
-    filename = os.path.basename(key)
-    file_obj = s3.get_object(Bucket=bucket_name, Key=key)
-    text = file_obj['Body'].read().decode('utf-8')
-
-    # Extract fields
+def extract_fields(text):
     extracted = {}
     for field, pattern in patterns.items():
-        match = re.search(pattern, text, re.DOTALL)
+        match = pattern.search(text)
         if match:
             extracted[field] = match.group(1).strip()
-
-    # Save JSON locally
-    json_filename = filename.replace('.txt', '.json')
-    with open(os.path.join(local_output_dir, json_filename), 'w', encoding='utf-8') as f:
-        json.dump(extracted, f, indent=4)
-
-    print(f"Saved: {json_filename}")
\ No newline at end of file
+    return extracted
+
+def list_text_objects(s3, bucket, prefix):
+    """Every .txt object under `prefix`, following pagination past 1,000 keys."""
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('.txt'):
+                yield obj
+
+def object_version(obj):
+    return {"etag": obj['ETag'].strip('"'), "last_modified": str(obj['LastModified'])}
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(path, manifest):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def fetch_and_convert(s3, bucket, key, output_dir):
+    """Download one summary .txt and write its fields as <name>.json; returns the JSON file name."""
+    text = s3.get_object(Bucket=bucket, Key=key)['Body'].read().decode('utf-8')
+    json_filename = os.path.basename(key).replace('.txt', '.json')
+    path = os.path.join(output_dir, json_filename)
+    # Write under a temporary name so the knowledge index never reads a partial file
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(extract_fields(text), f, indent=4)
+    os.replace(path + ".tmp", path)
+    return json_filename
+
+def sync(bucket=bucket_name, prefix=prefix, output_dir=local_output_dir, workers=SYNC_WORKERS, prune=True):
+    """Fetch and convert only new or changed objects; with `prune`, drop files whose object was deleted."""
+    os.makedirs(output_dir, exist_ok=True)
+    s3 = get_client('s3')
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    lock = threading.Lock()
+    stats = {"listed": 0, "fetched": 0, "unchanged": 0, "removed": 0, "failed": 0}
+
+    seen, todo = set(), []
+    for obj in list_text_objects(s3, bucket, prefix):
+        key, version = obj['Key'], object_version(obj)
+        seen.add(key)
+        stats["listed"] += 1
+        entry = manifest.get(key)
+        if entry and entry["etag"] == version["etag"] and entry["last_modified"] == version["last_modified"] \
+                and os.path.exists(os.path.join(output_dir, entry["file"])):
+            stats["unchanged"] += 1
+        else:
+            todo.append((key, version))
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-sync") as pool:
+            futures = {pool.submit(fetch_and_convert, s3, bucket, key, output_dir): (key, version) for key, version in todo}
+            for future in as_completed(futures):
+                key, version = futures[future]
+                try:
+                    json_filename = future.result()
+                except Exception as e:
+                    print(f"❌ Failed: {key}: {e}")
+                    stats["failed"] += 1
+                    continue
+                with lock:
+                    manifest[key] = {**version, "file": json_filename}
+                stats["fetched"] += 1
+                print(f"Saved: {json_filename}")
+
+        if prune:
+            for key in [k for k in manifest if k.startswith(prefix) and k not in seen]:
+                path = os.path.join(output_dir, manifest.pop(key)["file"])
+                if os.path.exists(path):
+                    os.remove(path)
+                stats["removed"] += 1
+    finally:
+        # Saved even after an interruption, so finished downloads aren't repeated
+        save_manifest(manifest_path, manifest)
+
+    print(f"🔄 S3 sync: {stats['listed']} listed, {stats['fetched']} fetched, "
+          f"{stats['unchanged']} unchanged, {stats['removed']} removed, {stats['failed']} failed")
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync summary .txt files from S3 into converted_jsons")
+    parser.add_argument("--bucket", default=bucket_name)
+    parser.add_argument("--prefix", default=prefix)
+    parser.add_argument("--output", default=local_output_dir)
+    parser.add_argument("--workers", type=int, default=SYNC_WORKERS)
+    parser.add_argument("--endpoint-url", help="S3-compatible endpoint, e.g. a local stand-in such as MinIO or moto")
+    parser.add_argument("--no-prune", action="store_true", help="keep local files whose object was deleted")
+    parser.add_argument("--refresh-index", action="store_true", help="recompile the knowledge corpus afterwards")
+    args = parser.parse_args()
+
+    if args.endpoint_url:
+        set_endpoint('s3', args.endpoint_url)
+    sync(args.bucket, args.prefix, args.output, args.workers, prune=not args.no_prune)
+    if args.refresh_index:
+        folders = [os.path.abspath(folder) for folder in SOURCE_FOLDERS]
+        if os.path.abspath(args.output) not in folders:
+            folders.append(os.path.abspath(args.output))  # a custom --output is indexed too
+        compile_corpus(folders=folders)
@@ -1,35 +1,87 @@
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
-import os
-import uuid
-from dotenv import load_dotenv
-import sys
-sys.path.append("voicebot-backend")
-
-from dotenv import load_dotenv
-load_dotenv()
+from parameters.modules.startup import profile_imports, register_warmup, start_warm_up, readiness
+
+# Every module imported here is timed for the startup report
+with profile_imports():
+    from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+    from flask_cors import CORS
+    import os
+    import json
+    import uuid
+    import queue
+    import threading
+    from dotenv import load_dotenv
+    import sys
+    sys.path.append("voicebot-backend")
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    # from modules.transcribe_aws import transcribe_audio
+    from parameters.modules.asr_module import transcribe_bytes, warm_up as warm_up_asr
+    # from modules.bedrock_model import generate_response_bedrock
+    # from modules.polly_tts import synthesize_speech
+    from parameters.modules.response_gen import (
+        REGION, bound_answer_store, generate_response_bedrock, stream_response_bedrock
+    )
+    from parameters.modules.utils import synthesize_speech, region as POLLY_REGION
+    from parameters.modules.tts_pipeline import create_job, get_job, iter_job_audio, synthesize_pipelined
+    from parameters.modules.aws_clients import get_client
+    from parameters.modules.janitor import start_janitor
+    from parameters.modules.asr_stream import StreamingTranscriber
+    from parameters.modules.metrics import instrument_flask, span
+    from parameters.modules.trace_log import enable_trace_log
+    from parameters.modules.session_store import valid_session_id
 
-# from modules.transcribe_aws import transcribe_audio
-from parameters.modules.asr_module import transcribe_audio
-# from modules.bedrock_model import generate_response_bedrock
-# from modules.polly_tts import synthesize_speech
-from parameters.modules.response_gen import generate_response_bedrock
-from parameters.modules.utils import synthesize_speech
+    try:
+        from flask_sock import Sock
+    except ImportError:  # optional: only needed for /transcribe/stream
+        Sock = None
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app, resources={
     r"/transcribe": {"origins": "*"},
+    r"/transcribe/stream": {"origins": "*"},
     r"/query": {"origins": "*"},
-    r"/audio/*": {"origins": "*"}
+    r"/query/stream": {"origins": "*"},
+    r"/audio/*": {"origins": "*"},
+    r"/tts/*": {"origins": "*"}
 })
+# Server-Timing header on every response and Prometheus histograms at /metrics (METRICS_ENABLED=0 turns both off)
+instrument_flask(app)
+# Replayable request trace for benchmarks/loadgen.py (TRACE_LOG_FILE, off by default)
+enable_trace_log(app)
 
-UPLOAD_FOLDER = "uploads"
 TTS_OUTPUT_FOLDER = "tts_outputs"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(TTS_OUTPUT_FOLDER, exist_ok=True)
 
+# Heavy models load in start_services() (or lazily on first use with WARMUP_MODE=off); /readyz reports progress
+register_warmup("knowledge index + answer store", bound_answer_store)
+register_warmup("aws clients", lambda: (get_client("bedrock-runtime", REGION), get_client("polly", POLLY_REGION)))
+register_warmup("asr model", warm_up_asr)
+
+def start_services():
+    """Start the warm-up and the janitor; call once from whatever serves `app`.
+
+    Not done on import: ASR worker processes are spawned, and spawn re-imports
+    the entry script (as __mp_main__) in every worker.
+    """
+    start_warm_up()
+    # Keep tts_outputs/ and uploads/ within their byte/age quotas
+    start_janitor()
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: 200 once the index, clients and ASR model are warm, 503 until then."""
+    ready, details = readiness()
+    return jsonify(details), 200 if ready else 503
+
 @app.route('/audio/<filename>')
 def serve_audio(filename):
     response = send_from_directory(TTS_OUTPUT_FOLDER, filename)
@@ -38,16 +90,19 @@ def serve_audio(filename):
 
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
-    audio = request.files.get("audio")
-    if not audio:
+    # Either a multipart "audio" file or a raw body (e.g. audio/wav, or 16 kHz mono audio/L16 PCM)
+    with span("upload"):
+        audio = request.files.get("audio")
+        if audio:
+            data, content_type = audio.read(), audio.mimetype
+        else:
+            data, content_type = request.get_data(), request.mimetype
+    if not data:
         return jsonify({"error": "No audio file provided in the request."}), 400
 
-    filename = f"{uuid.uuid4()}.mp3"
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    
     try:
-        audio.save(filepath)
-        transcript, detected_lang = transcribe_audio(filepath, filename)
+        # Decoded once in memory; nothing is written to uploads/
+        transcript, detected_lang = transcribe_bytes(data, content_type)
         response_text = generate_response_bedrock(transcript, detected_lang)
         tts_filepath = synthesize_speech(response_text)
         audio_url = f"/audio/{os.path.basename(tts_filepath)}"
@@ -66,9 +121,67 @@ def transcribe():
             "details": traceback.format_exc()
         }), 500
 
-    finally:
-        if os.path.exists(filepath):
-            os.remove(filepath)
+def transcribe_stream(ws):
+    """WebSocket: binary frames of 16 kHz mono s16le PCM in; JSON partial/final/response events out.
+
+    A text frame `{"type": "end"}` flushes the current utterance; the socket
+    closes once its final transcript and response have been sent.
+    """
+    events = queue.Queue()
+    transcriber = StreamingTranscriber(events.put)
+    # One conversation per connection, so follow-up utterances keep their context
+    session_id = f"ws-{uuid.uuid4().hex}"
+    responding = []
+    ending = False
+
+    def respond(utterance, transcript, detected_lang):
+        try:
+            response_text = generate_response_bedrock(transcript, session_id=session_id, detected_lang=detected_lang)
+            # Audio is fetched per sentence while the rest is still being synthesized
+            job = synthesize_pipelined(response_text)
+            events.put({
+                "type": "response",
+                "utterance": utterance,
+                "response": response_text,
+                "audio_url": f"/tts/{job.id}/audio",
+                "tts_manifest_url": f"/tts/{job.id}"
+            })
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            events.put({"type": "error", "utterance": utterance, "error": f"An error occurred: {e}"})
+        finally:
+            events.put({"type": "_responded"})
+
+    while True:
+        message = ws.receive(timeout=0.05)
+        if isinstance(message, bytes):
+            transcriber.feed_pcm(message)
+        elif message:
+            if json.loads(message).get("type") == "end":
+                transcriber.flush()
+                ending = True
+
+        while not events.empty():
+            event = events.get()
+            if event["type"] == "_responded":
+                responding.pop()
+                continue
+            if event["type"] == "final" and event["transcript"]:
+                # End of utterance: start answering without waiting for the client
+                responding.append(event["utterance"])
+                threading.Thread(
+                    target=respond, args=(event["utterance"], event["transcript"], event["lang"]), daemon=True
+                ).start()
+            ws.send(json.dumps(event, ensure_ascii=False))
+
+        if ending and transcriber.idle and not responding and events.empty():
+            return
+
+if Sock is not None:
+    Sock(app).route('/transcribe/stream')(transcribe_stream)
+else:
+    print("⚠️ flask-sock is not installed; /transcribe/stream is disabled")
 
 @app.route('/query', methods=['POST'])
 def query():
@@ -79,6 +192,16 @@ def query():
 
     try:
         response_text = generate_response_bedrock(prompt)
+
+        if data.get("pipelined_tts"):
+            # Return straight away; segments are fetched while later ones are synthesized
+            job = synthesize_pipelined(response_text)
+            return jsonify({
+                "response": response_text,
+                "audio_url": f"/tts/{job.id}/audio",
+                "tts_manifest_url": f"/tts/{job.id}"
+            })
+
         tts_filepath = synthesize_speech(response_text)
         audio_url = f"/audio/{os.path.basename(tts_filepath)}"
 
@@ -95,5 +218,77 @@ def query():
             "details": traceback.format_exc()
         }), 500
 
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """Server-sent events: one `data: {"delta": ...}` per text delta, then a `done` event with the audio URL."""
+    data = request.get_json()
+    prompt = data.get("text", "")
+    if not prompt.strip():
+        return jsonify({"error": "Empty prompt provided."}), 400
+    session_id = data.get("session_id", "default")
+    if not valid_session_id(session_id):
+        return jsonify({"error": "Invalid session_id: use 1-64 letters, digits, '_' or '-'."}), 400
+
+    def sse(payload, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def events():
+        parts = []
+        # Sentences are sent to Polly as soon as they are complete in the token stream
+        job = create_job()
+        tts_urls = {"audio_url": f"/tts/{job.id}/audio", "tts_manifest_url": f"/tts/{job.id}"}
+        yield sse(tts_urls, event="tts")
+        try:
+            for delta in stream_response_bedrock(prompt, session_id):
+                parts.append(delta)
+                job.feed(delta)
+                yield sse({"delta": delta})
+            job.finish()
+
+            response_text = "".join(parts).strip()
+            yield sse({"response": response_text, **tts_urls}, event="done")
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            yield sse({"error": f"An error occurred during query: {e}"}, event="error")
+
+        finally:
+            # Also on client disconnect, so nobody waits on segments that will never come
+            job.finish()
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/tts/<job_id>')
+def tts_manifest(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown TTS job."}), 404
+    return jsonify(job.manifest())
+
+@app.route('/tts/<job_id>/<int:index>')
+def tts_segment(job_id, index):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown TTS job."}), 404
+    path = job.wait_for(index)
+    if path is None:
+        return jsonify({"error": f"Segment {index} is not available."}), 404
+    return send_from_directory(os.path.dirname(os.path.abspath(path)), os.path.basename(path), mimetype="audio/mpeg")
+
+@app.route('/tts/<job_id>/audio')
+def tts_audio(job_id):
+    """All segments as one chunked MP3 response, each chunk sent as soon as it is synthesized."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown TTS job."}), 404
+    return Response(iter_job_audio(job), mimetype="audio/mpeg")
+
 if __name__ == '__main__':
+    start_services()
     app.run(debug=True, host='0.0.0.0')
@@ -0,0 +1,162 @@
+# ASGI serving mode of the /transcribe, /query and /audio API (see main.py for the Flask app).
+# Handlers are coroutines; Whisper, TF-IDF and boto3 work runs on bounded executors
+# (parameters/modules/async_pipeline.py), so one process can hold many concurrent turns.
+#
+#   hypercorn main_async:app --bind 0.0.0.0:5000 --workers 1
+from parameters.modules.startup import profile_imports, register_warmup, start_warm_up, readiness
+
+with profile_imports():
+    import os
+    import sys
+    sys.path.append("voicebot-backend")
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    from quart import Quart, Response, request, jsonify, send_from_directory
+    from quart_cors import cors
+
+    from parameters.modules.asr_module import warm_up as warm_up_asr
+    from parameters.modules.async_pipeline import (
+        run_in, transcribe_async, generate_response_async, synthesize_async
+    )
+    from parameters.modules.response_gen import REGION, bound_answer_store
+    from parameters.modules.utils import region as POLLY_REGION
+    from parameters.modules.tts_pipeline import get_job, synthesize_pipelined
+    from parameters.modules.aws_clients import get_client
+    from parameters.modules.janitor import start_janitor
+    from parameters.modules.session_store import valid_session_id
+
+app = cors(Quart(__name__), allow_origin="*")
+
+TTS_OUTPUT_FOLDER = "tts_outputs"
+os.makedirs(TTS_OUTPUT_FOLDER, exist_ok=True)
+
+register_warmup("knowledge index + answer store", bound_answer_store)
+register_warmup("aws clients", lambda: (get_client("bedrock-runtime", REGION), get_client("polly", POLLY_REGION)))
+register_warmup("asr model", warm_up_asr)
+
+@app.before_serving
+async def startup():
+    start_warm_up()
+    start_janitor()
+
+@app.route('/healthz')
+async def healthz():
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+async def readyz():
+    ready, details = readiness()
+    return jsonify(details), 200 if ready else 503
+
+@app.route('/audio/<filename>')
+async def serve_audio(filename):
+    response = await send_from_directory(TTS_OUTPUT_FOLDER, filename)
+    response.headers['Content-Type'] = 'audio/mpeg'
+    return response
+
+@app.route('/transcribe', methods=['POST'])
+async def transcribe():
+    files = await request.files
+    audio = files.get("audio")
+    if audio:
+        data, content_type = audio.read(), audio.mimetype
+    else:
+        data, content_type = await request.get_data(), request.mimetype
+    if not data:
+        return jsonify({"error": "No audio file provided in the request."}), 400
+    session_id = request.args.get("session_id", "default")
+    if not valid_session_id(session_id):
+        return jsonify({"error": "Invalid session_id: use 1-64 letters, digits, '_' or '-'."}), 400
+
+    try:
+        transcript, detected_lang = await transcribe_async(data, content_type)
+        response_text = await generate_response_async(transcript, session_id=session_id, detected_lang=detected_lang)
+        tts_filepath = await synthesize_async(response_text)
+
+        return jsonify({
+            "transcript": transcript,
+            "response": response_text,
+            "audio_url": f"/audio/{os.path.basename(tts_filepath)}"
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": f"An error occurred: {e}",
+            "details": traceback.format_exc()
+        }), 500
+
+@app.route('/query', methods=['POST'])
+async def query():
+    data = await request.get_json()
+    prompt = data.get("text", "")
+    if not prompt.strip():
+        return jsonify({"error": "Empty prompt provided."}), 400
+
+    try:
+        response_text = await generate_response_async(prompt)
+
+        if data.get("pipelined_tts"):
+            job = synthesize_pipelined(response_text)
+            return jsonify({
+                "response": response_text,
+                "audio_url": f"/tts/{job.id}/audio",
+                "tts_manifest_url": f"/tts/{job.id}"
+            })
+
+        tts_filepath = await synthesize_async(response_text)
+        return jsonify({
+            "response": response_text,
+            "audio_url": f"/audio/{os.path.basename(tts_filepath)}"
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            "error": f"An error occurred during query: {e}",
+            "details": traceback.format_exc()
+        }), 500
+
+@app.route('/tts/<job_id>')
+async def tts_manifest(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown TTS job."}), 404
+    return jsonify(job.manifest())
+
+@app.route('/tts/<job_id>/<int:index>')
+async def tts_segment(job_id, index):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown TTS job."}), 404
+    path = await run_in("io", job.wait_for, index)
+    if path is None:
+        return jsonify({"error": f"Segment {index} is not available."}), 404
+    return await send_from_directory(os.path.dirname(os.path.abspath(path)), os.path.basename(path), mimetype="audio/mpeg")
+
+@app.route('/tts/<job_id>/audio')
+async def tts_audio(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown TTS job."}), 404
+
+    async def segments():
+        index = 0
+        while True:
+            path = await run_in("io", job.wait_for, index)
+            if path is None:
+                if index >= len(job.segments):
+                    return
+            else:
+                with open(path, "rb") as f:
+                    yield f.read()
+            index += 1
+
+    return Response(segments(), mimetype="audio/mpeg")
+
+if __name__ == '__main__':
+    app.run(debug=True, host='0.0.0.0')
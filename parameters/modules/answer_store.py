@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import time
+import glob
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Bounded store for Claude answers, replacing one auto_cached_jsons/<uuid>.json per answer
+BASE_DIR = os.path.dirname(__file__)
+STORE_PATH = os.getenv("ANSWER_STORE_PATH", os.path.join(BASE_DIR, "answer_store.sqlite3"))
+LEGACY_CACHE_FOLDER = os.path.join(BASE_DIR, "auto_cached_jsons")
+MAX_ENTRIES = int(os.getenv("ANSWER_STORE_MAX_ENTRIES", "10000"))
+TTL_SECONDS = float(os.getenv("ANSWER_STORE_TTL_SECONDS", str(30 * 24 * 3600)))
+LRU_SIZE = int(os.getenv("ANSWER_STORE_LRU_SIZE", "1024"))
+# last_used is written back at most this often for entries served from the LRU
+TOUCH_INTERVAL = 60.0
+INDEX_PREFIX = "answer_store:"
+
+_APOSTROPHES = re.compile(r"['’]")
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share a key."""
+    question = _NON_WORD.sub(" ", _APOSTROPHES.sub("", question.lower()))
+    return _SPACES.sub(" ", question).strip()
+
+
+def question_key(question):
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()
+
+
+class AnswerStore:
+    """SQLite (WAL) answer cache keyed by a normalized-question hash.
+
+    Exact repeats are served from an in-process LRU or a primary-key lookup.
+    Entries expire after `ttl` seconds and the table is capped at
+    `max_entries`, evicting the least recently used. When an index is bound,
+    every stored question/answer is also fed to it for similarity search.
+    """
+
+    def __init__(self, path=STORE_PATH, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, lru_size=LRU_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self.index = None
+        self._lru = OrderedDict()  # key -> [answer, created, touched]
+        self._lock = threading.RLock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, question TEXT NOT NULL, answer TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers(last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_created ON answers(created)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+
+    # --- lookups ---
+
+    def get(self, question):
+        """Return the stored answer for an exact (normalized) repeat, or None."""
+        key = question_key(question)
+        now = time.time()
+        with self._lock:
+            cached = self._lru.get(key)
+            if cached is not None:
+                answer, created, touched = cached
+                if now - created > self.ttl:
+                    self._delete([key])
+                    return None
+                self._lru.move_to_end(key)
+                if now - touched > TOUCH_INTERVAL:
+                    cached[2] = now
+                    self._conn.execute(
+                        "UPDATE answers SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                    )
+                return answer
+
+            row = self._conn.execute(
+                "SELECT answer, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            answer, created = row
+            if now - created > self.ttl:
+                self._delete([key])
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._remember(key, answer, created, now)
+            return answer
+
+    def _remember(self, key, answer, created, touched):
+        self._lru[key] = [answer, created, touched]
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    # --- writes ---
+
+    def put(self, question, answer, created=None):
+        with self._lock:
+            key = self._upsert(question, answer, created)
+            self.evict()
+        return key
+
+    def _upsert(self, question, answer, created=None):
+        key = question_key(question)
+        now = time.time()
+        created = created or now
+        self._conn.execute(
+            "INSERT INTO answers (key, question, answer, created, last_used) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET question = excluded.question, answer = excluded.answer,"
+            " created = excluded.created, last_used = excluded.last_used",
+            (key, question, answer, created, now),
+        )
+        self._remember(key, answer, created, now)
+        if self.index is not None:
+            self.index.add_entry(INDEX_PREFIX + key, {"original_question": question, "answer": answer}, now)
+        return key
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond `max_entries`."""
+        with self._lock:
+            expired = [k for (k,) in self._conn.execute(
+                "SELECT key FROM answers WHERE created < ?", (time.time() - self.ttl,)
+            )]
+            overflow = []
+            count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - len(expired)
+            if count > self.max_entries:
+                overflow = [k for (k,) in self._conn.execute(
+                    "SELECT key FROM answers WHERE created >= ? ORDER BY last_used LIMIT ?",
+                    (time.time() - self.ttl, count - self.max_entries),
+                )]
+            if expired or overflow:
+                self._delete(expired + overflow)
+                print(f"🧹 Evicted {len(expired)} expired and {len(overflow)} least-used cached answers")
+
+    def _delete(self, keys):
+        self._conn.executemany("DELETE FROM answers WHERE key = ?", [(k,) for k in keys])
+        for key in keys:
+            self._lru.pop(key, None)
+            if self.index is not None:
+                self.index.remove_file(INDEX_PREFIX + key)
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    # --- similarity index ---
+
+    def bind_index(self, index):
+        """Feed stored answers to `index` and keep it in step with later puts/evictions."""
+        with self._lock:
+            self.index = index
+            stored = {}
+            for key, question, answer, last_used in self._conn.execute(
+                "SELECT key, question, answer, last_used FROM answers"
+            ):
+                stored[INDEX_PREFIX + key] = (question, answer, last_used)
+            indexed = {src for src in index.file_mtimes if src.startswith(INDEX_PREFIX)}
+            for source in indexed - set(stored):
+                index.remove_file(source)
+            for source in set(stored) - indexed:
+                question, answer, last_used = stored[source]
+                index.add_entry(source, {"original_question": question, "answer": answer}, last_used)
+
+    # --- migration ---
+
+    def migrate_json_folder(self, folder=LEGACY_CACHE_FOLDER):
+        """One-shot import of legacy auto_cached_jsons/*.json; the folder is renamed afterwards."""
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE name = 'migrated_json'").fetchone()
+            if done or not os.path.isdir(folder):
+                return 0
+            migrated = 0
+            # One transaction and one eviction pass, not a commit and a table scan per file
+            self._conn.execute("BEGIN")
+            try:
+                for filepath in sorted(glob.glob(os.path.join(folder, "*.json")), key=os.path.getmtime):
+                    try:
+                        with open(filepath, encoding="utf-8") as f:
+                            data = json.load(f)
+                        question, answer = data.get("original_question"), data.get("answer")
+                        if not (isinstance(question, str) and isinstance(answer, str)):
+                            continue
+                        self._upsert(question, answer, created=os.path.getmtime(filepath))
+                        migrated += 1
+                    except Exception as e:
+                        print(f"⚠️ Skipping unreadable cached answer {filepath}: {e}")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('migrated_json', ?)", (str(time.time()),)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._lru.clear()
+                raise
+            self.evict()
+        try:
+            os.replace(folder, folder.rstrip(os.sep) + "_migrated")
+        except OSError as e:
+            print(f"⚠️ Could not rename {folder} after migration: {e}")
+        print(f"📦 Migrated {migrated} cached answers from {folder}")
+        return migrated
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_answer_store():
+    """Return the process-wide answer store, migrating the legacy JSON cache on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = AnswerStore()
+                store.migrate_json_folder()
+                _store = store
+    return _store
@@ -0,0 +1,133 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+
+# Interchangeable speech-to-text engines. Each one takes a float32 16 kHz mono
+# array and returns (transcript, language); pick one with ASR_BACKEND.
+ASR_BACKEND = os.getenv("ASR_BACKEND", "whisper")  # whisper | whisper-int8
+ASR_MODEL = os.getenv("ASR_MODEL", "base")         # tiny | base | small | medium ...
+ASR_BEAM_SIZE = int(os.getenv("ASR_BEAM_SIZE", "0")) or None  # None = greedy decoding
+ASR_THREADS = int(os.getenv("ASR_THREADS", "0")) or None      # None = torch default
+
+
+class ASRBackend(ABC):
+    """Interface for a speech-to-text engine; a backend missing a method cannot be instantiated."""
+
+    name = "base"
+
+    def load(self):
+        """Load weights; called once before the first transcription."""
+        return self
+
+    @abstractmethod
+    def detect_language(self, audio):
+        """Return the language code spoken in `audio`."""
+
+    @abstractmethod
+    def transcribe(self, audio, language=None):
+        """Return (transcript, language) for one utterance."""
+
+    def describe(self):
+        return {"backend": self.name}
+
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper in fp32 on the configured device."""
+
+    name = "whisper"
+
+    def __init__(self, model_size=ASR_MODEL, beam_size=ASR_BEAM_SIZE, threads=ASR_THREADS):
+        self.model_size = model_size
+        self.beam_size = beam_size
+        self.threads = threads
+        self.model = None
+
+    def load(self):
+        import torch
+        import whisper
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        self.model = self._prepare(whisper.load_model(self.model_size, device="cpu" if self._cpu_only() else None))
+        return self
+
+    def _cpu_only(self):
+        return False
+
+    def _prepare(self, model):
+        return model
+
+    def decode_options(self):
+        """Keyword arguments shared by model.transcribe and whisper.DecodingOptions."""
+        return {"fp16": False, "beam_size": self.beam_size}
+
+    def detect_language(self, audio):
+        import whisper
+
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels).to(self.model.device)
+        _, probs = self.model.detect_language(mel)
+        return max(probs, key=probs.get)
+
+    def transcribe(self, audio, language=None):
+        lang = language or self.detect_language(audio)
+        result = self.model.transcribe(audio, language=lang, **self.decode_options())
+        return result["text"].strip(), lang
+
+    def describe(self):
+        return {"backend": self.name, "model": self.model_size, "beam_size": self.beam_size or 1, "threads": self.threads}
+
+
+class QuantizedWhisperBackend(WhisperBackend):
+    """The same Whisper checkpoint with its Linear layers dynamically quantized to int8 (CPU only)."""
+
+    name = "whisper-int8"
+
+    def _cpu_only(self):
+        return True
+
+    def _prepare(self, model):
+        import torch
+
+        _plain_linears(model)
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _plain_linears(module):
+    """Swap whisper's Linear subclass for torch.nn.Linear so quantize_dynamic recognises it."""
+    import torch
+
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            plain = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            plain.weight = child.weight
+            plain.bias = child.bias
+            setattr(module, name, plain)
+        else:
+            _plain_linears(child)
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    QuantizedWhisperBackend.name: QuantizedWhisperBackend,
+}
+
+
+def create_backend(name=ASR_BACKEND, **options):
+    """Instantiate (without loading) the backend registered as `name`."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown ASR backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Return the process-wide backend from ASR_BACKEND, loading it on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend().load()
+                print(f"🎙️ ASR backend: {_backend.describe()}")
+    return _backend
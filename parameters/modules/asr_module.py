@@ -44,30 +44,82 @@
 #         raise Exception(f"Transcription job failed: {status}")
 # parameters/modules/asr_module.py
 
-import whisper
+import io
+import wave
+import subprocess
+import numpy as np
+from parameters.modules.asr_backends import get_backend
+from parameters.modules.asr_service import get_asr_service
+from parameters.modules.metrics import span
 
-# Load once globally
-model = whisper.load_model("base")  # Try "small" if it's still slow
+SAMPLE_RATE = 16000  # whisper.audio.SAMPLE_RATE; whisper/torch are imported only when a model loads
+# Content types whose body is raw 16 kHz mono signed 16-bit PCM
+RAW_PCM_TYPES = {"audio/l16", "audio/pcm", "application/octet-stream+pcm"}
 
-def transcribe_audio(filepath, filename=None):
+def pcm16_to_float32(data):
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+def _decode_wav(data):
+    """Decode a 16 kHz mono 16-bit WAV without ffmpeg; None if it needs resampling/downmixing."""
     try:
-        # Load and prepare audio
-        print("🌐 Detecting language (Hindi, English, Hinglish)...")
-        audio = whisper.load_audio(filepath)
-        audio = whisper.pad_or_trim(audio)
-        mel = whisper.log_mel_spectrogram(audio).to(model.device)
+        with wave.open(io.BytesIO(data)) as wav:
+            if wav.getframerate() != SAMPLE_RATE or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                return None
+            return pcm16_to_float32(wav.readframes(wav.getnframes()))
+    except wave.Error:
+        return None
+
+def _decode_ffmpeg(data):
+    """Decode any container/codec from memory through one ffmpeg pipe (no temp file)."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "pipe:1",
+    ]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='ignore')}") from e
+    return pcm16_to_float32(out)
+
+def decode_audio_bytes(data, content_type=None):
+    """Turn request bytes into the float32 16 kHz mono array Whisper consumes, decoding once.
 
-        # Language detection
-        _, probs = model.detect_language(mel)
-        lang = max(probs, key=probs.get)
+    Raw PCM (audio/L16) and 16 kHz mono WAV are converted directly; anything
+    else goes through a single in-memory ffmpeg pass.
+    """
+    if content_type and content_type.split(";")[0].strip().lower() in RAW_PCM_TYPES:
+        return pcm16_to_float32(data)
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        audio = _decode_wav(data)
+        if audio is not None:
+            return audio
+    return _decode_ffmpeg(data)
+
+def transcribe_array(audio):
+    """Detect the language and transcribe from the same decoded array."""
+    service = get_asr_service()
+    if service is not None:
+        # Batched with other concurrent requests in the ASR worker pool
+        with span("asr_transcribe"):
+            transcript, lang = service.transcribe(audio)
+        print(f"🧠 Whisper transcript: {transcript}")
+        print(f"🌍 Language: {lang.upper()} (used for transcription)")
+        return transcript, lang
+
+    try:
+        # Loaded on first use; ASR_BACKEND/ASR_MODEL/ASR_BEAM_SIZE/ASR_THREADS pick the engine
+        backend = get_backend()
+        print("🌐 Detecting language (Hindi, English, Hinglish)...")
+        with span("asr_detect_language"):
+            lang = backend.detect_language(audio)
 
         # Only accept 'hi' (Hindi) or 'en' (English)
         if lang not in ['en', 'hi']:
             print(f"⚠️ Detected unsupported language '{lang}', forcing transcription anyway.")
 
-        # Transcribe using detected language
-        result = model.transcribe(filepath, language=lang, fp16=False)
-        transcript = result["text"].strip()
+        # Transcribe using detected language; passing the array avoids a second decode
+        with span("asr_decode"):
+            transcript, lang = backend.transcribe(audio, language=lang)
 
         print(f"🧠 Whisper transcript: {transcript}")
         print(f"🌍 Language: {lang.upper()} (used for transcription)")
@@ -76,3 +128,31 @@ def transcribe_audio(filepath, filename=None):
 
     except Exception as e:
         raise RuntimeError(f"Whisper transcription failed: {e}")
+
+def transcribe_bytes(data, content_type=None):
+    """Transcribe uploaded audio straight from memory."""
+    try:
+        with span("asr_audio_decode"):
+            audio = decode_audio_bytes(data, content_type)
+    except Exception as e:
+        raise RuntimeError(f"Whisper transcription failed: {e}")
+    return transcribe_array(audio)
+
+def transcribe_audio(filepath, filename=None):
+    import whisper
+
+    try:
+        audio = whisper.load_audio(filepath)
+    except Exception as e:
+        raise RuntimeError(f"Whisper transcription failed: {e}")
+    return transcribe_array(audio)
+
+def warm_up():
+    """Load the ASR model and run one inference on silence so the first request skips first-run costs."""
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    service = get_asr_service()
+    if service is not None:
+        # Includes loading the model, which can outlast ASR_TIMEOUT; a worker that dies fails it anyway
+        service.transcribe(silence, timeout=None)
+    else:
+        get_backend().transcribe(silence, language="en")
@@ -0,0 +1,275 @@
+import os
+import time
+import queue
+import atexit
+import itertools
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from parameters.modules.asr_backends import ASR_BACKEND, ASR_BEAM_SIZE, ASR_MODEL, create_backend
+from parameters.modules.startup import register_check
+
+# Process pool for Whisper: each worker owns a model and a pinned torch thread
+# count, and requests arriving within a short window are decoded as one batch.
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "0"))  # 0 = transcribe in the request thread
+ASR_THREADS_PER_WORKER = int(os.getenv("ASR_THREADS_PER_WORKER", "0")) or max(1, (os.cpu_count() or 1) // max(ASR_WORKERS, 1))
+ASR_BATCH_WINDOW = float(os.getenv("ASR_BATCH_WINDOW", "0.02"))  # seconds to wait for more requests
+ASR_MAX_BATCH = int(os.getenv("ASR_MAX_BATCH", "8"))
+MAX_BATCH_SECONDS = 30  # Whisper's window; longer utterances are transcribed one by one
+ASR_TIMEOUT = float(os.getenv("ASR_TIMEOUT", "120"))  # seconds a request waits for its transcript
+MONITOR_INTERVAL = 1.0  # seconds between worker liveness checks
+
+
+def _transcribe_batch(whisper, backend, batch):
+    """Return [(request id, (transcript, lang) or Exception)] for one batch of (id, audio)."""
+    import torch
+
+    model = backend.model
+    results = []
+    short = [(rid, audio) for rid, audio in batch if len(audio) <= MAX_BATCH_SECONDS * whisper.audio.SAMPLE_RATE]
+    longer = [(rid, audio) for rid, audio in batch if len(audio) > MAX_BATCH_SECONDS * whisper.audio.SAMPLE_RATE]
+
+    if short:
+        try:
+            # One padded mel batch for language detection and decoding
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels)
+                for _, audio in short
+            ]).to(model.device)
+            _, probs = model.detect_language(mels)
+            langs = [max(p, key=p.get) for p in probs]
+            for lang in set(langs):
+                idx = [i for i, l in enumerate(langs) if l == lang]
+                options = whisper.DecodingOptions(language=lang, without_timestamps=True, **backend.decode_options())
+                decoded = whisper.decode(model, mels[idx], options)
+                for i, result in zip(idx, decoded):
+                    results.append((short[i][0], (result.text.strip(), lang)))
+        except Exception as e:
+            results.extend((rid, e) for rid, _ in short)
+
+    for rid, audio in longer:
+        try:
+            results.append((rid, backend.transcribe(audio)))
+        except Exception as e:
+            results.append((rid, e))
+    return results
+
+
+def _init_worker(backend_name, model_name, beam_size, threads):
+    """Load this worker's model and nothing else (no app warm-up, janitor or clients)."""
+    import whisper
+
+    return whisper, create_backend(backend_name, model_size=model_name, beam_size=beam_size, threads=threads).load()
+
+
+def _worker_main(backend_name, model_name, beam_size, threads, tasks, results):
+    whisper, backend = _init_worker(backend_name, model_name, beam_size, threads)
+    results.send(("ready", os.getpid()))
+    while True:
+        batch = tasks.get()
+        if batch is None:
+            break
+        for rid, outcome in _transcribe_batch(whisper, backend, batch):
+            if isinstance(outcome, Exception):
+                outcome = RuntimeError(f"Whisper transcription failed: {outcome}")
+            results.send((rid, outcome))
+
+
+class _Worker:
+    """One worker process with its own task queue and result pipe, and the request ids it holds.
+
+    Nothing is shared between workers, so one that dies (crash, OOM kill) takes
+    only its own requests with it and cannot leave a shared queue locked.
+    """
+
+    def __init__(self, ctx, args):
+        self.tasks = ctx.Queue()
+        self.results, child_end = ctx.Pipe(duplex=False)
+        self.proc = ctx.Process(target=_worker_main, args=(*args, self.tasks, child_end), daemon=True)
+        self.proc.start()
+        child_end.close()  # so the pipe reports EOF once the worker is gone
+        self.inflight = set()
+        self.ready = False
+        self.retired = False
+
+
+class ASRService:
+    """Whisper worker processes fed by a micro-batching dispatcher.
+
+    `submit(audio)` returns a Future resolving to (transcript, lang). Requests
+    that arrive within `batch_window` seconds of each other (up to
+    `max_batch`) go to the least busy worker as one batch. A worker that exits
+    fails the requests it held and is replaced, unless it died before its
+    model was loaded (restarting would only fail the same way).
+    """
+
+    def __init__(self, workers=ASR_WORKERS, threads=ASR_THREADS_PER_WORKER, backend=ASR_BACKEND, model_name=ASR_MODEL,
+                 beam_size=ASR_BEAM_SIZE, batch_window=ASR_BATCH_WINDOW, max_batch=ASR_MAX_BATCH):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._ctx = mp.get_context("spawn")
+        self._args = (backend, model_name, beam_size, threads)
+        self._pending = queue.Queue()
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._closing = False
+        self.restarts = 0
+        self._workers = [_Worker(self._ctx, self._args) for _ in range(max(1, workers))]
+        threading.Thread(target=self._dispatch, name="asr-dispatch", daemon=True).start()
+        threading.Thread(target=self._collect, name="asr-collect", daemon=True).start()
+        print(f"🎙️ ASR service: {len(self._workers)} workers x {threads} threads, {backend} '{model_name}'")
+
+    def submit(self, audio):
+        future = Future()
+        with self._lock:
+            rid = next(self._ids)
+            self._futures[rid] = future
+        self._pending.put((rid, audio))
+        return future
+
+    def transcribe(self, audio, timeout=ASR_TIMEOUT):
+        future = self.submit(audio)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise RuntimeError(f"Whisper transcription failed: no result within {timeout:g} s")
+
+    @property
+    def ready_workers(self):
+        return sum(1 for w in self._workers if w.ready and w.proc.is_alive())
+
+    def health(self):
+        """(ok, status) for readiness: at least one worker process must be running."""
+        status = self.status()
+        return status["alive"] > 0, status
+
+    def status(self):
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "alive": sum(1 for w in self._workers if w.proc.is_alive()),
+                "ready": self.ready_workers,
+                "restarts": self.restarts,
+                "in_flight": sum(len(w.inflight) for w in self._workers),
+            }
+
+    def _dispatch(self):
+        while True:
+            first = self._pending.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._pending.put(None)
+                    break
+                batch.append(item)
+            self._assign(batch)
+
+    def _assign(self, batch):
+        with self._lock:
+            alive = [w for w in self._workers if not w.retired and w.proc.is_alive()]
+            if alive:
+                worker = min(alive, key=lambda w: len(w.inflight))
+                worker.inflight.update(rid for rid, _ in batch)
+            else:
+                lost = [self._futures.pop(rid, None) for rid, _ in batch]
+        if alive:
+            worker.tasks.put(batch)
+            return
+        for future in lost:
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("Whisper transcription failed: no ASR worker is running"))
+
+    def _resolve(self, worker, rid, outcome):
+        with self._lock:
+            future = self._futures.pop(rid, None)
+            worker.inflight.discard(rid)
+        if future is None or not future.set_running_or_notify_cancel():
+            return  # timed out and cancelled by the caller
+        if isinstance(outcome, Exception):
+            future.set_exception(outcome)
+        else:
+            future.set_result(outcome)
+
+    def _collect(self):
+        """Hand results to their futures and replace workers that have exited."""
+        while not self._closing:
+            conns = {w.results: w for w in self._workers if not w.retired}
+            for conn in wait(list(conns), timeout=MONITOR_INTERVAL):
+                worker = conns[conn]
+                try:
+                    rid, outcome = conn.recv()
+                except (EOFError, OSError):
+                    worker.proc.join(timeout=5)  # the pipe closed: the worker is gone or going
+                    self._worker_exited(worker)
+                    continue
+                if rid == "ready":
+                    worker.ready = True
+                else:
+                    self._resolve(worker, rid, outcome)
+            for worker in list(self._workers):
+                if not worker.retired and not worker.proc.is_alive():
+                    self._worker_exited(worker)
+
+    def _worker_exited(self, worker):
+        """Fail the requests a dead worker held and start a replacement."""
+        if self._closing or worker.retired:
+            return
+        worker.retired = True
+        restart = worker.ready
+        with self._lock:
+            lost = [self._futures.pop(rid, None) for rid in worker.inflight]
+            worker.inflight.clear()
+            if restart:
+                self._workers[self._workers.index(worker)] = _Worker(self._ctx, self._args)
+                self.restarts += 1
+        worker.results.close()
+        error = RuntimeError(f"Whisper transcription failed: ASR worker {worker.proc.pid} "
+                             f"exited with code {worker.proc.exitcode}")
+        for future in lost:
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(error)
+        if restart:
+            print(f"⚠️ ASR worker {worker.proc.pid} exited (code {worker.proc.exitcode}); "
+                  f"failed {len(lost)} requests, replacement started")
+        else:
+            print(f"❌ ASR worker {worker.proc.pid} exited before loading its model (code {worker.proc.exitcode}); "
+                  f"not restarted")
+
+    def shutdown(self):
+        self._closing = True
+        self._pending.put(None)
+        for worker in self._workers:
+            worker.tasks.put(None)
+        for worker in self._workers:
+            worker.proc.join(timeout=5)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_asr_service():
+    """Return the process-wide ASR service, or None when ASR_WORKERS is 0."""
+    global _service
+    if ASR_WORKERS <= 0:
+        return None
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ASRService()
+                atexit.register(_service.shutdown)
+                register_check("asr workers", _service.health)
+    return _service
@@ -0,0 +1,190 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from parameters.modules.asr_module import SAMPLE_RATE, pcm16_to_float32, transcribe_array
+
+# Streaming ASR: 16 kHz mono s16le frames are split by an energy VAD into
+# segments at short pauses; each stable segment is transcribed while the user
+# keeps talking, and a long pause ends the utterance.
+FRAME_MS = 30
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-45"))  # minimum speech level (dBFS)
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))         # speech must be this far above the noise floor
+SEGMENT_PAUSE_MS = int(os.getenv("ASR_SEGMENT_PAUSE_MS", "300"))  # pause that closes a stable segment
+END_OF_UTTERANCE_MS = int(os.getenv("ASR_END_OF_UTTERANCE_MS", "800"))
+MIN_SPEECH_MS = 150      # shorter bursts (clicks, breaths) are not speech
+PREROLL_MS = 150         # audio kept from before speech onset so the first syllable isn't clipped
+MAX_SEGMENT_SECONDS = 10
+ASR_STREAM_PARALLELISM = int(os.getenv("ASR_STREAM_PARALLELISM", "2"))
+
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+_executor = ThreadPoolExecutor(max_workers=ASR_STREAM_PARALLELISM, thread_name_prefix="asr-stream")
+
+
+def _frames(ms):
+    return max(1, ms // FRAME_MS)
+
+
+class EnergyVAD:
+    """Per-frame speech/silence decision from RMS energy against an adaptive noise floor."""
+
+    def __init__(self, threshold_db=VAD_THRESHOLD_DB, margin_db=VAD_MARGIN_DB):
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.noise_db = threshold_db - margin_db
+
+    def is_speech(self, frame):
+        db = 20 * np.log10(np.sqrt(np.mean(frame * frame)) + 1e-10)
+        speech = db > max(self.threshold_db, self.noise_db + self.margin_db)
+        if not speech:
+            # Follow the background level slowly, only while nobody is talking
+            self.noise_db = 0.95 * self.noise_db + 0.05 * db
+        return speech
+
+
+class _Utterance:
+    def __init__(self, index):
+        self.index = index
+        self.segments = []  # futures, in order
+        self.partial = ""
+        self.closed = False
+        self.finalized = False
+
+
+class StreamingTranscriber:
+    """Feed PCM as it arrives; `on_event(dict)` receives speech_start, partial and final events.
+
+    Events may be emitted from ASR threads, so `on_event` should only hand
+    them off (e.g. `queue.Queue.put`).
+    """
+
+    def __init__(self, on_event, vad=None):
+        self.on_event = on_event
+        self.vad = vad or EnergyVAD()
+        self._rest = np.zeros(0, dtype=np.float32)
+        self._preroll = deque(maxlen=_frames(PREROLL_MS))
+        self._frames = []         # open segment
+        self._segment_speech = 0  # speech frames in the open segment
+        self._speech_run = 0
+        self._silence = 0
+        self._utterance = None
+        self._utterances = 0
+        self._outstanding = set()
+        self._lock = threading.Lock()
+
+    @property
+    def in_speech(self):
+        return self._utterance is not None
+
+    @property
+    def idle(self):
+        """True when no utterance is open and every final event has been emitted."""
+        with self._lock:
+            return self._utterance is None and not self._outstanding
+
+    def feed_pcm(self, data):
+        self.feed(pcm16_to_float32(data))
+
+    def feed(self, samples):
+        buf = np.concatenate([self._rest, samples]) if len(self._rest) else samples
+        n = len(buf) // FRAME_SAMPLES
+        for i in range(n):
+            self._frame(buf[i * FRAME_SAMPLES:(i + 1) * FRAME_SAMPLES])
+        self._rest = buf[n * FRAME_SAMPLES:]
+
+    def _frame(self, frame):
+        speech = self.vad.is_speech(frame)
+        if self._utterance is None:
+            self._preroll.append(frame)
+            self._speech_run = self._speech_run + 1 if speech else 0
+            if self._speech_run >= _frames(MIN_SPEECH_MS):
+                self._start_utterance()
+            return
+
+        self._frames.append(frame)
+        if speech:
+            self._silence = 0
+            self._segment_speech += 1
+        else:
+            self._silence += 1
+
+        if self._silence >= _frames(END_OF_UTTERANCE_MS):
+            self._close_segment()
+            self._end_utterance()
+        elif self._silence == _frames(SEGMENT_PAUSE_MS) or len(self._frames) * FRAME_MS >= MAX_SEGMENT_SECONDS * 1000:
+            self._close_segment()
+
+    def _start_utterance(self):
+        self._utterance = _Utterance(self._utterances)
+        self._utterances += 1
+        self._frames = list(self._preroll)
+        self._segment_speech = len(self._frames)
+        self._preroll.clear()
+        self._speech_run = 0
+        self._silence = 0
+        with self._lock:
+            self._outstanding.add(self._utterance)
+        self.on_event({"type": "speech_start", "utterance": self._utterance.index})
+
+    def _close_segment(self):
+        frames, speech = self._frames, self._segment_speech
+        self._frames, self._segment_speech = [], 0
+        # Trailing silence alone is dropped: Whisper tends to hallucinate on it
+        if speech < _frames(MIN_SPEECH_MS):
+            return
+        utterance = self._utterance
+        future = _executor.submit(transcribe_array, np.concatenate(frames))
+        with self._lock:
+            utterance.segments.append(future)
+        future.add_done_callback(lambda _: self._update(utterance))
+
+    def _end_utterance(self):
+        utterance, self._utterance = self._utterance, None
+        self._preroll.clear()
+        self._speech_run = 0
+        with self._lock:
+            utterance.closed = True
+        self._update(utterance)
+
+    def flush(self):
+        """End any open utterance now (e.g. the client stopped recording)."""
+        if self._utterance is not None:
+            if len(self._rest):
+                self._frames.append(self._rest)
+            self._rest = np.zeros(0, dtype=np.float32)
+            self._close_segment()
+            self._end_utterance()
+
+    def _update(self, utterance):
+        events = []
+        with self._lock:
+            texts, langs = [], []
+            for future in utterance.segments:
+                if not future.done():
+                    break
+                try:
+                    text, lang = future.result()
+                except Exception as e:
+                    print(f"⚠️ Streaming segment failed: {e}")
+                    text, lang = "", None
+                if text:
+                    texts.append(text)
+                    langs.append(lang)
+            else:
+                if utterance.closed and not utterance.finalized:
+                    utterance.finalized = True
+                    self._outstanding.discard(utterance)
+                    transcript = " ".join(texts)
+                    lang = max(set(langs), key=langs.count) if langs else ""
+                    events.append({"type": "final", "utterance": utterance.index, "transcript": transcript, "lang": lang})
+            partial = " ".join(texts)
+            if not utterance.finalized and partial != utterance.partial:
+                utterance.partial = partial
+                events.insert(0, {"type": "partial", "utterance": utterance.index, "text": partial})
+            # Emitted under the lock so partials never arrive after their final
+            for event in events:
+                self.on_event(event)
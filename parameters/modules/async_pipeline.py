@@ -0,0 +1,103 @@
+import os
+import asyncio
+import functools
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from parameters.modules.aws_clients import MAX_POOL_CONNECTIONS
+from parameters.modules.asr_module import decode_audio_bytes, transcribe_array
+from parameters.modules.asr_service import ASR_TIMEOUT, get_asr_service
+from parameters.modules.metrics import inc
+from parameters.modules.response_gen import (
+    FALLBACK_MSG, SPECULATIVE_LLM, build_payload, call_with_retries_async, client_error_message,
+    create_bedrock_client, extract_answer, invoke_claude, record_answer, use_local_answer
+)
+from parameters.modules.utils import synthesize_speech
+
+# The voice turn as coroutines for the ASGI app (main_async.py). The event loop
+# only waits; blocking work goes to bounded pools so a burst of requests queues
+# instead of spawning a thread each:
+#   asr - Whisper inference (CPU/memory heavy, keep small)
+#   cpu - audio decoding and local TF-IDF/answer-store lookups
+#   io  - boto3 calls (Bedrock, Polly) and session files; sized to the AWS connection pool
+ASYNC_ASR_WORKERS = int(os.getenv("ASYNC_ASR_WORKERS", "2"))
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", str(os.cpu_count() or 2)))
+ASYNC_IO_WORKERS = int(os.getenv("ASYNC_IO_WORKERS", str(MAX_POOL_CONNECTIONS)))
+
+_executors = {
+    "asr": ThreadPoolExecutor(max_workers=ASYNC_ASR_WORKERS, thread_name_prefix="async-asr"),
+    "cpu": ThreadPoolExecutor(max_workers=ASYNC_CPU_WORKERS, thread_name_prefix="async-cpu"),
+    "io": ThreadPoolExecutor(max_workers=ASYNC_IO_WORKERS, thread_name_prefix="async-io"),
+}
+
+
+async def run_in(pool, fn, *args, **kwargs):
+    """Run blocking `fn` on the named executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executors[pool], functools.partial(fn, *args, **kwargs))
+
+
+async def transcribe_async(data, content_type=None):
+    """Decode on the cpu pool, then transcribe on the asr pool (or await the ASR worker pool)."""
+    try:
+        audio = await run_in("cpu", decode_audio_bytes, data, content_type)
+    except Exception as e:
+        raise RuntimeError(f"Whisper transcription failed: {e}")
+    service = get_asr_service()
+    if service is not None:
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(service.submit(audio)), ASR_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Whisper transcription failed: no result within {ASR_TIMEOUT:g} s")
+    return await run_in("asr", transcribe_array, audio)
+
+
+async def generate_response_async(prompt, session_id="default", detected_lang=""):
+    """generate_response_bedrock for the event loop: same steps, each on the pool that suits it."""
+    if SPECULATIVE_LLM:
+        # Lookup and LLM call overlap on their own threads; this only waits for the winner
+        from parameters.modules.speculative import speculative_response_bedrock
+        return await run_in("io", speculative_response_bedrock, prompt, session_id)
+
+    # 1. Exact repeat or local knowledge base
+    local_answer = await run_in("cpu", use_local_answer, prompt, session_id)
+    if local_answer:
+        return local_answer
+
+    # 2-3. Conversation context and payload (session files live on disk)
+    payload = await run_in("io", build_payload, prompt, session_id)
+    if isinstance(payload, str):
+        return payload
+
+    # 4. Shared, pooled client
+    try:
+        client = create_bedrock_client()
+    except Exception as e:
+        traceback.print_exc()
+        return f"❌ Failed to initialize Bedrock client: {e}"
+
+    # 5. API call with retries; the io thread is released while a throttled call backs off
+    try:
+        result = await call_with_retries_async(lambda: run_in("io", invoke_claude, client, payload))
+        if result is None:
+            # 6. Final fallback if all retries fail
+            inc("voicebot_answers_total", source="fallback")
+            return FALLBACK_MSG
+
+        answer, error_msg = extract_answer(result)
+        if error_msg:
+            return error_msg
+        await run_in("io", record_answer, session_id, prompt, answer)
+        return answer
+
+    except ClientError as e:
+        return client_error_message(e, payload)
+    except Exception as e:
+        traceback.print_exc()
+        return f"❌ Unexpected error: {str(e)}"
+
+
+async def synthesize_async(text, voice_id="Aditi", output_format="mp3"):
+    return await run_in("io", synthesize_speech, text, voice_id, output_format)
@@ -0,0 +1,92 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# One shared, thread-safe client per (service, region) instead of a fresh boto3
+# client (credential resolution, endpoint setup, TLS handshake) per call.
+DEFAULT_REGION = os.getenv("AWS_REGION", "us-west-2")
+MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "30"))
+MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+RETRY_MODE = os.getenv("AWS_RETRY_MODE", "adaptive")
+
+# Per-service tweaks on top of the defaults above
+SERVICE_CONFIG = {
+    "bedrock-runtime": {"read_timeout": float(os.getenv("BEDROCK_READ_TIMEOUT", "60"))},
+}
+
+_clients = {}
+_endpoints = {}
+_lock = threading.Lock()
+_session = None
+
+
+def client_config(service):
+    options = {
+        "max_pool_connections": MAX_POOL_CONNECTIONS,
+        "connect_timeout": CONNECT_TIMEOUT,
+        "read_timeout": READ_TIMEOUT,
+        "tcp_keepalive": True,
+        "retries": {"max_attempts": MAX_ATTEMPTS, "mode": RETRY_MODE},
+    }
+    options.update(SERVICE_CONFIG.get(service, {}))
+    return Config(**options)
+
+
+def endpoint_for(service):
+    """Endpoint override for `service`: set_endpoint(), else AWS_ENDPOINT_URL_<SERVICE>, else None."""
+    if service in _endpoints:
+        return _endpoints[service]
+    return os.getenv("AWS_ENDPOINT_URL_" + service.upper().replace("-", "_"))
+
+
+def get_client(service, region=None):
+    """Return the shared client for (service, region), creating it on first use."""
+    key = (service, region or DEFAULT_REGION)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            global _session
+            # boto3's default session is not safe to create clients from concurrently
+            if _session is None:
+                _session = boto3.session.Session()
+            client = _session.client(
+                service,
+                region_name=key[1],
+                endpoint_url=endpoint_for(service),
+                config=client_config(service),
+            )
+            _clients[key] = client
+        return client
+
+
+def register_client(service, client, region=None):
+    """Use `client` (e.g. a local stub) for (service, region) instead of a real boto3 client."""
+    with _lock:
+        _clients[(service, region or DEFAULT_REGION)] = client
+
+
+def set_endpoint(service, url):
+    """Point newly created clients for `service` at `url` (e.g. a local S3 stand-in); None clears it."""
+    with _lock:
+        if url is None:
+            _endpoints.pop(service, None)
+        else:
+            _endpoints[service] = url
+        for key in [k for k in _clients if k[0] == service]:
+            del _clients[key]
+
+
+def reset_clients():
+    """Forget every cached client, stub and endpoint override."""
+    global _session
+    with _lock:
+        _clients.clear()
+        _endpoints.clear()
+        _session = None
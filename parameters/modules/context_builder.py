@@ -0,0 +1,88 @@
+import os
+import re
+
+# Packs a session's recent turns into a token budget for the Bedrock payload.
+# Turns that no longer fit are folded, once, into a running summary that is
+# stored with the session and sent as the system prompt.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))  # turns + summary
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "300"))   # reserved for the summary
+SUMMARY_SNIPPET_WORDS = 30
+BASELINE_TURNS = 10  # what get_messages used to send verbatim
+
+_FIRST_SENTENCE = re.compile(r"^(.+?[.!?।])(\s|$)", re.S)
+
+
+def estimate_tokens(text):
+    """Rough Claude token count: ~4 characters per token for ASCII, ~2 for other scripts (e.g. Devanagari)."""
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return 1 + ascii_chars // 4 + (len(text) - ascii_chars) // 2
+
+
+def summary_line(turn):
+    """One short line for a folded turn: its first sentence, capped at SUMMARY_SNIPPET_WORDS words."""
+    text = " ".join(turn.text.split())
+    match = _FIRST_SENTENCE.match(text)
+    words = (match.group(1) if match else text).split()
+    snippet = " ".join(words[:SUMMARY_SNIPPET_WORDS]) + (" …" if len(words) > SUMMARY_SNIPPET_WORDS else "")
+    return f"{'User' if turn.role == 'user' else 'Assistant'}: {snippet}"
+
+
+def fold_into_summary(summary, turns, budget=SUMMARY_TOKEN_BUDGET):
+    """Return `summary` extended with `turns`; the oldest lines are dropped to stay within `budget`."""
+    lines = list(summary.get("lines", [])) + [summary_line(t) for t in turns]
+    tokens = [estimate_tokens(line) for line in lines]
+    while lines and sum(tokens) > budget:
+        lines.pop(0)
+        tokens.pop(0)
+    return {
+        "lines": lines,
+        "tokens": sum(tokens),
+        "upto": max([summary.get("upto", 0)] + [t.ts for t in turns]),
+        "folded": summary.get("folded", 0) + len(turns),
+    }
+
+
+def build_context(context, session_id, budget=CONTEXT_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET):
+    """Return (messages, system prompt or None, stats) for the session's next Bedrock call.
+
+    The newest turns are packed until the budget (minus the summary reserve) is
+    used; the latest turn is always sent. Anything older that has not been
+    summarized yet is folded into the stored running summary, so each turn is
+    summarized once however long the conversation gets.
+    """
+    turns = [t for t in context.get_turns(session_id) if t.text and t.text.strip()]
+    summary = context.get_summary(session_id) or {}
+    upto = summary.get("upto", 0)
+    live = [t for t in turns if t.ts > upto]
+
+    window, used = [], 0
+    for turn in reversed(live):
+        cost = estimate_tokens(turn.text)
+        if window and used + cost > budget - summary_budget:
+            break
+        window.append(turn)
+        used += cost
+    window.reverse()
+    # The messages API wants the conversation to start with a user turn
+    while len(window) > 1 and window[0].role != "user":
+        used -= estimate_tokens(window.pop(0).text)
+
+    aged = live[:len(live) - len(window)]
+    if aged:
+        summary = fold_into_summary(summary, aged, summary_budget)
+        context.set_summary(session_id, summary)
+
+    system = None
+    if summary.get("lines"):
+        system = "Summary of the earlier conversation:\n" + "\n".join(summary["lines"])
+
+    baseline = sum(estimate_tokens(t.text) for t in turns[-BASELINE_TURNS:])
+    sent = used + (estimate_tokens(system) if system else 0)
+    stats = {
+        "turns_sent": len(window),
+        "turns_summarized": summary.get("folded", 0),
+        "tokens_sent": sent,
+        "tokens_baseline": baseline,
+        "tokens_saved": max(0, baseline - sent),
+    }
+    return [t.to_message() for t in window], system, stats
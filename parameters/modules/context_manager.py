@@ -1,34 +1,33 @@
-import os
-import json
+from parameters.modules.session_store import get_session_store
 
 class ConversationContext:
-    def __init__(self):
-        self.sessions = {}  # session_id -> list of message turns
-        self.session_folder = os.path.join(os.path.dirname(__file__), "..", "session_store")
-        os.makedirs(self.session_folder, exist_ok=True)
+    """Per-session chat history, persisted through the append-only SessionStore."""
+
+    def __init__(self, store=None):
+        self.store = store or get_session_store()
 
     def add_turn(self, session_id, role, content):
-        if session_id not in self.sessions:
-            self.sessions[session_id] = []
-        self.sessions[session_id].append({
-            "role": role,
-            "content": [{"type": "text", "text": content}]
-        })
+        self.store.add(session_id, role, content)
 
     def get_messages(self, session_id, max_turns=10):
-        return self.sessions.get(session_id, [])[-max_turns:]
+        return self.store.messages(session_id, max_turns)
+
+    def get_turns(self, session_id):
+        return self.store.turns(session_id)
+
+    def get_summary(self, session_id):
+        return self.store.summary(session_id)
+
+    def set_summary(self, session_id, summary):
+        self.store.set_summary(session_id, summary)
 
     def reset(self, session_id):
-        self.sessions[session_id] = []
+        self.store.reset(session_id)
 
     def save_session(self, session_id):
-        if session_id in self.sessions:
-            path = os.path.join(self.session_folder, f"{session_id}.json")
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(self.sessions[session_id], f, indent=2)
+        # Appends only the turns added since the last save
+        self.store.save(session_id)
 
     def load_session(self, session_id):
-        path = os.path.join(self.session_folder, f"{session_id}.json")
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                self.sessions[session_id] = json.load(f)
\ No newline at end of file
+        # Turns that were never saved (e.g. a failed Bedrock call) are dropped, as a reload from disk did
+        self.store.discard(session_id)
@@ -0,0 +1,256 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+import numpy as np
+from parameters.modules.rag_fallback import index_file_lock
+
+# Dense (sentence-embedding) retrieval over the same records as the TF-IDF index.
+# faiss and sentence-transformers are optional: they are imported on first use.
+BASE_DIR = os.path.dirname(__file__)
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(BASE_DIR, "rag_index"))
+EMBEDDING_MODEL = os.getenv("RAG_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+INDEX_TYPE = os.getenv("RAG_DENSE_INDEX", "hnsw")  # "hnsw" or "ivf"
+HNSW_M = 32
+IVF_NPROBE = 8
+DENSE_VERSION = 1
+
+
+def record_key(record):
+    """Stable id for a (filepath, text, field, answer) record.
+
+    The answer is part of the key, so a changed answer is indexed as a new
+    record instead of search returning the stale one.
+    """
+    filepath, text, field, answer = record
+    raw = f"{os.path.basename(filepath)}\x00{field}\x00{text}\x00{answer}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class DenseRetriever:
+    """Sentence-embedding retriever backed by a persisted faiss index.
+
+    Normalised embeddings are stored in a .npy file that is memory-mapped on
+    load, and the faiss index (HNSW or IVF, inner product == cosine) is read
+    from disk, so a worker starts without re-embedding the corpus. New records
+    are embedded and appended incrementally; removed ones are masked out until
+    the next rebuild.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, model_name=EMBEDDING_MODEL, index_type=INDEX_TYPE):
+        self.index_dir = index_dir
+        self.model_name = model_name
+        self.index_type = index_type
+        self._lock = threading.RLock()
+        self._model = None
+
+        self.index = None
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.records = []   # position -> record
+        self.positions = {} # record key -> position
+        self.live = np.zeros(0, dtype=bool)
+        self.synced_generation = None
+        self._read_only = False
+
+    # --- embedding ---
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            print(f"🧠 Loading embedding model '{self.model_name}'...")
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def encode(self, texts):
+        vectors = self.model.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    # --- building ---
+
+    def _new_index(self, dim, n):
+        import faiss
+        if self.index_type == "ivf" and n >= 256:
+            nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))
+            quantizer = faiss.IndexFlatIP(dim)
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            base.train(np.ascontiguousarray(self.embeddings))
+            base.nprobe = IVF_NPROBE
+        else:
+            base = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexIDMap2(base)
+
+    def build(self, records):
+        """Embed all `records` and build a fresh faiss index over them."""
+        records = list(records)
+        print(f"🔨 Embedding {len(records)} local knowledge texts...")
+        embeddings = self.encode([rec[1] for rec in records]) if records else np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            self.records = records
+            self.positions = {record_key(rec): i for i, rec in enumerate(records)}
+            self.embeddings = embeddings
+            self.live = np.ones(len(records), dtype=bool)
+            self.index = None
+            self._read_only = False
+            if len(records):
+                self.index = self._new_index(embeddings.shape[1], len(records))
+                self.index.add_with_ids(np.ascontiguousarray(embeddings), np.arange(len(records), dtype=np.int64))
+
+    def sync(self, records, generation=None):
+        """Bring the index in line with `records`: embed new ones, mask dropped ones."""
+        if generation is not None and generation == self.synced_generation:
+            return
+        records = list(records)
+        wanted = {record_key(rec): rec for rec in records}
+        with self._lock:
+            changed = self.index is None
+            if self.index is None:
+                self.build(records)
+            else:
+                new = [rec for key, rec in wanted.items() if key not in self.positions]
+                for key, pos in self.positions.items():
+                    alive = key in wanted
+                    changed = changed or alive != self.live[pos]
+                    self.live[pos] = alive
+                if new:
+                    self._make_writable()
+                    vectors = self.encode([rec[1] for rec in new])
+                    start = len(self.records)
+                    ids = np.arange(start, start + len(new), dtype=np.int64)
+                    self.embeddings = np.concatenate([np.asarray(self.embeddings), vectors])
+                    self.records.extend(new)
+                    self.positions.update({record_key(rec): start + i for i, rec in enumerate(new)})
+                    self.live = np.concatenate([self.live, np.ones(len(new), dtype=bool)])
+                    self.index.add_with_ids(vectors, ids)
+                    changed = True
+                if len(self.live) and (~self.live).sum() > max(64, len(self.live) // 4):
+                    self.build(records)
+            if changed:
+                self.save()
+            self.synced_generation = generation
+
+    def _make_writable(self):
+        """Swap a read-only memory-mapped faiss index for an in-memory copy before adding to it."""
+        if self._read_only:
+            import faiss
+            self.index = faiss.read_index(self._paths()[0])
+            self._read_only = False
+
+    # --- scoring ---
+
+    def search_vector(self, query_vector, top_k=5):
+        """Return up to `top_k` (score, record) pairs for an encoded query."""
+        with self._lock:
+            if self.index is None or not self.live.any():
+                return []
+            # Over-fetch a little so masked (removed) records don't starve the result
+            k = min(len(self.records), top_k + int((~self.live).sum()))
+            scores, ids = self.index.search(query_vector.reshape(1, -1), k)
+            hits = []
+            for score, pos in zip(scores[0], ids[0]):
+                if pos >= 0 and self.live[pos]:
+                    hits.append((float(score), self.records[pos]))
+            return hits[:top_k]
+
+    def similarity(self, query_vector, record):
+        """Cosine similarity between an encoded query and one indexed record."""
+        pos = self.positions.get(record_key(record))
+        if pos is None or not self.live[pos]:
+            return 0.0
+        return float(np.dot(self.embeddings[pos], query_vector))
+
+    def search(self, query, top_k=5):
+        return self.search_vector(self.encode([query])[0], top_k)
+
+    # --- persistence ---
+
+    def _paths(self):
+        return (os.path.join(self.index_dir, "dense.faiss"),
+                os.path.join(self.index_dir, "dense_embeddings.npy"),
+                os.path.join(self.index_dir, "dense_meta.json"))
+
+    def save(self):
+        import faiss
+        with self._lock:
+            if self.index is None:
+                return
+            os.makedirs(self.index_dir, exist_ok=True)
+            index_path, emb_path, meta_path = self._paths()
+            suffix = f".{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            faiss.write_index(self.index, index_path + suffix)
+            with open(emb_path + suffix, "wb") as f:
+                np.save(f, np.asarray(self.embeddings, dtype=np.float32))
+            with open(meta_path + suffix, "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": DENSE_VERSION,
+                    "model": self.model_name,
+                    "index_type": self.index_type,
+                    "records": self.records,
+                    "live": self.live.tolist(),
+                }, f, ensure_ascii=False)
+            # All three under the lock, so a reader never pairs a new index with old metadata
+            with index_file_lock(self.index_dir, exclusive=True):
+                for path in (index_path, emb_path, meta_path):
+                    os.replace(path + suffix, path)
+                # Swap the in-memory copy for a read-only view of the file just written
+                self.embeddings = np.load(emb_path, mmap_mode="r")
+
+    def load(self):
+        import faiss
+        index_path, emb_path, meta_path = self._paths()
+        if not all(os.path.exists(p) for p in (index_path, emb_path, meta_path)):
+            return False
+        try:
+            with index_file_lock(self.index_dir, exclusive=False):
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                if (meta.get("version") != DENSE_VERSION or meta.get("model") != self.model_name
+                        or meta.get("index_type") != self.index_type):
+                    return False
+                try:
+                    index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                    read_only = True
+                except Exception:
+                    index = faiss.read_index(index_path)
+                    read_only = False
+                embeddings = np.load(emb_path, mmap_mode="r")
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable dense index: {e}")
+            return False
+
+        with self._lock:
+            self.index = index
+            self._read_only = read_only
+            self.embeddings = embeddings
+            self.records = [tuple(rec) for rec in meta["records"]]
+            self.positions = {record_key(rec): i for i, rec in enumerate(self.records)}
+            self.live = np.array(meta["live"], dtype=bool)
+        print(f"📚 Loaded dense index ({len(self.records)} texts, {self.index_type})")
+        return True
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+def get_dense_retriever():
+    """Return the process-wide dense retriever, loading it from disk when possible."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                retriever = DenseRetriever()
+                retriever.load()
+                _retriever = retriever
+    return _retriever
+
+
+if __name__ == "__main__":
+    # Prebuild the dense index so workers only have to load it
+    from parameters.modules.rag_fallback import get_index
+    index = get_index()
+    retriever = DenseRetriever()
+    retriever.build(index.live_records())
+    retriever.synced_generation = index.generation
+    retriever.save()
+    print(f"✅ Dense index written to {retriever.index_dir}")
@@ -0,0 +1,109 @@
+import os
+import re
+import time
+import threading
+
+# Background cleanup of generated/uploaded audio so disk use stays bounded.
+# Each rule is (folder, max total bytes or None, max age in seconds or None,
+# file name pattern or None). Only this app's folders are swept; the legacy
+# voicebot-backend/ folders and tracked sample files are never touched.
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", "300"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+TTS_CACHE_MAX_AGE = float(os.getenv("TTS_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+UPLOADS_MAX_AGE = float(os.getenv("UPLOADS_MAX_AGE", "3600"))
+TMP_MAX_AGE = 600  # half-written *.tmp files from interrupted writes
+# Names utils.synthesize_speech writes: tts_cache_key() + extension, or its temp file
+TTS_FILE_PATTERN = re.compile(r"[0-9a-f]{32}\.\w+(\.[0-9a-f]{32}\.tmp)?")
+
+DEFAULT_RULES = [
+    ("tts_outputs", TTS_CACHE_MAX_BYTES, TTS_CACHE_MAX_AGE, TTS_FILE_PATTERN),
+    ("uploads", None, UPLOADS_MAX_AGE, None),
+]
+
+
+def sweep_folder(folder, max_bytes=None, max_age=None, now=None, pattern=None):
+    """Delete files older than `max_age`, then least recently used ones until under `max_bytes`.
+
+    "Recently used" is the mtime, which cache hits refresh. With `pattern`, only
+    files whose whole name matches are considered. Returns (files, bytes) removed.
+    """
+    if not os.path.isdir(folder):
+        return 0, 0
+    now = now or time.time()
+    files = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if pattern is not None and not pattern.fullmatch(entry.name):
+                continue
+            if entry.is_file():
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+
+    removed, freed = 0, 0
+    keep, total = [], 0
+    for mtime, size, path in files:
+        limit = TMP_MAX_AGE if path.endswith(".tmp") else max_age
+        if limit is not None and now - mtime > limit:
+            removed, freed = removed + _remove(path), freed + size
+        else:
+            keep.append((mtime, size, path))
+            total += size
+
+    if max_bytes is not None and total > max_bytes:
+        for mtime, size, path in sorted(keep):
+            if total <= max_bytes:
+                break
+            removed, freed = removed + _remove(path), freed + size
+            total -= size
+    return removed, freed
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+        return 1
+    except OSError:
+        return 0
+
+
+class Janitor:
+    """Daemon thread that sweeps the configured folders every `interval` seconds."""
+
+    def __init__(self, rules=None, interval=JANITOR_INTERVAL):
+        self.rules = rules or DEFAULT_RULES
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sweep(self):
+        for folder, max_bytes, max_age, pattern in self.rules:
+            removed, freed = sweep_folder(folder, max_bytes, max_age, pattern=pattern)
+            if removed:
+                print(f"🧹 Janitor removed {removed} files ({freed / 1024:.0f} KiB) from {folder}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️ Janitor sweep failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+_janitor = None
+
+def start_janitor():
+    """Start the process-wide janitor once."""
+    global _janitor
+    if _janitor is None:
+        _janitor = Janitor().start()
+    return _janitor
@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import tempfile
+import threading
+import numpy as np
+from parameters.modules.lsh import NearDuplicateIndex
+
+# Compiled, memory-mapped form of the local knowledge base.
+#
+# Layout of the corpus file (little endian):
+#   header   magic, version, record count, then byte positions of the sections below
+#   offsets  uint64[n_slots + 1], start of each text slot inside the blob
+#   meta     UTF-8 JSON: sources (mtime, schema, record range, near-duplicate
+#            records) and per-record [source, field, text slot, answer slot or -1]
+#   blob     all record texts and answers, UTF-8, back to back
+BASE_DIR = os.path.dirname(__file__)
+REPO_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", ".."))
+SOURCE_FOLDERS = [
+    os.path.join(BASE_DIR, "converted_jsons"),
+    os.path.join(BASE_DIR, "summaries"),
+]
+TRAINING_FILE = os.path.join(REPO_DIR, "training_data.json")
+CORPUS_PATH = os.getenv("KNOWLEDGE_CORPUS_PATH", os.path.join(BASE_DIR, "rag_index", "knowledge.corpus"))
+
+# Knowledge records at least this similar (MinHash/Jaccard) to an earlier one are
+# kept in the corpus but not indexed; 0 disables collapsing near-duplicates.
+DEDUP_THRESHOLD = float(os.getenv("KNOWLEDGE_DEDUP_THRESHOLD", "0.9"))
+
+MAGIC = b"VBKC"
+CORPUS_VERSION = 2
+HEADER = struct.Struct("<4sIIIQQQQ")  # magic, version, records, slots, offsets, meta, meta_len, blob
+
+
+def extract_records(data):
+    """Flatten a knowledge JSON into (text, field, answer) records.
+
+    `answer` is only set for cached Claude entries, where the question is
+    matched but the stored answer is what gets returned.
+    """
+    records = []
+    answer = data.get("answer") if isinstance(data.get("answer"), str) else None
+    for key, val in data.items():
+        items = [val] if isinstance(val, str) else val if isinstance(val, list) else []
+        for item in items:
+            if isinstance(item, str):
+                records.append((item, key, answer if key == "original_question" else None))
+    return records
+
+
+def detect_schema(data):
+    if "summary" in data:
+        return "converted"
+    if any(key[:1].isdigit() for key in data):
+        return "summary"
+    return "json"
+
+
+def parse_source(path):
+    """Return (schema, [(text, field, answer)]) for one source file."""
+    if os.path.abspath(path) == os.path.abspath(TRAINING_FILE):
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                pair = json.loads(line)
+                # A prompt that matches well is answered with its recorded completion
+                if isinstance(pair.get("prompt"), str):
+                    records.append((pair["prompt"], "prompt", pair.get("completion") or None))
+        return "training", records
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        return "json", []
+    return detect_schema(data), extract_records(data)
+
+
+def mark_duplicates(compiled, threshold=DEDUP_THRESHOLD):
+    """{source: [record positions]} of knowledge records that near-duplicate an earlier record.
+
+    Sources are visited shortest file name first, so a "… - Copy" file loses
+    to its original. Records carrying an answer (training prompts) are kept.
+    """
+    seen = NearDuplicateIndex(threshold=threshold)
+    duplicates = {}
+    for source in sorted(compiled, key=lambda s: (len(os.path.basename(s)), s)):
+        for i, (text, _, answer) in enumerate(compiled[source][2]):
+            if answer is not None:
+                continue
+            if seen.query(text):
+                duplicates.setdefault(source, []).append(i)
+            else:
+                seen.add((source, i), text)
+    return duplicates
+
+
+def scan_sources(folders=None, training_file=TRAINING_FILE):
+    """Map every source file to its mtime. Only stats files, nothing is parsed."""
+    sources = {}
+    for folder in folders or SOURCE_FOLDERS:
+        if not os.path.exists(folder):
+            continue
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                # Dotfiles are bookkeeping (e.g. download.py's sync manifest), not knowledge
+                if entry.name.endswith(".json") and not entry.name.startswith(".") and entry.is_file():
+                    sources[entry.path] = entry.stat().st_mtime
+    if training_file and os.path.exists(training_file):
+        sources[training_file] = os.path.getmtime(training_file)
+    return sources
+
+
+class KnowledgeCorpus:
+    """Read-only, memory-mapped view of a compiled corpus file."""
+
+    def __init__(self, path=CORPUS_PATH):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_records, n_slots, offsets_pos, meta_pos, meta_len, blob_pos = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != CORPUS_VERSION:
+            raise ValueError(f"{path} is not a v{CORPUS_VERSION} knowledge corpus")
+        self._offsets = np.frombuffer(self._mm, dtype="<u8", count=n_slots + 1, offset=offsets_pos)
+        self._blob_pos = blob_pos
+        meta = json.loads(self._mm[meta_pos:meta_pos + meta_len].decode("utf-8"))
+        self.source_names = meta["source_names"]
+        self.sources = meta["sources"]   # path -> {"mtime", "schema", "first", "count"}
+        self._records = meta["records"]  # [source index, field, text slot, answer slot]
+        assert len(self._records) == n_records
+
+    def __len__(self):
+        return len(self._records)
+
+    def _slot(self, slot):
+        if slot < 0:
+            return None
+        start = self._blob_pos + int(self._offsets[slot])
+        end = self._blob_pos + int(self._offsets[slot + 1])
+        return self._mm[start:end].decode("utf-8")
+
+    def record(self, i):
+        """Return (source, text, field, answer) for record `i`."""
+        source, field, text_slot, answer_slot = self._records[i]
+        return self.source_names[source], self._slot(text_slot), field, self._slot(answer_slot)
+
+    def records_for(self, source, include_duplicates=False):
+        """(text, field, answer) records compiled from one source file, near-duplicates left out."""
+        info = self.sources.get(source)
+        if info is None:
+            return []
+        skip = set() if include_duplicates else set(info.get("duplicates", ()))
+        return [self.record(info["first"] + i)[1:] for i in range(info["count"]) if i not in skip]
+
+    def version_of(self, source):
+        """Changes whenever the records that records_for(source) returns can change."""
+        info = self.sources.get(source, {})
+        return [info.get("mtime"), info.get("duplicates", [])]
+
+    def schema_of(self, source):
+        return self.sources.get(source, {}).get("schema")
+
+
+def write_corpus(path, compiled, duplicates=None):
+    """Write `compiled` ({source: (mtime, schema, records)}) as a corpus file, atomically."""
+    source_names, sources, records, slots = [], {}, [], []
+    for source, (mtime, schema, source_records) in sorted(compiled.items()):
+        sources[source] = {"mtime": mtime, "schema": schema, "first": len(records), "count": len(source_records),
+                           "duplicates": (duplicates or {}).get(source, [])}
+        source_idx = len(source_names)
+        source_names.append(source)
+        for text, field, answer in source_records:
+            text_slot = len(slots)
+            slots.append(text.encode("utf-8"))
+            answer_slot = -1
+            if answer is not None:
+                answer_slot = len(slots)
+                slots.append(answer.encode("utf-8"))
+            records.append([source_idx, field, text_slot, answer_slot])
+
+    offsets = np.zeros(len(slots) + 1, dtype="<u8")
+    if slots:
+        offsets[1:] = np.cumsum([len(s) for s in slots])
+    meta = json.dumps({"source_names": source_names, "sources": sources, "records": records},
+                      ensure_ascii=False).encode("utf-8")
+    offsets_pos = HEADER.size
+    meta_pos = offsets_pos + offsets.nbytes
+    blob_pos = meta_pos + len(meta)
+
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    # A temp file of its own per writer: concurrent rebuilds (one per worker) cannot interleave
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, CORPUS_VERSION, len(records), len(slots),
+                                offsets_pos, meta_pos, len(meta), blob_pos))
+            f.write(offsets.tobytes())
+            f.write(meta)
+            for s in slots:
+                f.write(s)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def compile_corpus(path=CORPUS_PATH, folders=None, training_file=TRAINING_FILE, incremental=True, previous=None):
+    """(Re)compile the corpus; returns True if the file was rewritten.
+
+    With `incremental`, sources whose mtime is unchanged are copied from the
+    existing corpus (`previous`, or the file at `path`) instead of being
+    parsed again, and nothing is written when no source was added, changed
+    or removed.
+    """
+    current = scan_sources(folders, training_file)
+    if not incremental:
+        previous = None
+    elif previous is None and os.path.exists(path):
+        try:
+            previous = KnowledgeCorpus(path)
+        except Exception as e:
+            print(f"⚠️ Rebuilding unreadable knowledge corpus: {e}")
+    if previous is not None and {s: info["mtime"] for s, info in previous.sources.items()} == current:
+        return False
+
+    compiled, parsed = {}, 0
+    for source, mtime in current.items():
+        if previous is not None and previous.sources.get(source, {}).get("mtime") == mtime:
+            compiled[source] = (mtime, previous.schema_of(source), previous.records_for(source, include_duplicates=True))
+            continue
+        try:
+            schema, records = parse_source(source)
+        except Exception as e:
+            print(f"Failed to read {source}: {e}")
+            continue
+        compiled[source] = (mtime, schema, records)
+        parsed += 1
+    # Recomputed over everything, so removing an original lets its copy be indexed again
+    duplicates = mark_duplicates(compiled) if DEDUP_THRESHOLD > 0 else {}
+    write_corpus(path, compiled, duplicates)
+    collapsed = sum(len(d) for d in duplicates.values())
+    print(f"📦 Compiled knowledge corpus: {len(compiled)} sources ({parsed} parsed, "
+          f"{collapsed} near-duplicate records collapsed) -> {path}")
+    return True
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+def get_corpus(path=CORPUS_PATH, recompile=True):
+    """Return the mapped corpus, recompiling changed sources first and remapping if the file changed."""
+    global _corpus
+    with _corpus_lock:
+        if recompile or not os.path.exists(path):
+            mapped = _corpus if _corpus is not None and _corpus.path == path else None
+            compile_corpus(path, previous=mapped)
+        if _corpus is None or _corpus.path != path or _corpus.mtime != os.path.getmtime(path):
+            _corpus = KnowledgeCorpus(path)
+        return _corpus
+
+
+if __name__ == "__main__":
+    compile_corpus(incremental="--full" not in sys.argv)
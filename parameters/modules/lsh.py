@@ -0,0 +1,171 @@
+import os
+import re
+import zlib
+import unicodedata
+import numpy as np
+
+# MinHash locality-sensitive hashing for near-duplicate text. A text becomes a
+# set of shingles (its content words plus their character trigrams), the set
+# becomes a short MinHash signature, and signatures are bucketed per band so
+# candidates are found with a handful of dict lookups; candidates are then
+# checked with the exact Jaccard similarity of their shingle sets.
+LSH_NUM_PERM = 64
+LSH_BANDS = 16  # 4 rows per band: a pair at 0.8 Jaccard collides in 2+ bands with probability > 0.997
+LSH_THRESHOLD = float(os.getenv("LSH_THRESHOLD", "0.8"))
+MIN_SHARED_BANDS = 2  # candidates must collide in this many bands before the exact check
+
+# Multiply-add-shift hash family over 32-bit shingle hashes: ((a * x + b) mod 2**64) >> 32
+# with random 64-bit a (odd) and b; fixed seed so signatures are stable across runs
+_rng = np.random.RandomState(1)
+_A = _rng.randint(0, 1 << 63, size=(LSH_NUM_PERM, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.randint(0, 1 << 63, size=(LSH_NUM_PERM, 1), dtype=np.uint64) * np.uint64(2) + \
+    _rng.randint(0, 2, size=(LSH_NUM_PERM, 1), dtype=np.uint64)
+_SHIFT = np.uint64(32)
+
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did can could would should will shall may might must
+i me my we our you your he she it its they them their this that these those there here
+of to in on at for from by with about as into
+and or but so if then than too very just please tell
+kya hai hain ka ki ke ko mein se
+""".split())
+# Negations and question words are content words, and two texts only match if they
+# carry the same ones: "is the store open" is not a rewording of "is the store not
+# open", nor "when is the store open" of "where is the store open".
+NEGATIONS = frozenset("not no never nahi nahin na mat नहीं नही ना मत".split())
+INTERROGATIVES = frozenset("what which who whom whose when where why how kab kahan kyun kyon kaise kaun".split())
+_GUARD_SHINGLES = frozenset("w:" + word for word in NEGATIONS | INTERROGATIVES)
+_CONTRACTIONS = [
+    (re.compile(r"\bcan['’]t\b|\bcannot\b"), "can not"),
+    (re.compile(r"\bwon['’]t\b"), "will not"),
+    (re.compile(r"\bshan['’]t\b"), "shall not"),
+    (re.compile(r"n['’]t\b"), " not"),
+    (re.compile(r"['’]re\b"), " are"),
+    (re.compile(r"['’]m\b"), " am"),
+    (re.compile(r"['’]ll\b"), " will"),
+    (re.compile(r"['’]ve\b"), " have"),
+    (re.compile(r"['’]d\b"), " would"),
+    (re.compile(r"\b(what|where|who|how|it|that|there|here)['’]s\b"), r"\1 is"),
+    (re.compile(r"\b(what|where|how)s\b"), r"\1 is"),  # "whats", typed without the apostrophe
+    (re.compile(r"['’]s\b"), ""),  # possessive
+]
+
+
+_separators = None
+
+def _separator_table():
+    """str.translate table mapping punctuation, symbols, separators and controls (BMP) to spaces.
+
+    Built by Unicode category rather than with \\w, which would split Devanagari
+    words at their vowel signs; built on first use to keep imports cheap.
+    """
+    global _separators
+    if _separators is None:
+        _separators = {i: " " for i in range(0x10000) if unicodedata.category(chr(i))[0] in "PSZC"}
+    return _separators
+
+
+def content_words(text):
+    """Lower-cased words without punctuation, contractions or stopwords, with plural -s dropped."""
+    text = text.lower()
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = text.translate(_separator_table())
+    words = []
+    for word in text.split():
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def shingles(text):
+    words = content_words(text)
+    joined = f" {' '.join(words)} "
+    result = {"w:" + word for word in words}
+    result.update(joined[i:i + 3] for i in range(len(joined) - 2))
+    return frozenset(result) if words else frozenset()
+
+
+def signature(shingle_set):
+    """MinHash signature (uint64[LSH_NUM_PERM]) of a non-empty shingle set."""
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingle_set], dtype=np.uint64)
+    values = _A * hashes
+    values += _B
+    values >>= _SHIFT
+    return values.min(axis=1)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class NearDuplicateIndex:
+    """MinHash LSH over texts, each stored under a caller-chosen key."""
+
+    def __init__(self, threshold=LSH_THRESHOLD, bands=LSH_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = LSH_NUM_PERM // bands
+        self._buckets = [dict() for _ in range(bands)]  # band -> {band bytes: set of keys}
+        self._entries = {}                              # key -> (shingles, band bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _bands(self, sig):
+        raw = sig.tobytes()
+        step = self.rows * 8
+        return [raw[i * step:(i + 1) * step] for i in range(self.bands)]
+
+    def add(self, key, text):
+        """Index `text` under `key`; returns False for texts with no content words."""
+        self.remove(key)
+        shingle_set = shingles(text)
+        if not shingle_set:
+            return False
+        bands = self._bands(signature(shingle_set))
+        for bucket, band in zip(self._buckets, bands):
+            bucket.setdefault(band, set()).add(key)
+        self._entries[key] = (shingle_set, bands)
+        return True
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for bucket, band in zip(self._buckets, entry[1]):
+            keys = bucket.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del bucket[band]
+
+    def query(self, text, threshold=None):
+        """(jaccard, key) of indexed texts at least `threshold` similar to `text`, best first."""
+        shingle_set = shingles(text)
+        if not shingle_set:
+            return []
+        shared = {}
+        for bucket, band in zip(self._buckets, self._bands(signature(shingle_set))):
+            for key in bucket.get(band, ()):
+                shared[key] = shared.get(key, 0) + 1
+        threshold = self.threshold if threshold is None else threshold
+        matches = []
+        guards = shingle_set & _GUARD_SHINGLES
+        for key, count in shared.items():
+            # A pair at the 0.8 default shares ~6.5 of 16 bands; one shared band is almost always chance
+            if count < MIN_SHARED_BANDS:
+                continue
+            if self._entries[key][0] & _GUARD_SHINGLES != guards:
+                continue
+            score = jaccard(shingle_set, self._entries[key][0])
+            if score >= threshold:
+                matches.append((score, key))
+        matches.sort(key=lambda item: -item[0])
+        return matches
@@ -0,0 +1,180 @@
+import os
+import time
+import threading
+import contextvars
+
+# Per-stage latency of a request: `with span("asr_decode"):` times a block,
+# feeds a Prometheus histogram (served at /metrics) and, inside a request,
+# adds an entry to that response's Server-Timing header. With METRICS_ENABLED=0
+# span() returns a shared no-op and counters return immediately.
+ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # seconds
+
+HELP = {
+    "voicebot_stage_seconds": ("histogram", "Time spent in each stage of a request."),
+    "voicebot_request_seconds": ("histogram", "Total time per HTTP endpoint."),
+    "voicebot_answers_total": ("counter", "Answers by where they came from (local, llm, fallback, error)."),
+    "voicebot_bedrock_throttles_total": ("counter", "Bedrock ThrottlingException responses."),
+    "voicebot_tts_requests_total": ("counter", "Speech syntheses by TTS file cache result."),
+    "voicebot_speculation_total": ("counter", "Speculative Bedrock calls by outcome (used, wasted, over_budget)."),
+}
+
+_histograms = {}  # (name, labels) -> [count per bucket..., sum, count]
+_counters = {}    # (name, labels) -> value
+_lock = threading.Lock()
+_request_spans = contextvars.ContextVar("request_spans", default=None)
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                values[i] += 1
+        values[-2] += seconds
+        values[-1] += 1
+
+
+def inc(name, amount=1, **labels):
+    if not ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        observe("voicebot_stage_seconds", elapsed, stage=self.stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((self.stage, elapsed))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+def span(stage):
+    """Context manager timing one stage (e.g. "bedrock", "tts")."""
+    return _Span(stage) if ENABLED else _NOOP
+
+
+def start_request():
+    """Collect spans for the current request; returns a token for end_request()."""
+    return _request_spans.set([]) if ENABLED else None
+
+
+def end_request(token):
+    """Stop collecting and return the request's (stage, seconds) spans in the order they finished."""
+    if token is None:
+        return []
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    return spans
+
+
+def server_timing(spans):
+    """Server-Timing header value; repeated stages (e.g. Bedrock retries) are summed."""
+    totals, counts = {}, {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+        counts[stage] = counts.get(stage, 0) + 1
+    parts = []
+    for stage, seconds in totals.items():
+        part = f"{stage};dur={seconds * 1000:.1f}"
+        if counts[stage] > 1:
+            part += f';desc="{counts[stage]}x"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+
+def render():
+    """All histograms and counters in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: list(values) for key, values in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name, (kind, help_text) in HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "histogram":
+            for (hname, labels), values in sorted(histograms.items()):
+                if hname != name:
+                    continue
+                for bound, count in zip(BUCKETS, values):
+                    lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {values[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {values[-2]:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {values[-1]}")
+        else:
+            for (cname, labels), value in sorted(counters.items()):
+                if cname == name:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def instrument_flask(app):
+    """Time every request, add its Server-Timing header and serve /metrics."""
+    if not ENABLED:
+        return
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timing():
+        g.metrics_token = start_request()
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _add_server_timing(response):
+        token = g.pop("metrics_token", None)
+        if token is None:
+            return response
+        elapsed = time.perf_counter() - g.pop("metrics_started")
+        spans = end_request(token)
+        observe("voicebot_request_seconds", elapsed, endpoint=request.endpoint or "unknown")
+        # Streamed bodies are still being produced here; their header covers the work done so far
+        response.headers["Server-Timing"] = server_timing(spans + [("total", elapsed)])
+        return response
+
+    @app.teardown_request
+    def _drop_timing(exc):
+        token = g.pop("metrics_token", None)
+        if token is not None:
+            _request_spans.reset(token)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -1,16 +1,43 @@
 import os
+import re
 import json
-import glob
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import time
+import uuid
+import threading
+import contextlib
+import numpy as np
+from scipy import sparse
+from parameters.modules.knowledge_corpus import CORPUS_PATH, extract_records, get_corpus
+from parameters.modules.lsh import NearDuplicateIndex
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: saves are then only serialised within a process
+    fcntl = None
 
-# Define folders to search for fallback answers
 BASE_DIR = os.path.dirname(__file__)
-FOLDERS = [
-    os.path.join(BASE_DIR, "converted_jsons"),
-    os.path.join(BASE_DIR, "summaries"),
-    os.path.join(BASE_DIR, "auto_cached_jsons")  # Cached Claude responses
-]
+
+# Where the persisted TF-IDF index lives (vocabulary, document frequencies, counts, metadata)
+INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(BASE_DIR, "rag_index"))
+INDEX_VERSION = 3
+# Minimum seconds between two checks of the knowledge sources for added/changed/removed files
+REFRESH_INTERVAL = float(os.getenv("RAG_REFRESH_INTERVAL", "5"))
+
+# Retrieval mode: "tfidf" (default), "dense" or "hybrid". Scores live on different
+# scales, so each mode has its own reuse threshold.
+RAG_MODE = os.getenv("RAG_MODE", "tfidf")
+THRESHOLDS = {
+    "tfidf": 0.92,
+    "dense": float(os.getenv("RAG_DENSE_THRESHOLD", "0.82")),
+    "hybrid": float(os.getenv("RAG_HYBRID_THRESHOLD", "0.85")),
+}
+HYBRID_ALPHA = float(os.getenv("RAG_HYBRID_ALPHA", "0.4"))  # weight of the TF-IDF score
+HYBRID_CANDIDATES = 20
+# Near-duplicate tier: a MinHash LSH lookup finds a short record (question, prompt)
+# that the query rewords ("what is mcdonalds" / "what's McDonald's?") and reuses its
+# answer without scoring the whole index; see lsh.LSH_THRESHOLD for the Jaccard floor.
+RAG_LSH = os.getenv("RAG_LSH", "1") != "0"
+LSH_MAX_CHARS = 300  # longer records are passages, not questions someone would repeat
 
 def extract_texts_from_file(filepath):
     try:
@@ -30,55 +57,400 @@ def extract_texts_from_file(filepath):
         print(f"Failed to read {filepath}: {e}")
         return []
 
-def search_local_knowledge(query, threshold=0.92):
-    all_texts = []
-    text_meta = []  # stores (filepath, original_text, field, full_data)
-
-    for folder in FOLDERS:
-        if not os.path.exists(folder):
-            continue
-        for filepath in glob.glob(os.path.join(folder, "*.json")):
-            try:
-                with open(filepath, encoding='utf-8') as f:
-                    data = json.load(f)
-                    for key, val in data.items():
-                        if isinstance(val, str):
-                            all_texts.append(val)
-                            text_meta.append((filepath, val, key, data))
-                        elif isinstance(val, list):
-                            for item in val:
-                                if isinstance(item, str):
-                                    all_texts.append(item)
-                                    text_meta.append((filepath, item, key, data))
-            except Exception as e:
-                print(f"Failed to read {filepath}: {e}")
-
-    if not all_texts:
-        print("No usable local knowledge found.")
-        return None
+# TfidfVectorizer's default analyzer (lowercase, \w\w+ tokens) without importing sklearn,
+# except that "n't" becomes a "not" token instead of being dropped with the lone "t"
+_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+_NEGATED = re.compile(r"n['’]t\b")
 
-    try:
-        vectorizer = TfidfVectorizer().fit(all_texts + [query])
-        vectors = vectorizer.transform(all_texts + [query])
-        similarities = cosine_similarity(vectors[-1], vectors[:-1]).flatten()
+def _analyze(text):
+    return _TOKEN.findall(_NEGATED.sub(" not", text.lower()))
+
+@contextlib.contextmanager
+def index_file_lock(index_dir, exclusive):
+    """flock on index_dir/.lock, so workers never save at once or read a half-replaced set of index files."""
+    with open(os.path.join(index_dir, ".lock"), "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class LocalKnowledgeIndex:
+    """Long-lived TF-IDF index over the compiled knowledge corpus.
+
+    Raw term counts and document frequencies are kept per row so files can be
+    added, replaced or removed without refitting; the idf-weighted, normalised
+    matrix is re-derived from them only when something changed. A query then
+    costs one sparse transform plus one sparse dot product.
+    """
+
+    def __init__(self, corpus_path=CORPUS_PATH, index_dir=INDEX_DIR, refresh_interval=REFRESH_INTERVAL):
+        self.corpus_path = corpus_path
+        self.index_dir = index_dir
+        self.refresh_interval = refresh_interval
+        self._analyzer = _analyze
+        self._lock = threading.RLock()
+
+        self.vocabulary = {}   # term -> column
+        self.df = np.zeros(0, dtype=np.int64)
+        self.records = []      # row -> (filepath, text, field, answer) or None once removed
+        self.row_terms = []    # row -> (columns, counts)
+        self.file_rows = {}    # filepath -> [rows]
+        self.record_rows = {}  # record -> row
+        self.file_mtimes = {}  # filepath -> mtime (corpus version for corpus sources) when indexed
+        self.corpus_sources = set()  # sources that came from the corpus rather than add_entry()
+
+        self._matrix = None
+        self._lsh = None       # NearDuplicateIndex over short records, built on first use
+        self._last_refresh = 0.0
+        self._unsaved = False
+        self.generation = 0    # bumped on every change, lets dependants resync lazily
+
+    # --- building ---
+
+    @classmethod
+    def load_or_build(cls, **kwargs):
+        index = cls(**kwargs)
+        if not index.load():
+            print("🔨 Building local knowledge index...")
+        index.refresh(force=True)
+        index.save()
+        return index
+
+    def _count_terms(self, text, grow):
+        """Map text to {column: count}; without `grow`, unknown terms are counted separately."""
+        counts, unseen = {}, {}
+        for term in self._analyzer(text):
+            col = self.vocabulary.get(term)
+            if col is None:
+                if not grow:
+                    unseen[term] = unseen.get(term, 0) + 1
+                    continue
+                col = self.vocabulary[term] = len(self.vocabulary)
+            counts[col] = counts.get(col, 0) + 1
+        return counts, unseen
+
+    def add_entry(self, source, data, mtime=None):
+        """Index (or re-index) one knowledge dict under `source`, a file path or any other id."""
+        self.add_records(source, extract_records(data) if isinstance(data, dict) else [], mtime)
+
+    def add_records(self, source, records, mtime=None):
+        """Index (or re-index) (text, field, answer) records under `source`."""
+        with self._lock:
+            self._remove_rows(source)
+            rows = []
+            for text, key, answer in records:
+                counts, _ = self._count_terms(text, grow=True)
+                cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                vals = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+                if len(self.df) < len(self.vocabulary):
+                    self.df = np.concatenate([self.df, np.zeros(len(self.vocabulary) - len(self.df), dtype=np.int64)])
+                self.df[cols] += 1
+                record = (source, text, key, answer)
+                self.record_rows[record] = len(self.records)
+                rows.append(len(self.records))
+                if self._lsh is not None and len(text) <= LSH_MAX_CHARS:
+                    self._lsh.add(len(self.records), text)
+                self.records.append(record)
+                self.row_terms.append((cols, vals))
+            self.file_rows[source] = rows
+            self.file_mtimes[source] = mtime
+            self._matrix = None
+            self._unsaved = True
+            self.generation += 1
+
+    def remove_file(self, filepath):
+        """Drop everything indexed under `filepath` (a file path or an `add_entry` source)."""
+        with self._lock:
+            self._remove_rows(filepath)
+            self.file_mtimes.pop(filepath, None)
+            self._matrix = None
+            self._unsaved = True
+            self.generation += 1
+
+    def _remove_rows(self, filepath):
+        for row in self.file_rows.pop(filepath, []):
+            cols, _ = self.row_terms[row]
+            self.df[cols] -= 1
+            self.record_rows.pop(self.records[row], None)
+            self.records[row] = None
+            self.row_terms[row] = (np.zeros(0, dtype=np.int64), np.zeros(0))
+            if self._lsh is not None:
+                self._lsh.remove(row)
+
+    def _compact(self):
+        """Drop removed rows once they make up a sizeable part of the matrix."""
+        live = [i for i, rec in enumerate(self.records) if rec is not None]
+        if len(self.records) - len(live) < max(64, len(self.records) // 4):
+            return
+        remap = {old: new for new, old in enumerate(live)}
+        self.records = [self.records[i] for i in live]
+        self.row_terms = [self.row_terms[i] for i in live]
+        self.file_rows = {fp: [remap[r] for r in rows] for fp, rows in self.file_rows.items()}
+        self.record_rows = {rec: row for row, rec in enumerate(self.records)}
+        self._matrix = None
+        self._lsh = None
+
+    def refresh(self, force=False):
+        """Pick up sources added, changed or removed in the knowledge corpus."""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+
+        corpus = get_corpus(self.corpus_path)
+        with self._lock:
+            for source in list(self.corpus_sources):
+                if source not in corpus.sources:
+                    self.remove_file(source)
+                    self.corpus_sources.discard(source)
+            for source in corpus.sources:
+                version = corpus.version_of(source)
+                if self.file_mtimes.get(source) != version:
+                    self.add_records(source, corpus.records_for(source), version)
+                    self.corpus_sources.add(source)
+            if self._unsaved:
+                self._compact()
+                self.save()
+
+    # --- scoring ---
+
+    def _idf(self):
+        n = sum(1 for rec in self.records if rec is not None)
+        return np.log((1 + n) / (1 + self.df)) + 1, n
 
-        best_idx = similarities.argmax()
-        best_score = similarities[best_idx]
-        matched_text = all_texts[best_idx]
-        filepath, original_text, key, full_data = text_meta[best_idx]
+    def _weighted_matrix(self):
+        if self._matrix is None:
+            idf, _ = self._idf()
+            lengths = [len(cols) for cols, _ in self.row_terms]
+            indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            indices = np.concatenate([cols for cols, _ in self.row_terms] or [np.zeros(0, dtype=np.int64)])
+            data = np.concatenate([vals for _, vals in self.row_terms] or [np.zeros(0)])
+            matrix = sparse.csr_matrix(
+                (data * idf[indices], indices, indptr), shape=(len(self.row_terms), len(self.vocabulary))
+            )
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+            norms[norms == 0] = 1.0
+            self._matrix = sparse.diags(1.0 / norms) @ matrix
+            self._matrix = self._matrix.tocsr()
+        return self._matrix
 
-        print(f"Best local match score: {best_score:.3f}")
+    def _query_vector(self, query):
+        """Normalised tf-idf row vector of `query`, or None if it shares no terms with the index."""
+        idf, n = self._idf()
+        counts, unseen = self._count_terms(query, grow=False)
+        if not counts:
+            return None
+        # Unseen query terms still count towards the query norm, as they would
+        # if the query had been part of the fit.
+        unseen_weight = np.log(1 + n) + 1
+        cols = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * idf[cols]
+        norm = np.sqrt((weights ** 2).sum() + sum((c * unseen_weight) ** 2 for c in unseen.values()))
+        return sparse.csr_matrix((weights / norm, cols, [0, len(cols)]), shape=(1, len(self.vocabulary)))
 
-        if best_score >= threshold:
-            print(f"Reusing cached/local answer (score {best_score:.3f})")
+    def scores(self, query):
+        """Cosine similarity of `query` against every row (zero for removed rows)."""
+        self.refresh()
+        with self._lock:
+            if not self.records:
+                return np.zeros(0)
+            matrix = self._weighted_matrix()
+            q = self._query_vector(query)
+            if q is None:
+                return np.zeros(len(self.records))
+            return (matrix @ q.T).toarray().ravel()
 
-            # Special handling for cached Claude JSON format
-            if key == "original_question" and "answer" in full_data:
-                return full_data["answer"]
+    def search(self, query, top_k=1):
+        """Return up to `top_k` (score, record) pairs, best first."""
+        scores = self.scores(query)
+        best = np.argsort(-scores)[:top_k]
+        return [(float(scores[i]), self.records[i]) for i in best
+                if scores[i] > 0 and self.records[i] is not None]
 
-            return matched_text
+    def near_duplicate(self, query):
+        """(jaccard, record) of the closest short record that rewords `query`, or None."""
+        self.refresh()
+        with self._lock:
+            if self._lsh is None:
+                self._lsh = NearDuplicateIndex()
+                for row, rec in enumerate(self.records):
+                    if rec is not None and len(rec[1]) <= LSH_MAX_CHARS:
+                        self._lsh.add(row, rec[1])
+            matches = self._lsh.query(query)
+            if not matches:
+                return None
+            score, row = matches[0]
+            return score, self.records[row]
 
+    def live_records(self):
+        with self._lock:
+            return [rec for rec in self.records if rec is not None]
+
+    # --- persistence ---
+
+    def _paths(self):
+        return (os.path.join(self.index_dir, "tfidf_counts.npz"),
+                os.path.join(self.index_dir, "tfidf_meta.json"))
+
+    def save(self):
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            counts_path, meta_path = self._paths()
+            lengths = [len(cols) for cols, _ in self.row_terms]
+            idf, _ = self._idf()
+            suffix = f".{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            with open(counts_path + suffix, "wb") as f:
+                np.savez(
+                    f,
+                    indptr=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+                    indices=np.concatenate([c for c, _ in self.row_terms] or [np.zeros(0, dtype=np.int64)]),
+                    data=np.concatenate([v for _, v in self.row_terms] or [np.zeros(0)]),
+                    df=self.df,
+                    idf=idf,
+                )
+            meta = {
+                "version": INDEX_VERSION,
+                "corpus": self.corpus_path,
+                "corpus_sources": sorted(self.corpus_sources),
+                "vocabulary": self.vocabulary,
+                "records": self.records,
+                "file_rows": self.file_rows,
+                "file_mtimes": self.file_mtimes,
+            }
+            with open(meta_path + suffix, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            with index_file_lock(self.index_dir, exclusive=True):
+                os.replace(counts_path + suffix, counts_path)
+                os.replace(meta_path + suffix, meta_path)
+            self._unsaved = False
+
+    def load(self):
+        counts_path, meta_path = self._paths()
+        if not (os.path.exists(counts_path) and os.path.exists(meta_path)):
+            return False
+        try:
+            with index_file_lock(self.index_dir, exclusive=False):
+                with open(meta_path, encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta.get("version") != INDEX_VERSION or meta.get("corpus") != self.corpus_path:
+                    return False
+                arrays = dict(np.load(counts_path))
+            indptr, indices, data = arrays["indptr"], arrays["indices"], arrays["data"]
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable local knowledge index: {e}")
+            return False
+
+        with self._lock:
+            self.vocabulary = meta["vocabulary"]
+            self.df = arrays["df"].astype(np.int64)
+            self.records = [tuple(rec) if rec is not None else None for rec in meta["records"]]
+            self.row_terms = [
+                (indices[indptr[i]:indptr[i + 1]], data[indptr[i]:indptr[i + 1]])
+                for i in range(len(indptr) - 1)
+            ]
+            self.file_rows = meta["file_rows"]
+            self.file_mtimes = meta["file_mtimes"]
+            self.corpus_sources = set(meta["corpus_sources"])
+            self.record_rows = {rec: row for row, rec in enumerate(self.records) if rec is not None}
+            self._matrix = None
+            self._lsh = None
+        print(f"📚 Loaded local knowledge index ({len(self.records)} texts)")
+        return True
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Return the process-wide index, loading or building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LocalKnowledgeIndex.load_or_build()
+    return _index
+
+def _dense_search(index, query):
+    from parameters.modules.dense_retriever import get_dense_retriever
+    retriever = get_dense_retriever()
+    retriever.sync(index.live_records(), index.generation)
+    return retriever.search(query, top_k=1)
+
+def _hybrid_search(index, query):
+    """Blend TF-IDF and dense cosine over the union of both candidate lists."""
+    from parameters.modules.dense_retriever import get_dense_retriever
+    retriever = get_dense_retriever()
+    retriever.sync(index.live_records(), index.generation)
+
+    tfidf_scores = index.scores(query)
+    query_vector = retriever.encode([query])[0]
+    candidates = {index.records[i] for i in np.argsort(-tfidf_scores)[:HYBRID_CANDIDATES]
+                  if index.records[i] is not None}
+    candidates.update(rec for _, rec in retriever.search_vector(query_vector, HYBRID_CANDIDATES))
+
+    scored = []
+    for rec in candidates:
+        row = index.record_rows.get(rec)
+        sparse_score = float(tfidf_scores[row]) if row is not None and row < len(tfidf_scores) else 0.0
+        dense_score = retriever.similarity(query_vector, rec)
+        scored.append((HYBRID_ALPHA * sparse_score + (1 - HYBRID_ALPHA) * dense_score, rec))
+    scored.sort(key=lambda item: -item[0])
+    return scored[:1]
+
+def search_local_knowledge(query, threshold=None, mode=None):
+    mode = mode or RAG_MODE
+    if mode not in ("dense", "hybrid"):
+        mode = "tfidf"
+    if RAG_LSH:
+        # A near-duplicate (Jaccard >= LSH_THRESHOLD, same negations and question
+        # words) rewords a stored question: its answer is reused without a full scan
+        try:
+            near = get_index().near_duplicate(query)
+            if near:
+                jaccard, record = near
+                print(f"Reusing near-duplicate local answer (jaccard {jaccard:.3f})")
+                return record[3] or record[1]
+        except Exception as e:
+            print(f"Near-duplicate lookup failed: {e}")
+
+    try:
+        index = get_index()
+        if mode == "dense":
+            matches = _dense_search(index, query)
+        elif mode == "hybrid":
+            matches = _hybrid_search(index, query)
+        else:
+            mode = "tfidf"
+            matches = index.search(query, top_k=1)
+    except ImportError as e:
+        print(f"⚠️ Dense retrieval unavailable ({e}), falling back to TF-IDF")
+        mode = "tfidf"
+        matches = get_index().search(query, top_k=1)
     except Exception as e:
         print(f"RAG vectorization failed: {e}")
+        return None
+
+    if threshold is None:
+        threshold = THRESHOLDS.get(mode, THRESHOLDS["tfidf"])
+
+    if not matches:
+        print("No usable local knowledge found.")
+        return None
+
+    best_score, (filepath, matched_text, key, answer) = matches[0]
+    print(f"Best local match score ({mode}): {best_score:.3f}")
+
+    if best_score >= threshold:
+        print(f"Reusing cached/local answer (score {best_score:.3f})")
+
+        # Cached Claude questions and training prompts carry the answer to return
+        if answer:
+            return answer
+
+        return matched_text
 
-    return None
\ No newline at end of file
+    return None
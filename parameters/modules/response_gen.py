@@ -4,124 +4,48 @@ from dotenv import load_dotenv
 # Load AWS credentials from /instructions/.env
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../../instructions/.env'))
 
-import boto3
-import faiss
-from sentence_transformers import SentenceTransformer
-import numpy as np
 import json
-# <<<<<<< HEAD
-
-# S3_BUCKET = 'transcriptfull'
-# EMBEDDING_MODEL = 'all-MiniLM-L6-v2'
-# THRESHOLD = 0.7
-
-# def get_all_json_texts(bucket):
-#     s3 = boto3.client('s3')
-#     paginator = s3.get_paginator('list_objects_v2')
-#     pages = paginator.paginate(Bucket=bucket)
-#     docs = []
-#     for page in pages:
-#         for obj in page.get('Contents', []):
-#             key = obj['Key']
-#             if key.endswith('.json'):
-#                 response = s3.get_object(Bucket=bucket, Key=key)
-#                 content = response['Body'].read()
-#                 try:
-#                     data = json.loads(content)
-#                     if isinstance(data, dict) and 'text' in data:
-#                         docs.append(data['text'])
-#                     elif isinstance(data, list):
-#                         for item in data:
-#                             if isinstance(item, dict) and 'text' in item:
-#                                 docs.append(item['text'])
-#                 except Exception as e:
-#                     print(f"Error reading {key}: {e}")
-#     return docs
-
-# def build_faiss_index(embeddings):
-#     dim = embeddings.shape[1]
-#     index = faiss.IndexFlatL2(dim)
-#     index.add(embeddings)
-#     return index
-
-# def is_finance_question(question):
-#     finance_keywords = [
-#         'finance', 'investment', 'stock', 'bank', 'loan', 'equity', 'debt', 'market',
-#         'interest', 'rate', 'capital', 'fund', 'portfolio', 'asset', 'liability'
-#     ]
-#     q = question.lower()
-#     return any(word in q for word in finance_keywords)
-
-# def call_claude(question):
-#     # Replace this with actual Claude API call
-#     return f"[Claude] Sorry, I couldn't find an answer in the database. Here's a finance-related response for: '{question}'"
-
-# class Retriever:
-#     def __init__(self):
-#         print("Loading documents from S3...")
-#         self.model = SentenceTransformer(EMBEDDING_MODEL)
-#         self.docs = get_all_json_texts(S3_BUCKET)
-#         if not self.docs:
-#             raise Exception("No documents found in the S3 bucket.")
-#         print(f"Loaded {len(self.docs)} documents.")
-#         print("Embedding documents...")
-#         self.embeddings = self.model.encode(self.docs, convert_to_numpy=True)
-#         print("Building FAISS index...")
-#         self.index = build_faiss_index(self.embeddings)
-#         print("Retriever ready.")
-
-# retriever = None
-
-# def get_retriever():
-#     global retriever
-#     if retriever is None:
-#         retriever = Retriever()
-#     return retriever
-
-# def generate_response_bedrock(question, detected_lang=None):
-#     r = get_retriever()
-#     q_emb = r.model.encode([question], convert_to_numpy=True)
-#     D, I = r.index.search(q_emb, k=1)
-#     if D[0][0] < THRESHOLD:
-#         return r.docs[I[0][0]]
-#     elif is_finance_question(question):
-#         return call_claude(question)
-#     else:
-#         return "Sorry, I can only answer finance-related questions."
-# =======
+import asyncio
 import traceback
 import time
-import datetime
-import uuid
 import os
-from typing import List, Dict, Optional
+import threading
+from typing import List, Dict, Iterator, Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 
 from botocore.exceptions import ClientError
-from parameters.modules.rag_fallback import search_local_knowledge
+from parameters.modules.rag_fallback import RAG_LSH, search_local_knowledge, get_index
 from parameters.modules.context_manager import ConversationContext
-
-AUTO_CACHE_FOLDER = os.path.join(os.path.dirname(__file__), "auto_cached_jsons")
-os.makedirs(AUTO_CACHE_FOLDER, exist_ok=True)
+from parameters.modules.context_builder import BASELINE_TURNS, build_context
+from parameters.modules.answer_store import get_answer_store
+from parameters.modules.aws_clients import get_client
+from parameters.modules.metrics import inc, span
 
 chat_context = ConversationContext()
+_answer_store = None
+_bind_lock = threading.Lock()
+
+def bound_answer_store():
+    """The answer store, opened and fed into the local knowledge index on first use (which loads the index)."""
+    global _answer_store
+    if _answer_store is None:
+        with _bind_lock:
+            if _answer_store is None:
+                store = get_answer_store()
+                store.bind_index(get_index())
+                if RAG_LSH:
+                    get_index().near_duplicate("")  # builds the near-duplicate tier
+                _answer_store = store
+    return _answer_store
 
 def save_claude_response_to_cache(question: str, answer: str) -> None:
-    """Save successful responses to local cache for future reference."""
+    """Save successful responses to the answer store for future reference."""
     try:
-        payload = {
-            "source": "auto_cache",
-            "original_question": question,
-            "answer": answer,
-            "timestamp": datetime.datetime.now().isoformat()
-        }
-        filename = f"{uuid.uuid4()}.json"
-        filepath = os.path.join(AUTO_CACHE_FOLDER, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=2, ensure_ascii=False)
-        print(f"💾 Saved Claude answer to cache: {filepath}")
+        store = bound_answer_store()
+        store.put(question, answer)
+        print(f"💾 Saved Claude answer to cache ({len(store)} stored)")
     except Exception as e:
         print(f"⚠️ Failed to save response to cache: {e}")
 
@@ -139,37 +63,59 @@ def clean_messages(messages: List[Dict]) -> List[Dict]:
     """Remove invalid or empty messages from the conversation history."""
     return [msg for msg in messages if validate_message_content(msg)]
 
-def generate_response_bedrock(
-    prompt: str, 
-    session_id: str = "default", 
-    detected_lang: str = ""
-) -> str:
-    """Generate response using Amazon Bedrock with enhanced error handling."""
-    region = "us-west-2"
-    model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+REGION = "us-west-2"
+MAX_ATTEMPTS = 3
+MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+FALLBACK_MSG = (
+    "I'm experiencing high demand right now. "
+    "Please try again in a moment or rephrase your question."
+)
+# Start the Bedrock call alongside the local lookup instead of after it (see speculative.py)
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0") == "1"
+
+def create_bedrock_client():
+    """Shared, pooled Bedrock client (see aws_clients for timeouts and retry settings)."""
+    return get_client("bedrock-runtime", REGION)
+
+def find_local_answer(prompt: str) -> Optional[str]:
+    """Exact-repeat or confident local knowledge answer, if any; the session is not touched."""
+    with span("local_search"):
+        return bound_answer_store().get(prompt) or search_local_knowledge(prompt)
 
-    # 1. First try local knowledge base
-    local_answer = search_local_knowledge(prompt)
+def record_local_answer(session_id: str, answer: str) -> None:
+    """Add a local answer as the assistant turn (the user turn must already be there)."""
+    print("✅ Local answer used (matched with high confidence)")
+    inc("voicebot_answers_total", source="local")
+    chat_context.add_turn(session_id, "assistant", answer)
+    with span("session_io"):
+        chat_context.save_session(session_id)
+
+def use_local_answer(prompt: str, session_id: str) -> Optional[str]:
+    """Return (and record) an exact-repeat or local knowledge answer, if any."""
+    local_answer = find_local_answer(prompt)
     if local_answer:
-        print("✅ Local answer used (matched with high confidence)")
         chat_context.add_turn(session_id, "user", prompt)
-        chat_context.add_turn(session_id, "assistant", local_answer)
-        chat_context.save_session(session_id)
-        return local_answer
+        record_local_answer(session_id, local_answer)
+    return local_answer
+
+def build_payload(prompt: str, session_id: str):
+    """Add the user turn and build the Bedrock payload; returns an error string if history is unusable."""
+    with span("context"):
+        chat_context.load_session(session_id)
+        chat_context.add_turn(session_id, "user", prompt)
+
+        # Recent turns within the token budget; older ones arrive as a running summary
+        messages, system, stats = build_context(chat_context, session_id)
+    messages = clean_messages(messages)
 
-    # 2. Load and validate conversation context
-    chat_context.load_session(session_id)
-    chat_context.add_turn(session_id, "user", prompt)
-    
-    raw_messages = chat_context.get_messages(session_id)
-    messages = clean_messages(raw_messages)
-    
     if not messages:
         error_msg = "⚠️ No valid messages in conversation history."
         print(error_msg)
         return error_msg
 
-    # 3. Prepare payload with validation
+    print(f"🧮 Context: {stats['tokens_sent']} tokens in {stats['turns_sent']} turns "
+          f"(saved {stats['tokens_saved']} vs last {BASELINE_TURNS} turns verbatim)")
+
     payload = {
         "anthropic_version": "bedrock-2023-05-31",
         "messages": messages,
@@ -178,68 +124,236 @@ def generate_response_bedrock(
         "top_k": 250,
         "top_p": 1.0
     }
+    if system:
+        payload["system"] = system
+    return payload
+
+def record_answer(session_id: str, prompt: str, answer: str) -> None:
+    inc("voicebot_answers_total", source="llm")
+    chat_context.add_turn(session_id, "assistant", answer)
+    with span("session_io"):
+        chat_context.save_session(session_id)
+        save_claude_response_to_cache(prompt, answer)
+
+def invoke_claude(client, payload: Dict) -> Dict:
+    """One blocking invoke_model call; returns the parsed response body."""
+    with span("bedrock"):
+        response = client.invoke_model(
+            modelId=MODEL_ID,
+            body=json.dumps(payload).encode("utf-8"),
+            contentType="application/json",
+            accept="application/json"
+        )
+        return json.loads(response["body"].read())
+
+def extract_answer(result: Dict):
+    """(answer, None) for a usable invoke_model result, else (None, message for the user)."""
+    if not result or "content" not in result or not result["content"]:
+        return None, "⚠️ Claude returned an empty response."
+
+    answer = result["content"][0].get("text", "").strip()
+    if not answer:
+        return None, "⚠️ Claude returned empty text content."
+    return answer, None
+
+def throttle_wait(attempt: int) -> int:
+    inc("voicebot_bedrock_throttles_total")
+    return 2 * (attempt + 1)
+
+def is_throttle(e: Exception) -> bool:
+    """Bedrock's ThrottlingException (client.exceptions.ThrottlingException is a ClientError with this code)."""
+    return isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') == 'ThrottlingException'
+
+def _backoff(attempt: int) -> Optional[int]:
+    """Seconds to wait after throttled attempt `attempt`; None after the last one (no point waiting)."""
+    wait_time = throttle_wait(attempt)
+    if attempt == MAX_ATTEMPTS - 1:
+        return None
+    print(f"⏳ Throttled, retrying in {wait_time} seconds...")
+    return wait_time
+
+def call_with_retries(call, sleep=time.sleep):
+    """Return `call()`, retried up to MAX_ATTEMPTS times while Bedrock throttles.
+
+    `sleep(seconds)` waits between attempts; a truthy return value (e.g. from
+    threading.Event.wait) cancels the retries. None when cancelled or out of
+    attempts; any other error is raised.
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return call()
+        except Exception as e:
+            if not is_throttle(e):
+                raise
+        wait_time = _backoff(attempt)
+        if wait_time is None:
+            break
+        with span("bedrock_backoff"):
+            if sleep(wait_time):
+                return None
+    return None
+
+async def call_with_retries_async(call, sleep=asyncio.sleep):
+    """call_with_retries for the event loop: awaits `call()` and backs off with an awaitable `sleep`."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await call()
+        except Exception as e:
+            if not is_throttle(e):
+                raise
+        wait_time = _backoff(attempt)
+        if wait_time is None:
+            break
+        with span("bedrock_backoff"):
+            if await sleep(wait_time):
+                return None
+    return None
+
+def open_stream(client, payload: Dict) -> Dict:
+    """One invoke_model_with_response_stream call; the body yields events as Bedrock produces them."""
+    with span("bedrock_open_stream"):
+        return client.invoke_model_with_response_stream(
+            modelId=MODEL_ID,
+            body=json.dumps(payload).encode("utf-8"),
+            contentType="application/json",
+            accept="application/json"
+        )
+
+def client_error_message(e: ClientError, payload: Dict) -> str:
+    inc("voicebot_answers_total", source="error")
+    error_code = e.response.get('Error', {}).get('Code', 'Unknown')
+    if error_code == 'ValidationException':
+        print("⚠️ Validation error with payload:", json.dumps(payload, indent=2))
+        return "⚠️ I had trouble processing that request. Please try rephrasing."
+    traceback.print_exc()
+    return f"❌ AWS Error: {str(e)}"
+
+def generate_response_bedrock(
+    prompt: str, 
+    session_id: str = "default", 
+    detected_lang: str = ""
+) -> str:
+    """Generate response using Amazon Bedrock with enhanced error handling."""
+    if SPECULATIVE_LLM:
+        from parameters.modules.speculative import speculative_response_bedrock
+        return speculative_response_bedrock(prompt, session_id)
+
+    # 1. First try an exact repeat, then the local knowledge base
+    local_answer = use_local_answer(prompt, session_id)
+    if local_answer:
+        return local_answer
+
+    # 2-3. Load and validate conversation context, prepare payload
+    payload = build_payload(prompt, session_id)
+    if isinstance(payload, str):
+        return payload
 
     # 4. Initialize client with error handling
     try:
-        client = boto3.client(
-            "bedrock-runtime", 
-            region_name=region,
-            config=boto3.session.Config(
-                connect_timeout=10,
-                read_timeout=30,
-                retries={'max_attempts': 3}
-            )
-        )
+        client = create_bedrock_client()
     except Exception as e:
         error_msg = f"❌ Failed to initialize Bedrock client: {e}"
         traceback.print_exc()
         return error_msg
 
     # 5. Attempt API call with retries
-    for attempt in range(3):
-        try:
-            response = client.invoke_model(
-                modelId=model_id,
-                body=json.dumps(payload).encode("utf-8"),
-                contentType="application/json",
-                accept="application/json"
-            )
-
-            result = json.loads(response["body"].read())
-
-            if not result or "content" not in result or not result["content"]:
-                return "⚠️ Claude returned an empty response."
-
-            answer = result["content"][0].get("text", "").strip()
-            if not answer:
-                return "⚠️ Claude returned empty text content."
-
-            # Save successful response
-            chat_context.add_turn(session_id, "assistant", answer)
-            chat_context.save_session(session_id)
-            save_claude_response_to_cache(prompt, answer)
-            
-            return answer
-
-        except client.exceptions.ThrottlingException:
-            wait_time = 2 * (attempt + 1)
-            print(f"⏳ Throttled, retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
-        except ClientError as e:
-            error_code = e.response.get('Error', {}).get('Code', 'Unknown')
-            if error_code == 'ValidationException':
-                print("⚠️ Validation error with payload:", json.dumps(payload, indent=2))
-                return "⚠️ I had trouble processing that request. Please try rephrasing."
-            traceback.print_exc()
-            return f"❌ AWS Error: {str(e)}"
-        except Exception as e:
-            traceback.print_exc()
-            return f"❌ Unexpected error: {str(e)}"
-
-    # 6. Final fallback if all retries fail
-    fallback_msg = (
-        "I'm experiencing high demand right now. "
-        "Please try again in a moment or rephrase your question."
-    )
-    return fallback_msg
-# >>>>>>> 722eea07fb020b3a6ab6b0783b1676745b14b7b5
+    try:
+        result = call_with_retries(lambda: invoke_claude(client, payload))
+        if result is None:
+            # 6. Final fallback if all retries fail
+            inc("voicebot_answers_total", source="fallback")
+            return FALLBACK_MSG
+
+        answer, error_msg = extract_answer(result)
+        if error_msg:
+            return error_msg
+
+        # Save successful response
+        record_answer(session_id, prompt, answer)
+        return answer
+
+    except ClientError as e:
+        return client_error_message(e, payload)
+    except Exception as e:
+        traceback.print_exc()
+        return f"❌ Unexpected error: {str(e)}"
+
+def iter_stream_text(event_stream) -> Iterator[str]:
+    """Yield text deltas from a Bedrock response-stream body (or any iterable of its events)."""
+    for event in event_stream:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        data = json.loads(chunk["bytes"])
+        if data.get("type") == "content_block_delta":
+            text = data.get("delta", {}).get("text", "")
+            if text:
+                yield text
+
+def stream_response_bedrock(
+    prompt: str,
+    session_id: str = "default",
+    detected_lang: str = "",
+    client=None
+) -> Iterator[str]:
+    """Like generate_response_bedrock, but yields the answer as text deltas as Bedrock produces them.
+
+    Local answers are yielded in one piece. The complete answer is recorded in
+    the conversation context and the answer cache once the stream finishes;
+    `client` may be any object with an `invoke_model_with_response_stream` method.
+    """
+    if SPECULATIVE_LLM:
+        from parameters.modules.speculative import speculative_stream_bedrock
+        yield from speculative_stream_bedrock(prompt, session_id, client)
+        return
+
+    local_answer = use_local_answer(prompt, session_id)
+    if local_answer:
+        yield local_answer
+        return
+
+    payload = build_payload(prompt, session_id)
+    if isinstance(payload, str):
+        yield payload
+        return
+
+    try:
+        client = client or create_bedrock_client()
+    except Exception as e:
+        traceback.print_exc()
+        yield f"❌ Failed to initialize Bedrock client: {e}"
+        return
+
+    # Retry only while opening the stream; once text has been sent it cannot be taken back
+    try:
+        response = call_with_retries(lambda: open_stream(client, payload))
+    except ClientError as e:
+        yield client_error_message(e, payload)
+        return
+    except Exception as e:
+        traceback.print_exc()
+        yield f"❌ Unexpected error: {str(e)}"
+        return
+    if response is None:
+        yield FALLBACK_MSG
+        return
+
+    yield from relay_stream(response, session_id, prompt)
+
+def relay_stream(response, session_id: str, prompt: str) -> Iterator[str]:
+    """Yield the text of an opened response stream, then record the complete answer."""
+    parts = []
+    try:
+        for text in iter_stream_text(response["body"]):
+            parts.append(text)
+            yield text
+    except Exception as e:
+        traceback.print_exc()
+        yield f" ❌ Stream interrupted: {str(e)}"
+        return
+
+    answer = "".join(parts).strip()
+    if not answer:
+        yield "⚠️ Claude returned empty text content."
+        return
+    record_answer(session_id, prompt, answer)
@@ -0,0 +1,308 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+
+# Conversation history as one append-only JSONL log per session: saving a turn
+# is a single small append instead of rewriting the whole history, and only the
+# last few turns of recently active sessions are held in memory (plus older ones
+# the session's running summary does not cover yet, so none are lost unsummarized).
+SESSION_FOLDER = os.getenv("SESSION_FOLDER", os.path.join(os.path.dirname(__file__), "..", "session_store"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))       # hot sessions kept in memory
+SESSION_HYDRATE_TURNS = int(os.getenv("SESSION_HYDRATE_TURNS", "20"))   # turns read back per session
+SESSION_KEEP_TURNS = int(os.getenv("SESSION_KEEP_TURNS", "200"))        # turns kept on disk by compaction
+SESSION_COMPACT_BYTES = int(os.getenv("SESSION_COMPACT_BYTES", str(256 * 1024)))  # log size that triggers it
+# Session ids become file names, so only plain names are accepted (no separators or dots)
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and SESSION_ID_PATTERN.fullmatch(session_id) is not None
+
+
+class Turn:
+    __slots__ = ("role", "text", "ts")
+
+    def __init__(self, role, text, ts=None):
+        self.role = role
+        self.text = text
+        self.ts = ts or round(time.time(), 6)  # as written to the log, so both compare equal
+
+    def to_message(self):
+        """Bedrock/Anthropic messages format."""
+        return {"role": self.role, "content": [{"type": "text", "text": self.text}]}
+
+    def to_line(self):
+        return json.dumps({"role": self.role, "text": self.text, "ts": round(self.ts, 6)}, ensure_ascii=False) + "\n"
+
+    @classmethod
+    def from_line(cls, line):
+        data = json.loads(line)
+        return cls(data["role"], data["text"], data.get("ts"))
+
+    @classmethod
+    def from_message(cls, message):
+        content = message.get("content", "")
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        return cls(message["role"], content)
+
+
+class _Session:
+    __slots__ = ("turns", "evicted", "pending", "size", "summary")
+
+    def __init__(self, turns, size, maxlen):
+        self.turns = deque(turns, maxlen=maxlen)  # persisted, most recent last
+        self.evicted = []                          # older persisted turns not in the summary yet
+        self.pending = []                          # added but not saved yet
+        self.size = size                           # bytes in the log file
+        self.summary = None                        # running summary, loaded on first use
+
+
+def _tail_lines(path, n, block=8192):
+    """Last `n` complete lines of `path`, reading backwards from the end."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.splitlines()
+    # Without reaching the start of the file the first line may be cut off
+    return lines[-n:] if pos == 0 else lines[1:][-n:]
+
+
+def _parse(lines):
+    turns = []
+    for line in lines:
+        try:
+            turns.append(Turn.from_line(line))
+        except (ValueError, KeyError):
+            continue  # torn final write after a crash
+    return turns
+
+
+def _write_atomic(path, text):
+    """Replace `path` with `text` through a temp file unique to this writer."""
+    tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class SessionStore:
+    """Bounded LRU of sessions over per-session JSONL turn logs.
+
+    `add()` buffers a turn, `save()` appends all buffered turns in one write and
+    `discard()` drops them. A session is hydrated lazily with its last
+    `hydrate_turns` turns, plus any older ones that its running summary (the
+    dict passed to `set_summary`, whose "upto" is the timestamp of the newest
+    turn it covers) has not folded in yet. Its log is compacted down to
+    `keep_turns` once it grows past `compact_bytes`. A cached session whose log
+    another process has written to since is read again on next use.
+    """
+
+    def __init__(self, folder=SESSION_FOLDER, cache_size=SESSION_CACHE_SIZE, hydrate_turns=SESSION_HYDRATE_TURNS,
+                 keep_turns=SESSION_KEEP_TURNS, compact_bytes=SESSION_COMPACT_BYTES):
+        self.folder = folder
+        self.cache_size = cache_size
+        self.hydrate_turns = hydrate_turns
+        self.keep_turns = keep_turns
+        self.compact_bytes = compact_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _file(self, session_id, suffix):
+        """Path of one of the session's files; refuses ids that could point outside `folder`."""
+        if not valid_session_id(session_id):
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        return os.path.join(self.folder, session_id + suffix)
+
+    def _path(self, session_id):
+        return self._file(session_id, ".jsonl")
+
+    def _session(self, session_id):
+        path = self._path(session_id)
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            if size == session.size:
+                return session
+            # Another worker appended to (or compacted) the log: read it again, keeping unsaved turns
+            pending = session.pending
+            session = self._hydrate(session_id, path)
+            session.pending = pending
+            return session
+
+        self.migrate_legacy(session_id)
+        session = self._hydrate(session_id, path)
+        while len(self._sessions) > self.cache_size:
+            # Nothing is lost: saved turns are on disk, unsaved ones would be discarded on reload anyway
+            self._sessions.popitem(last=False)
+        return session
+
+    def _hydrate(self, session_id, path):
+        if os.path.exists(path):
+            session = _Session(_parse(_tail_lines(path, self.hydrate_turns)), os.path.getsize(path), self.hydrate_turns)
+        else:
+            session = _Session([], 0, self.hydrate_turns)
+        self._sessions[session_id] = session
+        if len(session.turns) == self.hydrate_turns:
+            upto = self._summarized_upto(session_id)
+            if session.turns[0].ts > upto:
+                older = _parse(_tail_lines(path, self.keep_turns))[:-self.hydrate_turns]
+                session.evicted = [t for t in older if t.ts > upto]
+        return session
+
+    def add(self, session_id, role, text):
+        with self._lock:
+            self._session(session_id).pending.append(Turn(role, text))
+
+    def save(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or not session.pending:
+                return
+            data = "".join(turn.to_line() for turn in session.pending).encode("utf-8")
+            with open(self._path(session_id), "ab") as f:
+                start = f.tell()
+                f.write(data)
+            # If another worker appended since this one last looked, the next use reads the log again
+            session.size = start + len(data) if start == session.size else -1
+            overflow = len(session.turns) + len(session.pending) - self.hydrate_turns
+            if overflow > 0:
+                # Leaving memory before the summary has them: keep them until it does
+                upto = self._summarized_upto(session_id)
+                dropped = (list(session.turns) + session.pending)[:overflow]
+                session.evicted.extend(t for t in dropped if t.ts > upto)
+            session.turns.extend(session.pending)
+            session.pending = []
+            if session.size > self.compact_bytes:
+                self.compact(session_id)
+
+    def discard(self, session_id):
+        """Drop unsaved turns and make sure the session is hydrated."""
+        with self._lock:
+            self._session(session_id).pending = []
+
+    def turns(self, session_id):
+        """Hydrated turns, oldest first, including unsaved ones and any the summary does not cover yet."""
+        with self._lock:
+            session = self._session(session_id)
+            return session.evicted + list(session.turns) + session.pending
+
+    def messages(self, session_id, max_turns=10):
+        return [turn.to_message() for turn in self.turns(session_id)[-max_turns:]]
+
+    def _summary_path(self, session_id):
+        return self._file(session_id, ".summary.json")
+
+    def summary(self, session_id):
+        """The session's stored running summary (a dict), or None."""
+        with self._lock:
+            session = self._session(session_id)
+            if session.summary is None:
+                path = self._summary_path(session_id)
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        session.summary = json.load(f)
+                except (OSError, ValueError):
+                    session.summary = {}
+            return session.summary or None
+
+    def _summarized_upto(self, session_id):
+        return (self.summary(session_id) or {}).get("upto", 0)
+
+    def set_summary(self, session_id, summary):
+        with self._lock:
+            _write_atomic(self._summary_path(session_id), json.dumps(summary, ensure_ascii=False))
+            session = self._session(session_id)
+            session.summary = summary
+            upto = summary.get("upto", 0)
+            session.evicted = [t for t in session.evicted if t.ts > upto]
+
+    def reset(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            for path in (self._path(session_id), self._summary_path(session_id),
+                         self._file(session_id, ".json")):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def compact(self, session_id):
+        """Rewrite the log with only its last `keep_turns` turns."""
+        with self._lock:
+            path = self._path(session_id)
+            if not os.path.exists(path):
+                return
+            turns = _parse(_tail_lines(path, self.keep_turns))
+            _write_atomic(path, "".join(turn.to_line() for turn in turns))
+            if session_id in self._sessions:
+                self._sessions[session_id].size = os.path.getsize(path)
+            print(f"🗜️ Compacted session '{session_id}' to {len(turns)} turns")
+
+    # --- migration ---
+
+    def migrate_legacy(self, session_id):
+        """Convert session_store/<id>.json (whole-history JSON) to a JSONL log; the old file is renamed."""
+        legacy = self._file(session_id, ".json")
+        if not os.path.exists(legacy) or os.path.exists(self._path(session_id)):
+            return False
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                turns = [Turn.from_message(m) for m in json.load(f)][-self.keep_turns:]
+            # Distinct, ordered timestamps so later code can tell the turns apart by time
+            now = time.time()
+            for i, turn in enumerate(turns):
+                turn.ts = now - (len(turns) - i) * 0.001
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"⚠️ Could not migrate session '{session_id}': {e}")
+            return False
+        _write_atomic(self._path(session_id), "".join(turn.to_line() for turn in turns))
+        try:
+            os.replace(legacy, legacy + ".migrated")
+        except OSError:
+            pass
+        return True
+
+    def migrate_all(self):
+        """Migrate every legacy session file now rather than on first use."""
+        with self._lock:
+            ids = [name[:-5] for name in os.listdir(self.folder)
+                   if name.endswith(".json") and not name.endswith(".summary.json") and valid_session_id(name[:-5])]
+            migrated = sum(self.migrate_legacy(session_id) for session_id in ids)
+        if migrated:
+            print(f"📦 Migrated {migrated} sessions to JSONL logs")
+        return migrated
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_session_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SessionStore()
+    return _store
+
+
+if __name__ == "__main__":
+    get_session_store().migrate_all()
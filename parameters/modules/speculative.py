@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import queue
+import threading
+import traceback
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
+
+from botocore.exceptions import ClientError
+
+from parameters.modules.aws_clients import MAX_POOL_CONNECTIONS
+from parameters.modules.metrics import inc, span
+from parameters.modules.response_gen import (
+    FALLBACK_MSG, bound_answer_store, build_payload, call_with_retries, chat_context, client_error_message,
+    create_bedrock_client, extract_answer, find_local_answer, invoke_claude, iter_stream_text, open_stream,
+    record_answer, record_local_answer, relay_stream
+)
+
+# Speculative answering (SPECULATIVE_LLM=1): after the exact-repeat check (a key
+# lookup, never worth an LLM call) the session is loaded and the Bedrock
+# request sent, and the local knowledge lookup runs while it is in flight,
+# so a miss costs max(lookup, LLM) instead of lookup + LLM. A confident local
+# hit still wins; the LLM call is then abandoned - an open response stream is
+# closed after the next event, a plain invoke_model call is left to finish and
+# its answer dropped.
+#
+# Abandoned calls are wasted spend. They are paid for out of a token bucket
+# refilled at SPECULATION_BUDGET_TOKENS (estimated input + output tokens) per
+# minute; while it is empty, requests run in the usual order (lookup first).
+SPECULATION_BUDGET_TOKENS = float(os.getenv("SPECULATION_BUDGET_TOKENS", "20000"))
+SPECULATION_WORKERS = int(os.getenv("SPECULATION_WORKERS", str(MAX_POOL_CONNECTIONS)))
+
+_executor = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="speculative-llm")
+
+
+class SpeculationBudget:
+    """Token bucket for LLM tokens spent on answers a local hit made unnecessary."""
+
+    def __init__(self, tokens_per_minute=SPECULATION_BUDGET_TOKENS):
+        self.capacity = tokens_per_minute
+        self.available = tokens_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def reserve(self, tokens):
+        """Set aside `tokens` for one speculative call; False if the budget cannot cover it."""
+        with self._lock:
+            self._refill()
+            if self.available < tokens:
+                return False
+            self.available -= tokens
+            return True
+
+    def settle(self, reserved, spent):
+        """Give back what a reservation did not waste (all of it when the LLM answer was used)."""
+        with self._lock:
+            self._refill()
+            self.available = min(self.capacity, self.available + reserved - spent)
+
+
+budget = SpeculationBudget()
+
+
+def input_tokens(payload):
+    return len(json.dumps(payload)) // 4
+
+
+def estimate_tokens(payload):
+    """Upper bound on what one call can cost: the prompt plus max_tokens of output."""
+    return input_tokens(payload) + payload.get("max_tokens", 0)
+
+
+def _submit(fn, *args):
+    # The copied context keeps the call's spans in the request's Server-Timing header
+    return _executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _speculate(payload, fn, *args):
+    """Start `fn(*args)` on the speculation pool if the budget allows; (future, reserved tokens) or (None, 0)."""
+    reserved = estimate_tokens(payload)
+    if not budget.reserve(reserved):
+        print("💸 Speculation budget spent, looking up locally first")
+        inc("voicebot_speculation_total", outcome="over_budget")
+        return None, 0
+    return _submit(fn, *args), reserved
+
+
+def _invoke(client, payload, cancelled):
+    """invoke_claude with the shared throttle retries; None once cancelled or out of attempts."""
+    if cancelled.is_set():
+        return None
+    return call_with_retries(lambda: invoke_claude(client, payload), cancelled.wait)
+
+
+def _open(client, payload, cancelled):
+    """open_stream with the shared throttle retries; None once cancelled or out of attempts."""
+    if cancelled.is_set():
+        return None
+    return call_with_retries(lambda: open_stream(client, payload), cancelled.wait)
+
+
+_END = object()
+
+
+class _ReadAhead:
+    """Response-stream body read on the speculation thread, so text is ready by the time the lookup misses."""
+
+    def __init__(self):
+        self._events = queue.Queue()
+
+    def fill(self, body, cancelled):
+        """Queue the events of `body` until it ends or the call is cancelled; returns output tokens received."""
+        chars = 0
+        try:
+            for event in body:
+                self._events.put(event)
+                chars += sum(len(text) for text in iter_stream_text([event]))
+                if cancelled.is_set():
+                    break
+        except Exception as e:
+            self._events.put(e)
+        finally:
+            # Closed here, not by the abandoning thread: a body cannot be closed mid-read
+            close = getattr(body, "close", None)
+            if close:
+                close()
+            self._events.put(_END)
+        return chars // 4
+
+    def __iter__(self):
+        while True:
+            event = self._events.get()
+            if event is _END:
+                return
+            if isinstance(event, Exception):
+                raise event
+            yield event
+
+
+def _read_ahead(client, payload, cancelled, opened):
+    """Open a response stream into the `opened` future, then read it ahead; output tokens received or None."""
+    try:
+        response = _open(client, payload, cancelled)
+    except BaseException as e:
+        opened.set_exception(e)
+        raise
+    if response is None:
+        opened.set_result(None)
+        return None
+    body = _ReadAhead()
+    opened.set_result({**response, "body": body})
+    return body.fill(response["body"], cancelled)
+
+
+def _abandon(future, cancelled, reserved, payload, stream=False):
+    """Drop a speculative call after a local hit and charge what it cost to the budget."""
+    cancelled.set()
+    inc("voicebot_speculation_total", outcome="wasted")
+    if future.cancel():  # never started: nothing was sent
+        budget.settle(reserved, 0)
+        return
+
+    def settle(done):
+        result = None if done.cancelled() or done.exception() else done.result()
+        if result is None:
+            spent = 0  # gave up (throttled) before anything was billed
+        elif stream:
+            # The prompt plus the output that arrived before the stream was closed
+            spent = input_tokens(payload) + result
+        else:
+            usage = result.get("usage") or {}
+            spent = usage.get("input_tokens", 0) + usage.get("output_tokens", 0) or reserved
+        budget.settle(reserved, spent)
+
+    future.add_done_callback(settle)
+
+
+def _exact_repeat(prompt, session_id):
+    """An answer-store hit for `prompt`, recorded in the session like any local answer."""
+    with span("local_search"):
+        answer = bound_answer_store().get(prompt)
+    if answer:
+        chat_context.add_turn(session_id, "user", prompt)
+        record_local_answer(session_id, answer)
+    return answer
+
+
+def _local_first(prompt, session_id):
+    """The local lookup after the user turn is in the session; records and returns a hit."""
+    local_answer = find_local_answer(prompt)
+    if local_answer:
+        record_local_answer(session_id, local_answer)
+    return local_answer
+
+
+def speculative_response_bedrock(prompt: str, session_id: str = "default") -> str:
+    """generate_response_bedrock with the Bedrock call running while the local lookup does."""
+    answer = _exact_repeat(prompt, session_id)
+    if answer:
+        return answer
+
+    # The user turn is added here, so a local hit only adds the assistant turn
+    payload = build_payload(prompt, session_id)
+    if isinstance(payload, str):
+        return _local_first(prompt, session_id) or payload
+
+    try:
+        client = create_bedrock_client()
+    except Exception as e:
+        traceback.print_exc()
+        return f"❌ Failed to initialize Bedrock client: {e}"
+
+    cancelled = threading.Event()
+    future, reserved = _speculate(payload, _invoke, client, payload, cancelled)
+
+    local_answer = _local_first(prompt, session_id)
+    if local_answer:
+        if future:
+            _abandon(future, cancelled, reserved, payload)
+        return local_answer
+
+    try:
+        if future:
+            inc("voicebot_speculation_total", outcome="used")
+            budget.settle(reserved, 0)
+            result = future.result()
+        else:
+            result = _invoke(client, payload, cancelled)
+    except ClientError as e:
+        return client_error_message(e, payload)
+    except Exception as e:
+        traceback.print_exc()
+        return f"❌ Unexpected error: {str(e)}"
+
+    if result is None:
+        inc("voicebot_answers_total", source="fallback")
+        return FALLBACK_MSG
+    answer, error_msg = extract_answer(result)
+    if error_msg:
+        return error_msg
+    record_answer(session_id, prompt, answer)
+    return answer
+
+
+def speculative_stream_bedrock(prompt: str, session_id: str = "default", client=None) -> Iterator[str]:
+    """stream_response_bedrock with the response stream opened while the local lookup runs."""
+    answer = _exact_repeat(prompt, session_id)
+    if answer:
+        yield answer
+        return
+
+    payload = build_payload(prompt, session_id)
+    if isinstance(payload, str):
+        yield _local_first(prompt, session_id) or payload
+        return
+
+    try:
+        client = client or create_bedrock_client()
+    except Exception as e:
+        traceback.print_exc()
+        yield f"❌ Failed to initialize Bedrock client: {e}"
+        return
+
+    cancelled = threading.Event()
+    opened = Future()
+    future, reserved = _speculate(payload, _read_ahead, client, payload, cancelled, opened)
+
+    local_answer = _local_first(prompt, session_id)
+    if local_answer:
+        if future:
+            _abandon(future, cancelled, reserved, payload, stream=True)
+        yield local_answer
+        return
+
+    try:
+        if future:
+            inc("voicebot_speculation_total", outcome="used")
+            budget.settle(reserved, 0)
+            response = opened.result()
+        else:
+            response = _open(client, payload, cancelled)
+    except ClientError as e:
+        yield client_error_message(e, payload)
+        return
+    except Exception as e:
+        traceback.print_exc()
+        yield f"❌ Unexpected error: {str(e)}"
+        return
+
+    if response is None:
+        yield FALLBACK_MSG
+        return
+    yield from relay_stream(response, session_id, prompt)
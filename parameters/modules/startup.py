@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import builtins
+import threading
+
+# Startup bookkeeping: how long each top-level import and each warm-up step
+# took, and whether the service is ready (models loaded and exercised once).
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")  # background | blocking | off
+
+PROCESS_START = time.perf_counter()
+import_times = {}   # module -> seconds, including everything it imported
+_steps = []         # [name, fn, status, seconds, error]
+_checks = {}        # name -> fn() returning (ok, details), evaluated on every readiness call
+_lock = threading.Lock()
+_warm_thread = None
+
+
+class profile_imports:
+    """Context manager timing each not-yet-loaded module imported directly inside the block."""
+
+    def __enter__(self):
+        self._original = builtins.__import__
+        self._thread = threading.get_ident()
+        self._depth = 0
+        builtins.__import__ = self._import
+        return self
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if self._depth or level or name in sys.modules or threading.get_ident() != self._thread:
+            return self._original(name, globals, locals, fromlist, level)
+        self._depth += 1
+        started = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            self._depth -= 1
+            import_times[name] = import_times.get(name, 0.0) + time.perf_counter() - started
+
+    def __exit__(self, *exc):
+        builtins.__import__ = self._original
+        return False
+
+
+def register_warmup(name, fn):
+    """Add a warm-up step; steps run in registration order."""
+    with _lock:
+        _steps.append([name, fn, "pending", None, None])
+
+
+def register_check(name, fn):
+    """Add a live condition for readiness, e.g. that worker processes are still running."""
+    with _lock:
+        _checks[name] = fn
+
+
+def run_warm_up():
+    for step in _steps:
+        name, fn = step[0], step[1]
+        with _lock:
+            step[2] = "running"
+        started = time.perf_counter()
+        try:
+            fn()
+            status, error = "ok", None
+        except Exception as e:
+            print(f"⚠️ Warm-up step '{name}' failed: {e}")
+            status, error = "failed", str(e)
+        with _lock:
+            step[2:] = [status, time.perf_counter() - started, error]
+    print(startup_report())
+
+
+def start_warm_up(mode=WARMUP_MODE):
+    """Run the warm-up steps now, in a background thread, or not at all (everything stays lazy)."""
+    global _warm_thread
+    if mode == "off":
+        with _lock:
+            for step in _steps:
+                step[2] = "skipped"
+        print(startup_report())
+    elif mode == "blocking":
+        run_warm_up()
+    elif _warm_thread is None:
+        _warm_thread = threading.Thread(target=run_warm_up, name="warm-up", daemon=True)
+        _warm_thread.start()
+
+
+def readiness():
+    """(ready, details): ready once every step has succeeded or been skipped and every check passes."""
+    with _lock:
+        steps = {
+            name: {"status": status, "seconds": round(seconds, 3) if seconds is not None else None, "error": error}
+            for name, _, status, seconds, error in _steps
+        }
+        checks = dict(_checks)
+    ready = all(s["status"] in ("ok", "skipped") for s in steps.values())
+    results = {}
+    for name, fn in checks.items():
+        try:
+            ok, info = fn()
+        except Exception as e:
+            ok, info = False, {"error": str(e)}
+        results[name] = {"ok": ok, **info}
+        ready = ready and ok
+    details = {"ready": ready, "steps": steps, "uptime_seconds": round(time.perf_counter() - PROCESS_START, 1)}
+    if results:
+        details["checks"] = results
+    return ready, details
+
+
+def startup_report():
+    lines = ["⏱️ Startup report"]
+    for name, seconds in sorted(import_times.items(), key=lambda item: -item[1]):
+        lines.append(f"   import {name:<45} {seconds * 1000:8.0f} ms")
+    with _lock:
+        for name, _, status, seconds, error in _steps:
+            took = f"{seconds * 1000:8.0f} ms" if seconds is not None else " " * 11
+            lines.append(f"   warm   {name:<45} {took}  {status}" + (f" ({error})" if error else ""))
+    lines.append(f"   total since process start {time.perf_counter() - PROCESS_START:.2f} s")
+    return "\n".join(lines)
@@ -0,0 +1,60 @@
+import os
+import json
+import time
+import threading
+
+# Request trace for capacity tests: with TRACE_LOG_FILE set, every API request
+# appends one JSON line (arrival time, path, status, duration, payload shape)
+# that benchmarks/loadgen.py can replay. Question text is only kept with
+# TRACE_LOG_TEXT=1; audio is recorded by size and content type, never content.
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE")
+TRACE_LOG_TEXT = os.getenv("TRACE_LOG_TEXT", "0") == "1"
+TRACED_PATHS = ("/query", "/query/stream", "/transcribe")
+
+_lock = threading.Lock()
+_file = None
+
+
+def _write(entry):
+    global _file
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _lock:
+        if _file is None:
+            _file = open(TRACE_LOG_FILE, "a", encoding="utf-8", buffering=1)
+        _file.write(line)
+
+
+def enable_trace_log(app):
+    """Register the request hooks on a Flask app if TRACE_LOG_FILE is set."""
+    if not TRACE_LOG_FILE:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _trace_start():
+        g.trace_started = (time.time(), time.perf_counter())
+
+    @app.after_request
+    def _trace_end(response):
+        started = g.pop("trace_started", None)
+        if started is None or request.path not in TRACED_PATHS:
+            return response
+        entry = {
+            "t": round(started[0], 3),
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started[1]) * 1000, 1),
+        }
+        if request.path == "/transcribe":
+            audio = request.files.get("audio")
+            entry["audio_bytes"] = request.content_length or 0
+            entry["content_type"] = audio.mimetype if audio else request.mimetype
+        else:
+            body = request.get_json(silent=True) or {}
+            text = body.get("text", "")
+            entry["text_chars"] = len(text)
+            entry["session_id"] = body.get("session_id", "default")
+            if TRACE_LOG_TEXT:
+                entry["text"] = text
+        _write(entry)
+        return response
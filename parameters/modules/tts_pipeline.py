@@ -0,0 +1,164 @@
+import os
+import re
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from parameters.modules.utils import synthesize_speech
+
+# Sentence-pipelined TTS: segments are synthesized concurrently (bounded) and
+# served in order, so playback of segment 0 can start while the rest is produced.
+TTS_PARALLELISM = int(os.getenv("TTS_PARALLELISM", "3"))
+MIN_SEGMENT_CHARS = 40      # very short sentences are merged into the next one
+MAX_JOBS = 256              # finished jobs kept for manifest/segment lookups
+SEGMENT_WAIT_TIMEOUT = 30.0
+
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s+")
+
+_executor = ThreadPoolExecutor(max_workers=TTS_PARALLELISM, thread_name_prefix="tts")
+
+
+class SentenceChunker:
+    """Turns a stream of text deltas into complete segments."""
+
+    def __init__(self, min_chars=MIN_SEGMENT_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, delta):
+        self._buffer += delta
+        parts = _SENTENCE_END.split(self._buffer)
+        # The last part may still be growing; only emit what is followed by a boundary
+        complete, self._buffer = parts[:-1], parts[-1]
+        segments, pending = [], ""
+        for sentence in complete:
+            pending = f"{pending} {sentence}".strip() if pending else sentence.strip()
+            if len(pending) >= self.min_chars:
+                segments.append(pending)
+                pending = ""
+        if pending:
+            self._buffer = f"{pending} {self._buffer}"
+        return segments
+
+    def flush(self):
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
+
+
+def split_sentences(text, min_chars=MIN_SEGMENT_CHARS):
+    """Split text at sentence boundaries, merging fragments shorter than `min_chars`."""
+    chunker = SentenceChunker(min_chars)
+    return chunker.feed(text) + chunker.flush()
+
+
+class TTSJob:
+    """Ordered set of TTS segments being synthesized in the background."""
+
+    def __init__(self, voice_id="Aditi"):
+        self.id = str(uuid.uuid4())
+        self.voice_id = voice_id
+        self.segments = []  # dicts: index, text, status, path, error
+        self.finished = False
+        self._chunker = SentenceChunker()
+        self._cond = threading.Condition()
+
+    def add_segment(self, text):
+        with self._cond:
+            segment = {"index": len(self.segments), "text": text, "status": "pending", "path": None, "error": None}
+            self.segments.append(segment)
+            self._cond.notify_all()
+        _executor.submit(self._synthesize, segment)
+
+    def _synthesize(self, segment):
+        try:
+            path = synthesize_speech(segment["text"], voice_id=self.voice_id)
+            update = {"status": "ready", "path": path}
+        except Exception as e:
+            print(f"⚠️ TTS segment {segment['index']} failed: {e}")
+            update = {"status": "failed", "error": str(e)}
+        with self._cond:
+            segment.update(update)
+            self._cond.notify_all()
+
+    def feed(self, delta):
+        """Add streamed text; complete sentences are queued for synthesis straight away."""
+        for text in self._chunker.feed(delta):
+            self.add_segment(text)
+
+    def finish(self):
+        for text in self._chunker.flush():
+            self.add_segment(text)
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    @property
+    def done(self):
+        return self.finished and all(s["status"] != "pending" for s in self.segments)
+
+    def wait_for(self, index, timeout=SEGMENT_WAIT_TIMEOUT):
+        """Block until segment `index` is synthesized; None if it never will be."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: (index < len(self.segments) and self.segments[index]["status"] != "pending")
+                or (self.finished and index >= len(self.segments)),
+                timeout=timeout,
+            )
+            if index < len(self.segments) and self.segments[index]["status"] == "ready":
+                return self.segments[index]["path"]
+            return None
+
+    def manifest(self, url_prefix="/tts"):
+        with self._cond:
+            return {
+                "job_id": self.id,
+                "done": self.done,
+                "segments": [
+                    {
+                        "index": s["index"],
+                        "status": s["status"],
+                        "audio_url": f"{url_prefix}/{self.id}/{s['index']}",
+                    }
+                    for s in self.segments
+                ],
+            }
+
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def create_job(voice_id="Aditi"):
+    job = TTSJob(voice_id)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    return job
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def synthesize_pipelined(text, voice_id="Aditi"):
+    """Queue every sentence of `text` for concurrent synthesis and return the job immediately."""
+    if not text.strip():
+        raise ValueError("Text cannot be empty for speech synthesis")
+    job = create_job(voice_id)
+    for segment in split_sentences(text):
+        job.add_segment(segment)
+    job.finish()
+    return job
+
+def iter_job_audio(job, timeout=SEGMENT_WAIT_TIMEOUT):
+    """Yield each segment's MP3 bytes in order as soon as it is ready (MP3 frames concatenate)."""
+    index = 0
+    while True:
+        path = job.wait_for(index, timeout)
+        if path is None:
+            if index >= len(job.segments):
+                return
+        else:
+            with open(path, "rb") as f:
+                yield f.read()
+        index += 1
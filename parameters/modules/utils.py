@@ -1,28 +1,46 @@
-import boto3
 import os
+import hashlib
 import uuid
 from dotenv import load_dotenv
 load_dotenv()
 
+from parameters.modules.aws_clients import get_client
+from parameters.modules.metrics import inc, span
+
 region = "us-west-2"
-polly = boto3.client("polly", region_name=region)
 TTS_OUTPUT_FOLDER = "tts_outputs"
 
-def synthesize_speech(text, voice_id="Aditi"):
+def tts_cache_key(text, voice_id="Aditi", output_format="mp3"):
+    """Content address of a synthesis: identical (text, voice, format) map to the same file."""
+    raw = f"{voice_id}\x00{output_format}\x00{text}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+def synthesize_speech(text, voice_id="Aditi", output_format="mp3"):
     if not text.strip():
         raise ValueError("Text cannot be empty for speech synthesis")
 
-    response = polly.synthesize_speech(
-        Text=text,
-        OutputFormat="mp3",
-        VoiceId=voice_id,
-    )
+    filepath = os.path.join(TTS_OUTPUT_FOLDER, f"{tts_cache_key(text, voice_id, output_format)}.{output_format}")
+    if os.path.exists(filepath):
+        # Cache hit: refresh mtime so the janitor's LRU eviction sees it as recently used
+        os.utime(filepath)
+        inc("voicebot_tts_requests_total", cache="hit")
+        return filepath
+
+    inc("voicebot_tts_requests_total", cache="miss")
+    with span("tts"):
+        response = get_client("polly", region).synthesize_speech(
+            Text=text,
+            OutputFormat=output_format,
+            VoiceId=voice_id,
+        )
 
     if "AudioStream" in response:
-        filename = f"{uuid.uuid4()}.mp3"
-        filepath = os.path.join(TTS_OUTPUT_FOLDER, filename)
-        with open(filepath, "wb") as f:
-            f.write(response["AudioStream"].read())
+        # Write under a temporary name so concurrent readers never see a partial file
+        tmp_path = f"{filepath}.{uuid.uuid4().hex}.tmp"
+        with span("tts_write"):
+            with open(tmp_path, "wb") as f:
+                f.write(response["AudioStream"].read())
+            os.replace(tmp_path, filepath)
         return filepath
     else:
         raise Exception("Polly returned no audio stream")
@@ -0,0 +1,20 @@
+import pytest
+
+from parameters.modules.asr_backends import ASRBackend, BACKENDS, create_backend
+
+
+def test_backend_missing_a_method_fails_when_constructed():
+    class NoTranscribe(ASRBackend):
+        name = "incomplete"
+
+        def detect_language(self, audio):
+            return "en"
+
+    with pytest.raises(TypeError):
+        NoTranscribe()
+
+
+@pytest.mark.parametrize("name", sorted(BACKENDS))
+def test_registered_backends_construct_without_loading(name):
+    backend = create_backend(name, model_size="tiny")
+    assert backend.describe()["backend"] == name
@@ -0,0 +1,70 @@
+import pytest
+
+from parameters.modules import rag_fallback
+from parameters.modules.lsh import NearDuplicateIndex
+from parameters.modules.rag_fallback import LocalKnowledgeIndex, search_local_knowledge
+
+NEGATED_PAIRS = [
+    ("is the store open", "is the store not open"),
+    ("can I buy", "can't I buy"),
+    ("sahi", "sahi nahi"),
+    ("I can pay online", "I cannot pay online"),
+    ("do you deliver", "don't you deliver"),
+    ("is the customer service center on main street open on sunday",
+     "is the customer service center on main street not open on sunday"),
+]
+
+
+@pytest.fixture
+def knowledge(tmp_path, monkeypatch):
+    """A small index holding cached questions, installed as the process-wide index."""
+    index = LocalKnowledgeIndex(corpus_path=str(tmp_path / "knowledge.corpus"), index_dir=str(tmp_path / "index"),
+                                refresh_interval=float("inf"))
+    monkeypatch.setattr(rag_fallback, "_index", index)
+
+    def add(question, answer):
+        index.add_records(f"answer_store:{question}", [(question, "original_question", answer)])
+    return add
+
+
+@pytest.mark.parametrize("cached, asked", NEGATED_PAIRS)
+def test_negation_is_not_a_near_duplicate(cached, asked):
+    index = NearDuplicateIndex()
+    index.add("cached", cached)
+    assert index.query(asked) == []
+
+
+@pytest.mark.parametrize("cached, asked", NEGATED_PAIRS)
+def test_negated_question_does_not_reuse_cached_answer(knowledge, cached, asked):
+    knowledge(cached, "CACHED ANSWER")
+    assert search_local_knowledge(asked, mode="tfidf") != "CACHED ANSWER"
+
+
+def test_rewording_is_a_near_duplicate():
+    index = NearDuplicateIndex()
+    index.add("gold", "What is the interest rate on the gold loan?")
+    assert [key for _, key in index.query("what's the interest rate on gold loans")] == ["gold"]
+
+
+REWORDED_PAIRS = [
+    ("what is mcdonalds", "what's McDonald's?"),
+    ("What is the interest rate on the gold loan?", "what's the interest rate on gold loans"),
+    ("How do I open a savings account?", "how do i open savings accounts"),
+]
+
+
+@pytest.mark.parametrize("cached, asked", REWORDED_PAIRS)
+def test_reworded_question_reuses_cached_answer(knowledge, cached, asked):
+    knowledge(cached, "CACHED ANSWER")
+    assert search_local_knowledge(asked, mode="tfidf") == "CACHED ANSWER"
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("when is the store open", "where is the store open"),
+    ("what is the gold loan rate", "why is the gold loan rate"),
+    ("how do I open a savings account", "why do I open a savings account"),
+])
+def test_different_question_word_is_not_a_near_duplicate(cached, asked):
+    index = NearDuplicateIndex()
+    index.add("cached", cached)
+    assert index.query(asked) == []
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from parameters.modules.session_store import SessionStore, valid_session_id
+
+
+@pytest.mark.parametrize("session_id", ["../victim/config", "..", "a/b", "a.b", "", "x" * 65, None])
+def test_rejects_ids_that_are_not_plain_names(tmp_path, session_id):
+    store = SessionStore(folder=str(tmp_path / "sessions"))
+    assert not valid_session_id(session_id)
+    for call in (store.turns, store.reset, store.migrate_legacy):
+        with pytest.raises(ValueError):
+            call(session_id)
+
+
+def test_traversal_leaves_outside_files_alone(tmp_path):
+    victim = tmp_path / "victim"
+    victim.mkdir()
+    (victim / "config.json").write_text(json.dumps([{"role": "user", "content": "hi"}]))
+    store = SessionStore(folder=str(tmp_path / "sessions"))
+    with pytest.raises(ValueError):
+        store.add("../victim/config", "user", "hello")
+    with pytest.raises(ValueError):
+        store.reset("../victim/config")
+    assert sorted(p.name for p in victim.iterdir()) == ["config.json"]
+
+
+def test_plain_ids_round_trip(tmp_path):
+    store = SessionStore(folder=str(tmp_path / "sessions"))
+    store.add("eval-1718000000-3", "user", "hello")
+    store.save("eval-1718000000-3")
+    assert [t.text for t in SessionStore(folder=str(tmp_path / "sessions")).turns("eval-1718000000-3")] == ["hello"]
+
+
+def _converse(context, session_id, first, last):
+    from parameters.modules.context_builder import build_context
+    for i in range(first, last):
+        context.load_session(session_id)
+        context.add_turn(session_id, "user", f"question number {i}.")
+        messages, system, stats = build_context(context, session_id, budget=200, summary_budget=100)
+        context.add_turn(session_id, "assistant", f"answer number {i}.")
+        context.save_session(session_id)
+    return messages, system, stats
+
+
+@pytest.mark.parametrize("reload", [False, True])
+def test_turns_beyond_the_hydrate_limit_are_summarized(tmp_path, reload):
+    from parameters.modules.context_manager import ConversationContext
+    folder = str(tmp_path / "sessions")
+    context = ConversationContext(SessionStore(folder=folder, hydrate_turns=6))
+    _converse(context, "long", 0, 20)
+    if reload:
+        context = ConversationContext(SessionStore(folder=folder, hydrate_turns=6))
+    messages, system, stats = _converse(context, "long", 20, 40)
+
+    # Every earlier turn was either summarized or is still in the window
+    assert stats["turns_summarized"] + stats["turns_sent"] == 2 * 40 - 1
+    assert system.startswith("Summary of the earlier conversation:")
+    assert messages[-1]["content"][0]["text"] == "question number 39."
+
+
+def test_a_session_updated_by_another_worker_is_read_again(tmp_path):
+    folder = str(tmp_path / "sessions")
+    first, second = SessionStore(folder=folder), SessionStore(folder=folder)
+    first.add("shared", "user", "hello")
+    first.save("shared")
+    assert [t.text for t in second.turns("shared")] == ["hello"]
+
+    second.add("shared", "assistant", "hi there")
+    second.save("shared")
+    first.discard("shared")
+    assert [t.text for t in first.turns("shared")] == ["hello", "hi there"]
+
+    # Both append before either looks again: neither keeps a stale view
+    first.add("shared", "user", "one")
+    second.add("shared", "user", "two")
+    first.save("shared")
+    second.save("shared")
+    assert [t.text for t in first.turns("shared")][-2:] == ["one", "two"]
+    assert [t.text for t in second.turns("shared")][-2:] == ["one", "two"]
+
+
+def test_summary_and_compaction_leave_no_temp_files(tmp_path):
+    folder = tmp_path / "sessions"
+    store = SessionStore(folder=str(folder), keep_turns=2, compact_bytes=1)
+    for i in range(3):
+        store.add("s", "user", f"turn {i}")
+        store.save("s")
+    store.set_summary("s", {"lines": ["User: turn 0"], "upto": 0})
+    assert sorted(p.name for p in folder.iterdir()) == ["s.jsonl", "s.summary.json"]
+    assert [t.text for t in SessionStore(folder=str(folder)).turns("s")] == ["turn 1", "turn 2"]
@@ -1,39 +1,147 @@
 import os
+import sys
 import json
-import boto3
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from datetime import datetime
+from botocore.exceptions import ClientError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from parameters.modules.aws_clients import get_client
+from parameters.modules.context_builder import estimate_tokens
 
 # === Config ===
 SUMMARY_FILE = "overall_summary.txt"
 CURRENT_FILE = "current_summary.txt"
-RAW_RESPONSE_FILE = "bedrock_raw_response.json"
+RAW_RESPONSE_FILE = "bedrock_raw_responses.jsonl"  # one line per response, appended
 MERGED_SUMMARY_FILE = "merged_summary.txt"
+MANIFEST_FILE = "summary_manifest.jsonl"           # completed files by content hash, appended
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "8"))  # concurrent Bedrock calls
+MAX_RETRIES = int(os.getenv("SUMMARY_MAX_RETRIES", "6"))
+BACKOFF_BASE = 1.0   # seconds; doubles per throttled attempt, with full jitter
+BACKOFF_MAX = 60.0
+# Packing: short transcripts share one request (and one copy of the instructions)
+SUMMARY_PACKING = os.getenv("SUMMARY_PACKING", "0") == "1"
+SHORT_TRANSCRIPT_TOKENS = int(os.getenv("SHORT_TRANSCRIPT_TOKENS", "300"))
+PACK_TOKEN_BUDGET = int(os.getenv("PACK_TOKEN_BUDGET", "6000"))  # transcript tokens per packed request
+PACK_MAX_ITEMS = int(os.getenv("PACK_MAX_ITEMS", "20"))
+PACK_OUTPUT_TOKENS_PER_ITEM = 180
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceUnavailableException",
+                  "ModelNotReadyException"}
 
 # === Utility Functions ===
 
 def get_json_files(directory):
     return [f for f in os.listdir(directory) if f.lower().endswith(".json")]
 
+def conversation_text(data):
+    segments = data.get("segments", [])
+    return "\n".join(f"{seg['speaker_id']}: {seg['text']}" for seg in segments)
+
 def extract_conversation_text(json_path):
     try:
         with open(json_path, "r", encoding="utf-8") as f:
             data = json.load(f)
-        segments = data.get("segments", [])
-        return "\n".join(f"{seg['speaker_id']}: {seg['text']}" for seg in segments)
+        return conversation_text(data)
     except Exception as e:
         print(f"❌ Failed to parse {json_path}: {e}")
         return ""
 
-def already_logged_in_overall(file_name):
-    if not os.path.exists(SUMMARY_FILE):
-        return False
-    with open(SUMMARY_FILE, 'r', encoding='utf-8') as f:
-        return f"File: {file_name}" in f.read()
+def load_transcript(json_path):
+    """(content hash, transcript text) from one read of the file; text is "" if it can't be parsed."""
+    with open(json_path, "rb") as f:
+        raw = f.read()
+    digest = hashlib.sha256(raw).hexdigest()
+    try:
+        return digest, conversation_text(json.loads(raw))
+    except Exception as e:
+        print(f"❌ Failed to parse {json_path}: {e}")
+        return digest, ""
+
+def load_manifest(path=MANIFEST_FILE):
+    """{content hash: entry} of files already summarized in earlier runs."""
+    done = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted run
+                done[entry["hash"]] = entry
+    return done
+
+class Throttle:
+    """Shared back-off: once any worker is throttled, every worker waits before its next call."""
+
+    def __init__(self):
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def backoff(self, attempt):
+        # Exponential with full jitter so the workers don't retry in lockstep
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        return delay
+
+_throttle = Throttle()
+
+def invoke_with_backoff(payload, raw_log=None):
+    """(response text, None) or (None, error message) for one Bedrock call; throttling is retried."""
+    bedrock_client = get_client("bedrock-runtime", "us-west-2")
+
+    for attempt in range(MAX_RETRIES):
+        _throttle.wait()
+        try:
+            response = bedrock_client.invoke_model(
+                modelId=MODEL_ID,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(payload)
+            )
+            response_body = response["body"].read().decode("utf-8")
+            break
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in THROTTLE_CODES and attempt < MAX_RETRIES - 1:
+                _throttle.backoff(attempt)
+                continue
+            return None, f"[❌ Bedrock error: {str(e)}]"
+        except Exception as e:
+            return None, f"[❌ Bedrock error: {str(e)}]"
+
+    try:
+        if raw_log:
+            raw_log(response_body)
+
+        response_json = json.loads(response_body)
+        content_list = response_json.get("content", []) or response_json.get("message", {}).get("content", [])
 
-def analyze_text_with_bedrock(transcript_text):
-    bedrock_client = boto3.client("bedrock-runtime", region_name="us-west-2")
+        if isinstance(content_list, list):
+            text = "\n".join(item.get("text", "") for item in content_list if item.get("type") == "text").strip()
+            return (text, None) if text else (None, "[❗ No summary returned from Bedrock]")
+        return None, "[❗ Unexpected response format from Bedrock]"
+
+    except Exception as e:
+        return None, f"[❌ Bedrock error: {str(e)}]"
 
+def analyze_text_with_bedrock(transcript_text, raw_log=None):
+    """Summarize one transcript; throttling is retried with back-off, other errors are returned as text.
+
+    `raw_log`, if given, is called with the raw response body instead of it
+    being written to a file here.
+    """
     prompt = f"""
 You are an AI assistant. Analyze the following customer service conversation and extract details in this structured format:
 
@@ -64,29 +172,98 @@ Transcript:
         "anthropic_version": "bedrock-2023-05-31"
     }
 
-    try:
-        response = bedrock_client.invoke_model(
-            modelId="anthropic.claude-3-haiku-20240307-v1:0",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(payload)
-        )
+    summary, error = invoke_with_backoff(payload, raw_log)
+    return summary or error
 
-        response_body = response["body"].read().decode("utf-8")
+# === Packing of short transcripts ===
 
-        with open(RAW_RESPONSE_FILE, "w", encoding="utf-8") as f:
-            f.write(response_body)
+def pack_prompt(items):
+    transcripts = "\n\n".join(f'<transcript id="{item_id}">\n{text}\n</transcript>' for item_id, text in items)
+    return f"""
+You are an AI assistant. Analyze each of the following short customer service conversations independently.
 
-        response_json = json.loads(response_body)
-        content_list = response_json.get("content", []) or response_json.get("message", {}).get("content", [])
+Reply with ONLY a JSON array containing one object per transcript, in any order, with exactly these keys:
+- "id": the transcript id, copied exactly
+- "summary": the main idea in 1-3 sentences (who is speaking, what platform/product they represent, the nature of the call)
+- "concerns": list of customer concerns (empty list if none)
+- "questions": list of specific questions the customer asked (empty list if none)
+- "sentiment": one of "Positive", "Neutral", "Negative"
+- "sentiment_reason": a 1-line explanation
 
-        if isinstance(content_list, list):
-            summary = "\n".join(item.get("text", "") for item in content_list if item.get("type") == "text").strip()
-            return summary if summary else "[❗ No summary returned from Bedrock]"
-        return "[❗ Unexpected response format from Bedrock]"
+{transcripts}
+"""
 
-    except Exception as e:
-        return f"[❌ Bedrock error: {str(e)}]"
+def format_packed_item(item):
+    """Render one packed JSON result in the same layout as a single-call summary."""
+    def bullets(values):
+        return "\n".join(f"- {v}" for v in values) if values else "None mentioned."
+
+    return (
+        f"**1. Summary of the conversation:**\n{item['summary'].strip()}\n\n"
+        f"**2. Customer concerns:**\n{bullets(item.get('concerns') or [])}\n\n"
+        f"**3. Questions asked:**\n{bullets(item.get('questions') or [])}\n\n"
+        f"**4. Overall sentiment:**\n{item['sentiment']}. {item.get('sentiment_reason', '').strip()}".strip()
+    )
+
+def parse_packed_response(text, ids):
+    """{id: formatted summary} for every well-formed item; malformed or missing ids are left out."""
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or str(item.get("id")) not in ids or str(item.get("id")) in results:
+            continue
+        if not isinstance(item.get("summary"), str) or not item["summary"].strip():
+            continue
+        if item.get("sentiment") not in ("Positive", "Neutral", "Negative"):
+            continue
+        if not all(isinstance(item.get(k) or [], list) for k in ("concerns", "questions")):
+            continue
+        results[str(item["id"])] = format_packed_item(item)
+    return results
+
+def analyze_packed_with_bedrock(items, raw_log=None):
+    """Summarize [(id, transcript)] in one request; items that come back malformed get a single call each.
+
+    Returns ({id: summary}, number of Bedrock requests made).
+    """
+    payload = {
+        "messages": [{"role": "user", "content": [{"type": "text", "text": pack_prompt(items)}]}],
+        "max_tokens": min(4096, 200 + PACK_OUTPUT_TOKENS_PER_ITEM * len(items)),
+        "anthropic_version": "bedrock-2023-05-31"
+    }
+    text, _ = invoke_with_backoff(payload, raw_log)
+    results = parse_packed_response(text or "", {item_id for item_id, _ in items})
+    requests = 1
+    for item_id, transcript_text in items:
+        if item_id not in results:
+            results[item_id] = analyze_text_with_bedrock(transcript_text, raw_log)
+            requests += 1
+    return results, requests
+
+def plan_packs(items, budget=None, max_items=None):
+    """Group (id, transcript) pairs into packs of short transcripts; long ones become packs of one."""
+    budget = budget or PACK_TOKEN_BUDGET
+    max_items = max_items or PACK_MAX_ITEMS
+    packs, current, used = [], [], 0
+    for item_id, text in items:
+        tokens = estimate_tokens(text)
+        if tokens > SHORT_TRANSCRIPT_TOKENS:
+            packs.append([(item_id, text)])
+            continue
+        if current and (used + tokens > budget or len(current) >= max_items):
+            packs.append(current)
+            current, used = [], 0
+        current.append((item_id, text))
+        used += tokens
+    if current:
+        packs.append(current)
+    return packs
 
 def save_summary_files(summary, file_name):
     if not summary.strip():
@@ -98,50 +275,104 @@ def save_summary_files(summary, file_name):
     with open(CURRENT_FILE, "w", encoding="utf-8") as f:
         f.write(summary)
 
-def append_to_overall_summary_if_needed(summary, file_name):
-    if already_logged_in_overall(file_name):
-        print(f"⏭️ Skipping '{file_name}' in overall_summary.txt (already exists)")
-        return
-    with open(SUMMARY_FILE, "a", encoding="utf-8") as f:
-        f.write("=" * 60 + "\n")
-        f.write(f"File: {file_name}\n")
-        f.write(f"Timestamp: {datetime.now()}\n\n")
-        f.write(summary.strip() + "\n\n")
-
-def append_to_merged_summary(summary_list):
+def append_to_overall_summary(summary, file_name, out):
+    out.write("=" * 60 + "\n")
+    out.write(f"File: {file_name}\n")
+    out.write(f"Timestamp: {datetime.now()}\n\n")
+    out.write(summary.strip() + "\n\n")
+
+def manifest_summary(entry):
+    """Summary text of a manifest entry; entries from before it was stored fall back to <file>_summary.txt."""
+    if "summary" in entry:
+        return entry["summary"]
+    try:
+        with open(os.path.splitext(entry["file"])[0] + "_summary.txt", "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def write_merged_summary(entries):
+    """Rewrite the merged summary from every completed manifest entry, in manifest order."""
+    summaries = [summary for summary in map(manifest_summary, entries) if summary]
     with open(MERGED_SUMMARY_FILE, "w", encoding="utf-8") as f:
-        merged = "\n\n".join(summary_list)
-        f.write(merged)
+        f.write("\n\n".join(summaries))
 
 # === Main Runner ===
 
-def process_transcripts(directory="."):
-    json_files = get_json_files(directory)
-    all_summaries = []
+def summarize_pack(pack, raw_out, raw_lock):
+    """Worker: [(file, transcript)] -> ([(file, summary)], Bedrock requests made)."""
+    def raw_log(body):
+        files = [file for file, _ in pack]
+        with raw_lock:
+            raw_out.write(json.dumps({"files": files, "response": body}, ensure_ascii=False) + "\n")
 
-    with tqdm(total=len(json_files), desc="Processing transcripts") as pbar:
-        for file in json_files:
-            full_path = os.path.join(directory, file)
-            transcript_text = extract_conversation_text(full_path)
+    if len(pack) == 1:
+        file, transcript_text = pack[0]
+        return [(file, analyze_text_with_bedrock(transcript_text, raw_log))], 1
+    results, requests = analyze_packed_with_bedrock(pack, raw_log)
+    return [(file, results[file]) for file, _ in pack], requests
 
-            if not transcript_text.strip():
+def process_transcripts(directory=".", workers=SUMMARY_WORKERS, pack=SUMMARY_PACKING):
+    json_files = get_json_files(directory)
+    done = load_manifest()
+    raw_lock = threading.Lock()
+    requests = 0
+
+    # Results are streamed as they complete: one append per file to the manifest,
+    # the overall summary and the raw-response log; nothing is re-read or rewritten.
+    with open(MANIFEST_FILE, "a", encoding="utf-8") as manifest, \
+         open(SUMMARY_FILE, "a", encoding="utf-8") as overall, \
+         open(RAW_RESPONSE_FILE, "a", encoding="utf-8") as raw_out, \
+         ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summary") as pool, \
+         tqdm(total=len(json_files), desc="Processing transcripts") as pbar:
+
+        # Hash and parse everything first (in parallel) so finished and empty files
+        # never reach Bedrock, and short transcripts can be packed together
+        pending, digests = [], {}
+        paths = [os.path.join(directory, file) for file in json_files]
+        for file, (digest, transcript_text) in zip(json_files, pool.map(load_transcript, paths)):
+            if digest in done:
+                pbar.set_postfix_str(f"⏭️ Already summarized: {file}")
+                pbar.update(1)
+            elif not transcript_text.strip():
                 pbar.set_postfix_str(f"❌ Empty or invalid: {file}")
                 pbar.update(1)
+            else:
+                pending.append((file, transcript_text))
+                digests[file] = digest
+
+        packs = plan_packs(pending) if pack else [[item] for item in pending]
+        futures = {pool.submit(summarize_pack, p, raw_out, raw_lock): p for p in packs}
+        for future in as_completed(futures):
+            try:
+                results, made = future.result()
+            except Exception as e:
+                pbar.set_postfix_str(f"❌ {futures[future][0][0]}: {e}")
+                pbar.update(len(futures[future]))
                 continue
+            requests += made
+
+            for file, summary in results:
+                digest = digests[file]
+                save_summary_files(summary, file)
+                # Failed calls are not recorded, so the next run retries them
+                if "❌" not in summary and "[❗" not in summary and digest not in done:
+                    append_to_overall_summary(summary, file, overall)
+                    entry = {"hash": digest, "file": file, "timestamp": datetime.now().isoformat(),
+                             "summary": summary}
+                    manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    done[digest] = entry
+                pbar.set_postfix_str(f"✅ Processed: {file}")
+                pbar.update(1)
+            manifest.flush()
+            overall.flush()
 
-            summary = analyze_text_with_bedrock(transcript_text)
-
-            save_summary_files(summary, file)
-
-            if "❌" not in summary and "[❗" not in summary:
-                append_to_overall_summary_if_needed(summary, file)
-                all_summaries.append(summary)
-
-            pbar.set_postfix_str(f"✅ Processed: {file}")
-            pbar.update(1)
-
-    append_to_merged_summary(all_summaries)
+    # Built from the manifest, so files finished in earlier (interrupted) runs stay in it
+    write_merged_summary(done.values())
+    print(f"📨 {requests} Bedrock requests for {len(pending)} transcripts"
+          + (f" ({len(packs)} packs)" if pack else ""))
 
 # === Run the script ===
 if __name__ == "__main__":
-    process_transcripts()
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    process_transcripts(args[0] if args else ".", pack=SUMMARY_PACKING or "--pack" in sys.argv)
@@ -1,7 +1,11 @@
-import boto3
+import os
+import sys
 import json
 import traceback
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from parameters.modules.aws_clients import get_client
+
 def generate_response_bedrock(prompt, detected_lang=""):
     region = "us-west-2"
     model_id = "anthropic.claude-3-5-sonnet-20240620-v1:0"
@@ -33,7 +37,7 @@ def generate_response_bedrock(prompt, detected_lang=""):
     }
 
     try:
-        client = boto3.client("bedrock-runtime", region_name=region)
+        client = get_client("bedrock-runtime", region)
         response = client.invoke_model(
             modelId=model_id,
             body=json.dumps(payload).encode("utf-8"),
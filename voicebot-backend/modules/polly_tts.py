@@ -1,16 +1,18 @@
-import boto3
 import os
+import sys
 import uuid
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from parameters.modules.aws_clients import get_client
+
 region = "us-west-2"
-polly = boto3.client("polly", region_name=region)
 TTS_OUTPUT_FOLDER = "tts_outputs"
 
 def synthesize_speech(text, voice_id="Aditi"):
     if not text.strip():
         raise ValueError("Text cannot be empty for speech synthesis")
 
-    response = polly.synthesize_speech(
+    response = get_client("polly", region).synthesize_speech(
         Text=text,
         OutputFormat="mp3",
         VoiceId=voice_id,
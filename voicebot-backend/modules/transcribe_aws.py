@@ -1,16 +1,19 @@
-import boto3
 import time
 import os
+import sys
 import requests
 import traceback
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from parameters.modules.aws_clients import get_client
+
 region = 'us-west-2'
 bucket = "voicebot-audio-bucket-suhani"
 
-s3 = boto3.client('s3', region_name=region)
-transcribe = boto3.client('transcribe', region_name=region)
 
 def transcribe_audio(filepath, filename):
+    s3 = get_client('s3', region)
+    transcribe = get_client('transcribe', region)
     s3.upload_file(filepath, bucket, filename)
     job_name = f"job-{filename.replace('.', '-')}-{int(time.time())}"
     file_uri = f"s3://{bucket}/{filename}"